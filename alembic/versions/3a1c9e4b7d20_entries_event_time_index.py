@@ -0,0 +1,38 @@
+"""composite (telegram_id, event_time DESC) index on entries, users.timezone
+
+Revision ID: 3a1c9e4b7d20
+Revises: 6f83b831d7c9
+Create Date: 2025-07-14 11:20:41.118302
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3a1c9e4b7d20'
+down_revision: Union[str, None] = '6f83b831d7c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('timezone', sa.String(), nullable=True))
+    # CONCURRENTLY нельзя выполнять внутри транзакции, а таблица entries
+    # большая — не блокируем запись на время построения индекса.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_entries_telegram_id_event_time',
+            'entries',
+            ['telegram_id', sa.text('event_time DESC')],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_entries_telegram_id_event_time',
+            table_name='entries',
+            postgresql_concurrently=True,
+        )
+    op.drop_column('users', 'timezone')
@@ -0,0 +1,37 @@
+"""add vision_cache
+
+Revision ID: 8b2e5d1f0a94
+Revises: 3a1c9e4b7d20
+Create Date: 2025-07-21 16:02:13.540117
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e5d1f0a94'
+down_revision: Union[str, None] = '3a1c9e4b7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'vision_cache',
+        sa.Column('content_hash', sa.String(length=64), primary_key=True),
+        sa.Column('phash', sa.BigInteger(), nullable=True),
+        sa.Column('vision_text', sa.Text(), nullable=False),
+        sa.Column('carbs_g', sa.Float(), nullable=True),
+        sa.Column('xe', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('last_used_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    )
+    op.create_index('ix_vision_cache_phash', 'vision_cache', ['phash'])
+    op.create_index('ix_vision_cache_last_used_at', 'vision_cache', ['last_used_at'])
+    op.execute("GRANT SELECT, INSERT, UPDATE, DELETE ON TABLE public.vision_cache TO diabetes_user;")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_vision_cache_last_used_at', table_name='vision_cache')
+    op.drop_index('ix_vision_cache_phash', table_name='vision_cache')
+    op.drop_table('vision_cache')
@@ -0,0 +1,27 @@
+"""users.thread_messages / thread_tokens / thread_summary for thread rotation
+
+Revision ID: a4d9c2e7f310
+Revises: f1c6a3d8e597
+Create Date: 2025-08-14 10:12:05.418337
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d9c2e7f310'
+down_revision: Union[str, None] = 'f1c6a3d8e597'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('thread_messages', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('users', sa.Column('thread_tokens', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('users', sa.Column('thread_summary', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'thread_summary')
+    op.drop_column('users', 'thread_tokens')
+    op.drop_column('users', 'thread_messages')
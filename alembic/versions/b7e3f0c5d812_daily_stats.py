@@ -0,0 +1,44 @@
+"""daily_stats: per-day rollup of entries in the user's timezone
+
+Revision ID: b7e3f0c5d812
+Revises: a4d9c2e7f310
+Create Date: 2025-08-18 09:40:27.106552
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3f0c5d812'
+down_revision: Union[str, None] = 'a4d9c2e7f310'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+METRICS = ('sugar', 'dose', 'carbs', 'xe')
+
+
+def upgrade() -> None:
+    columns = []
+    for name in METRICS:
+        columns += [
+            sa.Column(f'{name}_count', sa.Integer(), nullable=False),
+            sa.Column(f'{name}_sum', sa.Float(), nullable=False),
+            sa.Column(f'{name}_min', sa.Float(), nullable=True),
+            sa.Column(f'{name}_max', sa.Float(), nullable=True),
+            sa.Column(f'{name}_sumsq', sa.Float(), nullable=False),
+        ]
+    op.create_table(
+        'daily_stats',
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('local_date', sa.Date(), nullable=False),
+        sa.Column('entries', sa.Integer(), nullable=False),
+        *columns,
+        sa.ForeignKeyConstraint(['telegram_id'], ['users.telegram_id']),
+        sa.PrimaryKeyConstraint('telegram_id', 'local_date'),
+    )
+    op.execute("GRANT SELECT, INSERT, UPDATE, DELETE ON TABLE public.daily_stats TO diabetes_user;")
+    # Таблица заполняется командой `python daily_stats.py` после миграции
+
+
+def downgrade() -> None:
+    op.drop_table('daily_stats')
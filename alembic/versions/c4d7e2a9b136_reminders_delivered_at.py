@@ -0,0 +1,40 @@
+"""reminders.delivered_at and partial index on pending reminders
+
+Revision ID: c4d7e2a9b136
+Revises: 8b2e5d1f0a94
+Create Date: 2025-07-28 10:41:07.392615
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d7e2a9b136'
+down_revision: Union[str, None] = '8b2e5d1f0a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('reminders', sa.Column('delivered_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    # Напоминания, время которых уже прошло, считаем отправленными: до этой
+    # миграции бот не отмечал доставку, и поднимать их заново нельзя.
+    op.execute("UPDATE reminders SET delivered_at = time WHERE time <= now()")
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_reminders_pending_time',
+            'reminders',
+            ['time'],
+            postgresql_where=sa.text('delivered_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_reminders_pending_time',
+            table_name='reminders',
+            postgresql_concurrently=True,
+        )
+    op.drop_column('reminders', 'delivered_at')
@@ -0,0 +1,23 @@
+"""users.data_version for the report cache
+
+Revision ID: c5a1e8f2b934
+Revises: b7e3f0c5d812
+Create Date: 2025-08-20 15:03:41.527019
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a1e8f2b934'
+down_revision: Union[str, None] = 'b7e3f0c5d812'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'data_version')
@@ -0,0 +1,23 @@
+"""reminders.rule for recurring reminders
+
+Revision ID: d9e1f4a7b250
+Revises: c4d7e2a9b136
+Create Date: 2025-08-04 09:12:55.804113
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9e1f4a7b250'
+down_revision: Union[str, None] = 'c4d7e2a9b136'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('reminders', sa.Column('rule', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('reminders', 'rule')
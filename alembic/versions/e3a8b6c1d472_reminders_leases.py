@@ -0,0 +1,25 @@
+"""reminders.claimed_by / lease_expires_at for multi-instance delivery
+
+Revision ID: e3a8b6c1d472
+Revises: d9e1f4a7b250
+Create Date: 2025-08-11 14:27:39.615208
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a8b6c1d472'
+down_revision: Union[str, None] = 'd9e1f4a7b250'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('reminders', sa.Column('claimed_by', sa.String(length=64), nullable=True))
+    op.add_column('reminders', sa.Column('lease_expires_at', sa.TIMESTAMP(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('reminders', 'lease_expires_at')
+    op.drop_column('reminders', 'claimed_by')
@@ -0,0 +1,31 @@
+"""bot_state table for conversation state shared between bot processes
+
+Revision ID: f1c6a3d8e597
+Revises: e3a8b6c1d472
+Create Date: 2025-08-12 10:41:03.284517
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c6a3d8e597'
+down_revision: Union[str, None] = 'e3a8b6c1d472'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'bot_state',
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('telegram_id'),
+    )
+    op.execute("GRANT SELECT, INSERT, UPDATE, DELETE ON TABLE public.bot_state TO diabetes_user;")
+
+
+def downgrade() -> None:
+    op.drop_table('bot_state')
@@ -1,11 +1,53 @@
+import logging
+import secrets
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from config import WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL
 from services import find_protocol_by_diagnosis
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the Telegram bot in webhook mode inside this event loop.
+
+    Enabled by ``WEBHOOK_URL``; the bot modules are imported only then, so the
+    API works (and is importable in tests) without Telegram credentials.
+    """
+    app.state.telegram_app = None
+    if not WEBHOOK_URL:
+        yield
+        return
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET is required when WEBHOOK_URL is set")
+
+    from bot.startup import setup
+    from bot.application import build_application
+    from db import init_db
+
+    setup()
+    init_db()
+    application = build_application(webhook=True)
+    await application.initialize()
+    await application.post_init(application)
+    # каждый воркер uvicorn повторяет вызов — setWebhook идемпотентен
+    await application.bot.set_webhook(url=WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+    await application.start()
+    app.state.telegram_app = application
+    logging.info("Telegram webhook mode on %s", WEBHOOK_PATH)
+    try:
+        yield
+    finally:
+        app.state.telegram_app = None
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+
+app = FastAPI(lifespan=lifespan)
 
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -23,6 +65,33 @@ async def ai_diagnose(req: DiagnoseRequest) -> DiagnoseResponse:
     return DiagnoseResponse(protocol=protocol)
 
 
+@app.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: str | None = Header(default=None),
+) -> Response:
+    """Accept an update from Telegram and hand it to the bot's update queue.
+
+    The update is processed by the PTB ``Application`` in the same event loop;
+    the route returns as soon as the update is queued.
+    """
+    application = getattr(request.app.state, "telegram_app", None)
+    if application is None:
+        raise HTTPException(status_code=503, detail="Webhook mode is disabled")
+    # байты, а не str: compare_digest падает с TypeError на не-ASCII заголовке
+    if not secrets.compare_digest((x_telegram_bot_api_secret_token or "").encode(), WEBHOOK_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    from telegram import Update
+
+    await application.update_queue.put(Update.de_json(data, application.bot))
+    return Response(status_code=200)
+
+
 # Serve the Telegram WebApp static files from the built directory when available.
 # Fall back to the source directory in development environments.
 dist_dir = BASE_DIR / "dist"
@@ -0,0 +1,143 @@
+"""Время до ответа ассистента: фиксированный опрос раз в 2 с vs адаптивный vs стриминг.
+
+Assistants API эмулируется локальной заглушкой на ``httpx.MockTransport``
+(без сети): каждый запрос стоит ``--rtt`` секунд, run «думает» случайное
+время из ``--min-run``..``--max-run``.  Все три стратегии получают одинаковую
+последовательность длительностей run'ов.
+
+Запуск::
+
+    python benchmarks/bench_assistant_runs.py --runs 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+import httpx  # noqa: E402
+import openai  # noqa: E402
+
+import gpt_client  # noqa: E402
+
+
+class StubAssistants:
+    def __init__(self, rtt: float, durations: list[float]):
+        self.rtt = rtt
+        self.durations = iter(durations)
+        self.runs: dict[str, float] = {}  # run_id -> время готовности
+        self.requests = 0
+
+    def _run(self, run_id: str, thread_id: str) -> dict:
+        done = time.perf_counter() >= self.runs[run_id]
+        return {"id": run_id, "object": "thread.run", "thread_id": thread_id,
+                "assistant_id": "a", "status": "completed" if done else "in_progress"}
+
+    @staticmethod
+    def _message(thread_id: str, run_id: str) -> dict:
+        return {"id": f"msg_{run_id}", "object": "thread.message", "thread_id": thread_id,
+                "run_id": run_id, "role": "assistant",
+                "content": [{"type": "text", "text": {"value": "Углеводы: 40 г", "annotations": []}}]}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.rtt)
+        parts = request.url.path.split("/")
+        thread_id = parts[parts.index("threads") + 1]
+        if request.method == "POST" and parts[-1] == "messages":
+            return httpx.Response(200, json={**self._message(thread_id, "u"), "role": "user"})
+        if request.method == "POST" and parts[-1] == "runs":
+            run_id = f"run_{len(self.runs)}"
+            self.runs[run_id] = time.perf_counter() + next(self.durations)
+            if json.loads(request.content).get("stream"):
+                return httpx.Response(200, content=self._stream(run_id, thread_id),
+                                      headers={"content-type": "text/event-stream"})
+            return httpx.Response(200, json=self._run(run_id, thread_id))
+        if request.method == "GET" and "runs" in parts:
+            return httpx.Response(200, json=self._run(parts[-1], thread_id))
+        if request.method == "GET" and parts[-1] == "messages":
+            run_id = request.url.params.get("run_id") or list(self.runs)[-1]
+            # старый путь читал весь thread: эмулируем страницу из 20 сообщений
+            count = 1 if request.url.params.get("limit") == "1" else 20
+            return httpx.Response(200, json={"object": "list",
+                                             "data": [self._message(thread_id, run_id)] * count})
+        return httpx.Response(404, json={"error": {"message": request.url.path}})
+
+    async def _stream(self, run_id: str, thread_id: str):
+        await asyncio.sleep(max(0.0, self.runs[run_id] - time.perf_counter()))
+        for event, data in (("thread.message.completed", self._message(thread_id, run_id)),
+                            ("thread.run.completed", self._run(run_id, thread_id))):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def legacy_fixed_poll(thread_id: str) -> str:
+    """Прежний цикл из photo_handler/chat_with_gpt."""
+    run = await gpt_client.send_message(thread_id, content="фото")
+    while run.status not in ("completed", "failed", "cancelled", "expired"):
+        await asyncio.sleep(2)
+        run = await gpt_client.client.beta.threads.runs.retrieve(thread_id=run.thread_id, run_id=run.id)
+    messages = await gpt_client.client.beta.threads.messages.list(thread_id=run.thread_id)
+    return next(m.content[0].text.value for m in messages.data if m.role == "assistant")
+
+
+async def adaptive_poll(thread_id: str) -> str:
+    gpt_client.OPENAI_STREAM_RUNS = False
+    return await gpt_client.ask_assistant(thread_id, content="фото")
+
+
+async def streaming(thread_id: str) -> str:
+    gpt_client.OPENAI_STREAM_RUNS = True
+    return await gpt_client.ask_assistant(thread_id, content="фото")
+
+
+async def measure(strategy, durations: list[float], rtt: float) -> tuple[list[float], float]:
+    stub = StubAssistants(rtt, durations)
+    gpt_client.client = openai.AsyncOpenAI(
+        api_key="bench", base_url="http://stub/v1", max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(stub)),
+    )
+    latencies = []
+
+    async def one(i: int) -> None:
+        start = time.perf_counter()
+        await strategy(f"th_{i}")
+        latencies.append(time.perf_counter() - start)
+
+    # по одному run'у за раз — иначе длительности перепутаются между run'ами
+    for i in range(len(durations)):
+        await one(i)
+    return latencies, stub.requests / len(durations)
+
+
+def pct(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--rtt", type=float, default=0.03)
+    parser.add_argument("--min-run", type=float, default=1.0)
+    parser.add_argument("--max-run", type=float, default=6.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    durations = [rnd.uniform(args.min_run, args.max_run) for _ in range(args.runs)]
+    print(f"{'strategy':>18} {'p50, s':>8} {'p95, s':>8} {'req/answer':>11}")
+    for name, strategy in (("fixed 2 s polling", legacy_fixed_poll),
+                           ("adaptive polling", adaptive_poll),
+                           ("streaming", streaming)):
+        latencies, requests = await measure(strategy, durations, args.rtt)
+        print(f"{name:>18} {pct(latencies, 50):8.2f} {pct(latencies, 95):8.2f} {requests:11.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""Пропускная способность конкурентных апдейтов: sync SessionLocal vs AsyncSession.
+
+Каждый «апдейт» делает один запрос к Postgres с искусственной задержкой
+``pg_sleep`` (эмуляция медленного round trip).  Синхронная сессия внутри
+корутины блокирует event loop, поэтому апдейты выполняются строго по очереди;
+асинхронная — позволяет им перекрываться.
+
+Запуск (нужен доступный Postgres из ``.env``)::
+
+    python benchmarks/bench_async_db.py --updates 200 --concurrency 50 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import text  # noqa: E402
+
+from db import SessionLocal, AsyncSessionLocal, async_engine  # noqa: E402
+
+
+async def sync_update(latency: float) -> None:
+    with SessionLocal() as session:
+        session.execute(text("SELECT pg_sleep(:d)"), {"d": latency})
+
+
+async def async_update(latency: float) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(text("SELECT pg_sleep(:d)"), {"d": latency})
+
+
+async def run(handler, updates: int, concurrency: int, latency: float) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with sem:
+            await handler(latency)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(updates)))
+    return updates / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    for name, handler in (("sync SessionLocal", sync_update), ("AsyncSession", async_update)):
+        rate = await run(handler, args.updates, args.concurrency, args.latency)
+        print(f"{name:>18}: {rate:8.1f} updates/s")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
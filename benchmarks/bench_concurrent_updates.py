@@ -0,0 +1,156 @@
+"""Пропускная способность обработки апдейтов: последовательно и параллельно.
+
+Настоящий PTB ``Application`` без сети получает через ``update_queue``
+сообщения от ``--users`` пользователей по ``--messages`` от каждого.  Доля
+``--photo-share`` — фото: обработчик ждёт заглушку Vision ``--vision`` секунд.
+Остальные сообщения — текст, для них заглушка GPT отвечает за ``--gpt``.
+Режимы:
+
+* ``sequential`` — как раньше, апдейты по одному;
+* ``concurrent`` — ``concurrent_updates`` PTB без упорядочивания;
+* ``chat-ordered`` — :class:`bot.update_processor.ChatOrderedUpdateProcessor`.
+
+Печатаются апдейты/с, p50/p95 задержки текстовых ответов и число ответов,
+пришедших в чат не в порядке сообщений::
+
+    python benchmarks/bench_concurrent_updates.py --users 200 --messages 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from telegram import Update, User  # noqa: E402
+from telegram.ext import ApplicationBuilder, MessageHandler, filters  # noqa: E402
+
+from bot.update_processor import ChatOrderedUpdateProcessor  # noqa: E402
+
+
+class FakeOpenAI:
+    """Assistant stub: fixed latency per call, no network."""
+
+    def __init__(self, vision: float, gpt: float):
+        self.vision = vision
+        self.gpt = gpt
+
+    async def ask(self, image: bool) -> str:
+        await asyncio.sleep(self.vision if image else self.gpt)
+        return "Углеводы: 40 г"
+
+
+def make_updates(args, bot) -> list[Update]:
+    rnd = random.Random(0)
+    updates = []
+    for n in range(args.messages):
+        for user in range(1, args.users + 1):
+            update_id = len(updates) + 1
+            message = {
+                "message_id": n, "date": 0,
+                "chat": {"id": user, "type": "private"},
+                "from": {"id": user, "is_bot": False, "first_name": "Bench"},
+            }
+            if rnd.random() < args.photo_share:
+                message["photo"] = [{"file_id": "f", "file_unique_id": "u", "width": 1, "height": 1}]
+            else:
+                message["text"] = f"сахар {n}"
+            updates.append(Update.de_json({"update_id": update_id, "message": message}, bot))
+    rnd.shuffle(updates)
+    # внутри чата сообщения уходят в порядке номеров
+    by_chat: dict[int, list[int]] = {}
+    for update in updates:
+        by_chat.setdefault(update.effective_chat.id, []).append(update.message.message_id)
+    for ids in by_chat.values():
+        ids.sort()
+    counters = {chat: iter(ids) for chat, ids in by_chat.items()}
+    for update in updates:
+        object.__setattr__(update.message, "message_id", next(counters[update.effective_chat.id]))
+    return updates
+
+
+async def run(mode: str, args) -> None:
+    builder = ApplicationBuilder().token("1:bench").updater(None)
+    if mode == "concurrent":
+        builder = builder.concurrent_updates(args.concurrency)
+    elif mode == "chat-ordered":
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(args.concurrency))
+    application = builder.build()
+
+    async def noop(*a, **k):
+        pass
+
+    # без сети: getMe не нужен, бот «уже инициализирован»
+    object.__setattr__(application.bot, "_bot_user", User(1, "bench", True, username="bench"))
+    object.__setattr__(application.bot, "initialize", noop)
+    object.__setattr__(application.bot, "shutdown", noop)
+
+    openai = FakeOpenAI(args.vision, args.gpt)
+    sent_at: dict[int, float] = {}
+    text_latency: list[float] = []
+    last_seen: dict[int, int] = {}
+    out_of_order = 0
+    done = asyncio.Event()
+    handled = 0
+
+    async def handle(update: Update, context) -> None:
+        nonlocal out_of_order, handled
+        await openai.ask(image=bool(update.message.photo))
+        # ответ на более раннее сообщение пришёл после ответа на более позднее
+        chat, number = update.effective_chat.id, update.message.message_id
+        if number < last_seen.get(chat, -1):
+            out_of_order += 1
+        last_seen[chat] = max(number, last_seen.get(chat, -1))
+        if update.message.text:
+            text_latency.append(time.perf_counter() - sent_at[update.update_id])
+        handled += 1
+        if handled == total:
+            done.set()
+
+    application.add_handler(MessageHandler(filters.ALL, handle))
+    updates = make_updates(args, application.bot)
+    total = len(updates)
+
+    await application.initialize()
+    await application.start()
+    start = time.perf_counter()
+    for update in updates:
+        sent_at[update.update_id] = time.perf_counter()
+        await application.update_queue.put(update)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    await application.stop()
+    await application.shutdown()
+
+    text_latency.sort()
+    p95 = text_latency[int(len(text_latency) * 0.95)] if text_latency else float("nan")
+    print(f"{mode:>12}: {handled}/{total} апдейтов за {elapsed:6.2f} с — {handled / elapsed:7.1f} апдейтов/с; "
+          f"ответ на текст p50={statistics.median(text_latency or [float('nan')]):.2f} с, p95={p95:.2f} с; "
+          f"не по порядку: {out_of_order}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=5, help="сообщений от каждого пользователя")
+    parser.add_argument("--photo-share", type=float, default=0.1)
+    parser.add_argument("--vision", type=float, default=1.0, help="задержка заглушки Vision, с")
+    parser.add_argument("--gpt", type=float, default=0.05, help="задержка заглушки GPT, с")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--mode", choices=["sequential", "concurrent", "chat-ordered", "all"], default="all")
+    args = parser.parse_args()
+
+    modes = ("sequential", "concurrent", "chat-ordered") if args.mode == "all" else (args.mode,)
+    for mode in modes:
+        await run(mode, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
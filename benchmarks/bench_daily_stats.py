@@ -0,0 +1,149 @@
+"""Сводка отчёта из всех записей периода и из дневных итогов ``daily_stats``.
+
+Пользователь ведёт дневник ``--days`` дней по ``--per-day`` записей в день.
+Для периодов «неделя», «месяц», «год» и «всё» замеряется, сколько занимает
+получение данных и сборка сводки и строк по дням:
+
+* ``entries`` — как раньше, все записи периода из ``entries`` и подсчёт в Python;
+* ``daily_stats`` — одна строка на день и суммы по ним.
+
+Дополнительно печатается цена записи: :func:`db_access.add_entry_async` с
+обновлением итогов дня.  По умолчанию база — временный SQLite-файл
+(aiosqlite); ``--url`` — то же на Postgres (таблицы создаются миграциями,
+строки пользователя 0 удаляются в конце)::
+
+    python benchmarks/bench_daily_stats.py --days 730 --per-day 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+from sqlalchemy import delete, insert  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import db_access  # noqa: E402
+import report  # noqa: E402
+from db import Base, DailyStat, Entry, User  # noqa: E402
+
+USER_ID = 0
+PERIODS = {"неделя": 7, "месяц": 30, "год": 365, "всё": None}
+
+
+async def fill(engine, sessions, days: int, per_day: int) -> None:
+    random.seed(0)
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    rows = [
+        {"telegram_id": USER_ID, "event_time": start + timedelta(days=d, hours=7 + 2 * i),
+         "sugar_before": round(random.uniform(4, 12), 1), "dose": random.choice([None, 4.0, 6.0]),
+         "carbs_g": random.choice([None, 30.0, 60.0]), "xe": None}
+        for d in range(days) for i in range(per_day)
+    ]
+    async with engine.begin() as conn:
+        for table in (DailyStat, Entry, User):
+            await conn.execute(delete(table).where(table.telegram_id == USER_ID))
+        await conn.execute(insert(User).values(telegram_id=USER_ID, thread_id="bench"))
+        for i in range(0, len(rows), 10000):
+            await conn.execute(insert(Entry), rows[i:i + 10000])
+    async with sessions() as session:
+        await session.run_sync(lambda sync: db_access.rebuild_daily_stats(sync, USER_ID, timezone.utc))
+        await session.commit()
+
+
+def aggregate_entries(entries) -> list[str]:
+    """Прежний подсчёт send_report по всем записям."""
+    sugars = [e.sugar_before for e in entries if e.sugar_before is not None]
+    doses = [e.dose for e in entries if e.dose is not None]
+    lines = [f"{len(entries)}", f"{sum(sugars) / len(sugars):.1f}", f"{sum(doses) / len(doses):.1f}"]
+    by_day = defaultdict(list)
+    for e in entries:
+        by_day[e.event_time.strftime('%d.%m')].append(e)
+    for day, day_entries in sorted(by_day.items()):
+        day_sugars = [e.sugar_before for e in day_entries if e.sugar_before is not None]
+        day_carbs = [e.carbs_g for e in day_entries if e.carbs_g is not None]
+        lines.append(f"{day}: {min(day_sugars)}–{max(day_sugars)}, {sum(day_carbs)}")
+    return lines
+
+
+def aggregate_days(days) -> list[str]:
+    stats = report._period_stats(days, "sugar")
+    lines = [f"{sum(d.entries for d in days)}", f"{stats[0]:.1f}", f"{report._average(days, 'dose')}"]
+    return lines + [report._day_line(day) for day in days]
+
+
+async def measure(call, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--per-day", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", help="async URL базы, напр. postgresql+asyncpg://…")
+    args = parser.parse_args()
+
+    tmp = None
+    url = args.url
+    if url is None:
+        tmp = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+        url = f"sqlite+aiosqlite:///{tmp.name}"
+    engine = create_async_engine(url)
+    if tmp is not None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    sessions = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    db_access.AsyncSessionLocal = sessions
+
+    try:
+        await fill(engine, sessions, args.days, args.per_day)
+        today = datetime.now(timezone.utc).date()
+        print(f"{args.days} дней × {args.per_day} записей")
+        for label, span in PERIODS.items():
+            day_from = today - timedelta(days=span) if span else date.min
+            since = datetime.combine(day_from, datetime.min.time(), tzinfo=timezone.utc)
+
+            async def from_entries():
+                aggregate_entries(await db_access.get_entries_since_async(USER_ID, since))
+
+            async def from_days():
+                aggregate_days(await db_access.get_daily_stats_async(USER_ID, day_from))
+
+            old = await measure(from_entries, args.repeat)
+            new = await measure(from_days, args.repeat)
+            print(f"{label:>7}: entries {old:7.1f} мс, daily_stats {new:6.1f} мс (×{old / new:4.1f})")
+
+        started = time.perf_counter()
+        for i in range(200):
+            await db_access.add_entry_async({
+                "telegram_id": USER_ID, "event_time": datetime.now(timezone.utc), "sugar_before": 6.0 + i % 5,
+            })
+        print(f"запись с обновлением итогов дня: {(time.perf_counter() - started) / 200 * 1000:.2f} мс")
+    finally:
+        if args.url:
+            async with engine.begin() as conn:
+                for table in (DailyStat, Entry, User):
+                    await conn.execute(delete(table).where(table.telegram_id == USER_ID))
+        await engine.dispose()
+        if tmp is not None:
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
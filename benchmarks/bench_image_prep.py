@@ -0,0 +1,109 @@
+"""Сколько байт уходит в Vision и сколько ждёт пользователь: до и после ужатия.
+
+Три входа:
+
+* ``photo`` — фото из Telegram: набор размеров (90…2560 px), раньше брался
+  самый большой, теперь :func:`image_prep.pick_photo`;
+* ``jpeg`` — снимок камеры документом (4032×3024, EXIF);
+* ``png`` — скриншот/PNG документом (3000×2000).
+
+Документы теперь проходят :func:`image_prep.prepare` (время подготовки
+замеряется по-настоящему, в пуле потоков).  Загрузка и ответ Vision
+моделируются: канал ``--mbps`` Мбит/с, ответ ``--vision-base`` секунд плюс
+``--per-ktoken`` секунд на 1000 токенов изображения (токены — по плиткам
+512 px, как считает OpenAI для ``detail=high``).  ``--image`` подставляет
+свою фотографию вместо синтетической::
+
+    python benchmarks/bench_image_prep.py --mbps 5
+"""
+import argparse
+import asyncio
+import io
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+from PIL import Image, ImageFilter  # noqa: E402
+
+import image_prep  # noqa: E402
+
+
+def synthetic_photo(size: tuple[int, int]) -> Image.Image:
+    """Gradient with blurred noise: compresses roughly like a real photo."""
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40).filter(ImageFilter.GaussianBlur(1))
+    return Image.merge("RGB", (gradient, noise, Image.eval(gradient, lambda v: 255 - v)))
+
+
+def encode(img: Image.Image, fmt: str, **kwargs) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def image_tokens(data: bytes) -> int:
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def telegram_sizes(img: Image.Image) -> list:
+    sizes = []
+    for edge in (90, 320, 800, 1280, 2560):
+        copy = img.copy()
+        copy.thumbnail((edge, edge))
+        data = encode(copy, "JPEG", quality=87)
+        sizes.append(type("PhotoSize", (), {"width": copy.width, "height": copy.height, "data": data}))
+    return sizes
+
+
+def report(label: str, data: bytes, prep: float, args) -> None:
+    upload = len(data) * 8 / (args.mbps * 1e6)
+    tokens = image_tokens(data)
+    vision = args.vision_base + tokens / 1000 * args.per_ktoken
+    print(f"{label:>14}: {len(data) / 1024:8.0f} КБ, {tokens:5d} токенов; подготовка {prep * 1000:6.1f} мс, "
+          f"загрузка {upload:5.2f} с, Vision {vision:5.2f} с — итого {prep + upload + vision:5.2f} с")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mbps", type=float, default=10.0, help="канал до OpenAI, Мбит/с")
+    parser.add_argument("--vision-base", type=float, default=4.0)
+    parser.add_argument("--per-ktoken", type=float, default=1.0)
+    parser.add_argument("--image", help="своя фотография вместо синтетической")
+    args = parser.parse_args()
+
+    if args.image:
+        source = Image.open(args.image).convert("RGB")
+    else:
+        source = synthetic_photo((4032, 3024))
+    exif = Image.Exif()
+    exif[0x010F] = "Phone"
+
+    sizes = telegram_sizes(source)
+    report("photo до", sizes[-1].data, 0.0, args)
+    report("photo после", image_prep.pick_photo(sizes).data, 0.0, args)
+
+    documents = {
+        "jpeg": encode(source, "JPEG", quality=95, exif=exif.tobytes()),
+        "png": encode(source.resize((3000, 2000)), "PNG"),
+    }
+    for name, data in documents.items():
+        report(f"{name} до", data, 0.0, args)
+        start = time.perf_counter()
+        prepared = await image_prep.prepare(data)
+        report(f"{name} после", prepared, time.perf_counter() - start, args)
+    image_prep.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""Локальный разбор дневниковых сообщений против вызова LLM.
+
+Прогоняет корпус ``tests/data/parser_corpus.jsonl`` через
+:func:`local_command_parser.parse_local` и печатает: время разбора на
+сообщение, долю сообщений, закрытых локально, сколько вызовов LLM сэкономлено
+и сколько локальных ответов расходятся с эталоном.
+
+Эталон (ключ ``expected``) размечен вручную; с ``--record`` он
+перезаписывается реальными ответами :func:`gpt_command_parser.parse_command`
+в обход локального пути (нужен ``OPENAI_API_KEY``).
+
+Запуск::
+
+    python benchmarks/bench_local_parser.py --repeat 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+from config import LOCAL_PARSER_MIN_CONFIDENCE  # noqa: E402
+from local_command_parser import parse_local  # noqa: E402
+
+CORPUS = ROOT / "tests" / "data" / "parser_corpus.jsonl"
+
+
+def load() -> list[dict]:
+    with CORPUS.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def record(items: list[dict]) -> None:
+    import gpt_command_parser
+
+    # порог выше 1 — локальный путь никогда не срабатывает
+    gpt_command_parser.LOCAL_PARSER_MIN_CONFIDENCE = 2.0
+    for item in items:
+        item["expected"] = await gpt_command_parser.parse_command(item["text"])
+        print(f"{item['text']!r} -> {item['expected']}")
+    with CORPUS.open("w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=1000, help="прогонов корпуса для замера времени")
+    parser.add_argument("--record", action="store_true", help="перезаписать эталон ответами LLM")
+    args = parser.parse_args()
+
+    items = load()
+    if args.record:
+        asyncio.run(record(items))
+
+    texts = [item["text"] for item in items]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            parse_local(text)
+    per_msg = (time.perf_counter() - start) / (args.repeat * len(texts))
+
+    local = mismatched = 0
+    for item in items:
+        result, confidence = parse_local(item["text"])
+        if result is None or confidence < LOCAL_PARSER_MIN_CONFIDENCE:
+            continue
+        local += 1
+        if result != item["expected"]:
+            mismatched += 1
+            print(f"расхождение: {item['text']!r}: {result} != {item['expected']}")
+
+    print(f"сообщений в корпусе:   {len(items)}")
+    print(f"локальный разбор:      {per_msg * 1e6:.1f} мкс/сообщение")
+    print(f"закрыто локально:      {local} ({local / len(items):.0%}) — столько вызовов LLM сэкономлено")
+    print(f"ушло в LLM:            {len(items) - local}")
+    print(f"расхождений с эталоном: {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
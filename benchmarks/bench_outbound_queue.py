@@ -0,0 +1,177 @@
+"""Нагрузочный тест очереди исходящих сообщений: 50k напоминаний в одну минуту.
+
+Напоминания ставятся в :class:`reminder_scheduler.ReminderDispatcher` со
+временем в пределах одной минуты и уходят через локальный ``FakeBot``.
+FakeBot, как Telegram, пропускает не больше ``--limit`` сообщений в секунду и
+на превышение отвечает 429 с ``retry_after``.  Во время всплеска
+пользователи пишут боту; замеряется задержка этих интерактивных ответов.
+
+Режимы:
+
+* ``direct`` — как раньше: каждое наступившее напоминание сразу
+  ``send_message``, без очереди (429 = потерянное напоминание);
+* ``queue`` — через :class:`outbound_queue.OutboundQueue`.
+
+Чтобы не ждать реальные полчаса, время сжимается в ``--speedup`` раз: во
+столько же раз растут лимит FakeBot и скорость очереди, а задержки
+печатаются в пересчёте на реальное время::
+
+    python benchmarks/bench_outbound_queue.py --reminders 50000 --speedup 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+from outbound_queue import PRIORITY_INTERACTIVE, OutboundQueue  # noqa: E402
+from reminder_scheduler import ReminderDispatcher  # noqa: E402
+
+
+class RetryAfter(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Flood control exceeded. Retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class FakeBot:
+    """Bot stub with Telegram-like global flood control."""
+
+    def __init__(self, limit: float, speedup: float, rtt: float):
+        self.limit = limit
+        self.speedup = speedup
+        self.rtt = rtt
+        self.window: deque[float] = deque()
+        self.sent: dict[int, list[str]] = {}
+        self.rejected = 0
+
+    async def send_message(self, chat_id: int, text: str):
+        await asyncio.sleep(self.rtt)
+        now = time.monotonic()
+        while self.window and now - self.window[0] > 1:
+            self.window.popleft()
+        if len(self.window) >= self.limit:
+            self.rejected += 1
+            raise RetryAfter(1 / self.speedup)
+        self.window.append(now)
+        self.sent.setdefault(chat_id, []).append(text)
+        return True
+
+
+def make_reminders(n: int, chats: int, window: float):
+    base = datetime.now(timezone.utc) + timedelta(seconds=0.5)
+    rnd = random.Random(0)
+    times = sorted(base + timedelta(seconds=rnd.random() * window) for _ in range(n))
+    # номер в тексте растёт со временем — так видно нарушение порядка в чате
+    # отрицательные id — напоминания без строки в БД, диспетчер не пишет в базу
+    return [(-(i + 1), i % chats, t, f"#{i}", None, timezone.utc) for i, t in enumerate(times)]
+
+
+async def interactive_probe(send, count: int, interval: float) -> list[float]:
+    latencies = []
+    for i in range(count):
+        await asyncio.sleep(interval)
+        start = time.perf_counter()
+        try:
+            await send(10_000_000 + i)
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            latencies.append(float("inf"))
+    return latencies
+
+
+def ordered(bot: FakeBot) -> bool:
+    return all(
+        [int(t[1:]) for t in texts] == sorted(int(t[1:]) for t in texts)
+        for texts in bot.sent.values()
+    )
+
+
+async def run(mode: str, args) -> None:
+    scale = args.speedup
+    bot = FakeBot(args.limit * scale, scale, args.rtt / scale)
+    items = make_reminders(args.reminders, args.chats, 60 / scale)
+    queue = OutboundQueue(rate=args.rate * scale, workers=args.workers)
+    dispatcher = ReminderDispatcher(outbound=queue)
+    dispatcher.bot = bot
+    lost = 0
+
+    if mode == "direct":
+        def fire(reminder_id, chat_id, text, rule, tz, fire_at):
+            async def send():
+                nonlocal lost
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text)
+                except RetryAfter:
+                    lost += 1
+            asyncio.create_task(send())
+
+        dispatcher._fire = fire
+
+        async def send_reply(chat_id):
+            await bot.send_message(chat_id=chat_id, text="#0")
+    else:
+        async def send_reply(chat_id):
+            await queue.submit(chat_id, lambda: bot.send_message(chat_id=chat_id, text="#0"),
+                               PRIORITY_INTERACTIVE)
+
+    start = time.perf_counter()
+    dispatcher.load(items)
+    dispatcher._ensure_running()
+    probe = asyncio.create_task(interactive_probe(send_reply, 20, 3 / scale))
+
+    def delivered():
+        return sum(len(texts) for chat, texts in bot.sent.items() if chat < 10_000_000)
+
+    deadline = start + 3600 / scale
+    while time.perf_counter() < deadline:
+        done = delivered() + (lost if mode == "direct" else 0)
+        if done >= args.reminders:
+            break
+        await asyncio.sleep(0.05)
+    total = time.perf_counter() - start
+    latencies = await probe
+    await dispatcher.stop()
+    await queue.stop()
+
+    finite = [x for x in latencies if x != float("inf")]
+    print(f"{mode:>6}: доставлено {delivered()}/{args.reminders} напоминаний "
+          f"за {total * scale:.0f} с (реального времени), 429 от Telegram: {bot.rejected}")
+    if mode == "direct":
+        print(f"        потеряно из-за 429: {lost}")
+    else:
+        stats = queue.stats()
+        print(f"        lag p50={stats['lag_p50'] * scale:.1f} с, p95={stats['lag_p95'] * scale:.1f} с, "
+              f"max={stats['lag_max'] * scale:.1f} с; повторов после 429: {stats['rate_limited']}")
+    print(f"        порядок в чатах сохранён: {ordered(bot)}")
+    if finite:
+        print(f"        интерактивный ответ во время всплеска: p50={statistics.median(finite) * scale:.2f} с, "
+              f"max={max(finite) * scale:.2f} с, не доставлено: {len(latencies) - len(finite)}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reminders", type=int, default=50_000)
+    parser.add_argument("--chats", type=int, default=20_000)
+    parser.add_argument("--limit", type=float, default=30, help="лимит FakeBot, сообщений/с")
+    parser.add_argument("--rate", type=float, default=30, help="скорость очереди, сообщений/с")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rtt", type=float, default=0.05, help="время запроса к Bot API, с")
+    parser.add_argument("--speedup", type=float, default=20)
+    parser.add_argument("--mode", choices=["direct", "queue", "both"], default="both")
+    args = parser.parse_args()
+
+    for mode in ("direct", "queue") if args.mode == "both" else (args.mode,):
+        await run(mode, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+"""Сколько добавляет хранение состояния диалогов к обработке одного апдейта.
+
+Апдейты ``--updates`` приходят от ``--users`` пользователей (активные пишут
+чаще), каждый меняет ``user_data`` как шаг расчёта дозы.
+Замеряется время, которое апдейт проводит в хуках persistence:
+
+* ``memory`` — без хранения, ``user_data`` только в памяти (как раньше);
+* ``write-through`` — на каждом апдейте проверка версии и запись в базу;
+* ``write-back`` — :class:`state_persistence.StatePersistence` с настройками
+  по умолчанию: LRU в памяти, запись пачкой раз в ``--flush-interval`` с.
+
+Фоновая запись write-back не входит в задержку апдейта, её стоимость видна
+в числе транзакций.  База по умолчанию — временный SQLite-файл, ``--url``
+(``postgresql+asyncpg://…``) — Postgres с таблицей ``bot_state`` из миграций;
+строки бенчмарка (отрицательные telegram_id) удаляются в конце::
+
+    python benchmarks/bench_persistence.py --updates 20000 --users 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+from sqlalchemy import delete  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from db import Base, BotState  # noqa: E402
+from state_persistence import SqlStateStore, StatePersistence  # noqa: E402
+
+
+class CountingStore(SqlStateStore):
+    def __init__(self, factory):
+        super().__init__(factory)
+        self.queries = 0
+        self.transactions = 0
+
+    async def load(self, user_id):
+        self.queries += 1
+        return await super().load(user_id)
+
+    async def version(self, user_id):
+        self.queries += 1
+        return await super().version(user_id)
+
+    async def save(self, writes):
+        self.transactions += 1
+        return await super().save(writes)
+
+
+def traffic(updates: int, users: int) -> list[int]:
+    rnd = random.Random(0)
+    # небольшая доля пользователей присылает большую часть апдейтов
+    return [-(1 + int(users * rnd.random() ** 3)) for _ in range(updates)]
+
+
+def handle(user_data: dict, step: int) -> None:
+    user_data["pending_entry"] = {
+        "event_time": datetime.now(timezone.utc),
+        "carbs_g": 40 + step % 7,
+        "sugar_before": 6.5,
+        "dose": None,
+    }
+    user_data["thread_id"] = "thread_bench"
+
+
+async def run(mode: str, args, factory) -> None:
+    store = CountingStore(factory)
+    persistence = None
+    if mode == "write-through":
+        persistence = StatePersistence(store, refresh_after=0, flush_interval=args.flush_interval)
+    elif mode == "write-back":
+        persistence = StatePersistence(store, flush_interval=args.flush_interval)
+
+    user_data: dict[int, dict] = {}
+    touched: set[int] = set()
+    stop = asyncio.Event()
+
+    async def ptb_updater():
+        # как Application.update_persistence: раз в update_interval, пачкой
+        while not stop.is_set():
+            await asyncio.sleep(args.flush_interval)
+            ids = list(touched)
+            touched.clear()
+            await asyncio.gather(*(persistence.update_user_data(uid, dict(user_data[uid])) for uid in ids))
+
+    updater = asyncio.create_task(ptb_updater()) if mode == "write-back" else None
+    latencies = []
+    start = time.perf_counter()
+    for step, uid in enumerate(traffic(args.updates, args.users)):
+        began = time.perf_counter()
+        data = user_data.setdefault(uid, {})
+        if persistence:
+            await persistence.refresh_user_data(uid, data)
+        handle(data, step)
+        if mode == "write-through":
+            await persistence.update_user_data(uid, data)
+            await persistence.flush()
+        elif mode == "write-back":
+            touched.add(uid)
+        latencies.append(time.perf_counter() - began)
+        if step % 50 == 0:
+            await asyncio.sleep(0)  # апдейты приходят не сплошным потоком
+    total = time.perf_counter() - start
+    if updater:
+        stop.set()
+        await updater
+        await persistence.flush()
+
+    latencies.sort()
+    line = (f"{mode:>13}: {args.updates / total:8.0f} апдейтов/с, задержка p50={statistics.median(latencies) * 1e6:7.1f} мкс, "
+            f"p99={latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} мкс")
+    if persistence:
+        stats = persistence.stats()
+        line += (f"; запросов {store.queries}, транзакций {store.transactions}, "
+                 f"строк записано {stats['writes']}, конфликтов {stats['conflicts']}")
+    print(line)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--url", help="async URL базы, по умолчанию временный SQLite")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.url:
+        engine = create_async_engine(args.url)
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp.name}/state.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        for mode in ("memory", "write-through", "write-back"):
+            async with engine.begin() as conn:
+                await conn.execute(delete(BotState).where(BotState.telegram_id < 0))
+            await run(mode, args, factory)
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(delete(BotState).where(BotState.telegram_id < 0))
+        await engine.dispose()
+        if tmp:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
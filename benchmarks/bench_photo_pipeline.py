@@ -0,0 +1,130 @@
+"""Время от получения фото до начала загрузки в Vision: через диск и в памяти.
+
+``--photos`` фото по ``--size`` КБ обрабатываются по ``--concurrency``
+одновременно.  «Telegram» отдаёт файл заглушкой без сети, «OpenAI» отмечает
+момент, когда ``files.create`` получил файл.  Замеряется путь:
+
+* ``disk`` — как раньше: ``download_to_drive`` в каталог, чтение файла для
+  хэша кэша Vision и повторное открытие для загрузки;
+* ``memory`` — :func:`bot.handlers._download` в буфер, загрузка байтов через
+  :func:`gpt_client._post_message`, копия на диск в фоне
+  (:mod:`photo_storage`).
+
+``--fsync`` заставляет запись ждать диск, как на нагруженном сервере::
+
+    python benchmarks/bench_photo_pipeline.py --photos 500 --size 250
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+import gpt_client  # noqa: E402
+import photo_storage  # noqa: E402
+from bot.handlers import _download  # noqa: E402
+
+
+class FakeTelegramFile:
+    def __init__(self, data: bytes, fsync: bool):
+        self.data = data
+        self.fsync = fsync
+
+    async def download_to_memory(self, out) -> None:
+        out.write(self.data)
+
+    async def download_to_drive(self, path) -> None:
+        def write():
+            with open(path, "wb") as f:
+                f.write(self.data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        await asyncio.to_thread(write)
+
+
+class FakeOpenAI:
+    """Records when an upload starts; reads file objects like the SDK does."""
+
+    def __init__(self):
+        self.started: list[float] = []
+        self.files = SimpleNamespace(create=self._create)
+        self.beta = SimpleNamespace(threads=SimpleNamespace(messages=SimpleNamespace(create=self._message)))
+
+    async def _create(self, file, purpose):
+        self.started.append(time.perf_counter())
+        if hasattr(file, "read"):
+            file.read()
+        return SimpleNamespace(id="file_bench")
+
+    async def _message(self, **kwargs):
+        pass
+
+
+async def disk_pipeline(file, directory: Path, n: int) -> None:
+    path = directory / f"{n}.jpg"
+    await file.download_to_drive(path)
+    image = await asyncio.to_thread(path.read_bytes)
+    hashlib.sha256(image).hexdigest()  # ключ кэша Vision
+    await gpt_client._post_message("th_bench", "фото", str(path))
+
+
+async def memory_pipeline(file, directory: Path, n: int) -> None:
+    image = await _download(file)
+    photo_storage.save_later(f"{n}.jpg", image)
+    hashlib.sha256(image).hexdigest()
+    await gpt_client._post_message("th_bench", "фото", None, image, f"{n}.jpg")
+
+
+async def run(mode: str, args) -> None:
+    fake = FakeOpenAI()
+    gpt_client.client = fake
+    data = os.urandom(args.size * 1024)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        photo_storage.PHOTOS_DIR = tmp
+        pipeline = disk_pipeline if mode == "disk" else memory_pipeline
+
+        async def one(n: int) -> None:
+            async with semaphore:
+                received = time.perf_counter()
+                await pipeline(FakeTelegramFile(data, args.fsync), directory, n)
+                latencies.append(fake.started[-1] - received)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(args.photos)))
+        elapsed = time.perf_counter() - start
+        await photo_storage.drain()
+        saved = len(list(directory.glob("*.jpg")))
+
+    latencies.sort()
+    print(f"{mode:>6}: до начала загрузки p50={statistics.median(latencies) * 1000:6.2f} мс, "
+          f"p95={latencies[int(len(latencies) * 0.95)] * 1000:6.2f} мс; {args.photos / elapsed:7.0f} фото/с; "
+          f"на диске {saved} файлов")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=500)
+    parser.add_argument("--size", type=int, default=250, help="размер фото, КБ")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--fsync", action="store_true")
+    args = parser.parse_args()
+    for mode in ("disk", "memory"):
+        await run(mode, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
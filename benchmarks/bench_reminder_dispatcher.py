@@ -0,0 +1,122 @@
+"""Стоимость планирования напоминаний: куча диспетчера vs job-объекты APScheduler.
+
+Для каждого размера (по умолчанию 10k, 100k, 1M) замеряется:
+
+* время постановки одного напоминания (``schedule``) и массовой загрузки
+  (``load``, как при старте бота);
+* время извлечения наступивших (``pop_due``) в пересчёте на напоминание;
+* память на одно напоминание (tracemalloc).
+
+APScheduler ``add_job`` на том же наборе меряется до ``--apscheduler-max``
+(дальше слишком долго).  База и Telegram не нужны::
+
+    python benchmarks/bench_reminder_dispatcher.py --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+from reminder_scheduler import ReminderDispatcher  # noqa: E402
+
+RULES = [None, None, "daily", "weekdays", "hours:4"]
+TEXTS = ["измерить сахар", "сделать укол", "принять таблетку", "перекусить"]
+
+
+def make_items(n: int):
+    base = datetime.now(timezone.utc) + timedelta(days=1)
+    rnd = random.Random(n)
+    return [
+        (i, 100000 + i % 50000, base + timedelta(seconds=rnd.randrange(7 * 24 * 3600)),
+         TEXTS[i % len(TEXTS)], RULES[i % len(RULES)], timezone.utc)
+        for i in range(1, n + 1)
+    ]
+
+
+def measure_memory(build) -> tuple[object, int]:
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+
+def bench_dispatcher(items) -> None:
+    n = len(items)
+    dispatcher = ReminderDispatcher()
+    start = time.perf_counter()
+    for item in items:
+        dispatcher.schedule(*item)
+    per_schedule = (time.perf_counter() - start) / n
+
+    bulk = ReminderDispatcher()
+    start = time.perf_counter()
+    bulk.load(items)
+    load = time.perf_counter() - start
+
+    horizon = max(item[2] for item in items).timestamp()
+    start = time.perf_counter()
+    popped = len(dispatcher.pop_due(horizon))
+    per_pop = (time.perf_counter() - start) / popped
+
+    _, memory = measure_memory(lambda: _loaded(items))
+    print(f"  dispatcher: schedule {per_schedule * 1e6:5.2f} мкс, load {load:6.2f} с, "
+          f"pop {per_pop * 1e6:5.2f} мкс, память {memory / n:6.0f} Б/напоминание")
+
+
+def _loaded(items):
+    dispatcher = ReminderDispatcher()
+    dispatcher.load(items)
+    return dispatcher
+
+
+async def bench_apscheduler(items) -> None:
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+    async def noop(**kwargs):
+        pass
+
+    n = len(items)
+
+    def build():
+        scheduler = AsyncIOScheduler()
+        scheduler.start(paused=True)
+        for reminder_id, chat_id, run_time, text, _, _ in items:
+            scheduler.add_job(noop, "date", run_date=run_time, id=str(reminder_id),
+                              kwargs={"chat_id": chat_id, "text": text})
+        return scheduler
+
+    start = time.perf_counter()
+    scheduler, memory = measure_memory(build)
+    elapsed = time.perf_counter() - start
+    scheduler.shutdown(wait=False)
+    print(f"  apscheduler: add_job {elapsed / n * 1e6:5.1f} мкс, "
+          f"память {memory / n:6.0f} Б/напоминание")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--apscheduler-max", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        print(f"{n} напоминаний:")
+        items = make_items(n)
+        bench_dispatcher(items)
+        if n <= args.apscheduler_max:
+            await bench_apscheduler(items)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""Время подъёма напоминаний из базы при старте бота.
+
+В таблицу ``reminders`` кладётся ``--pending`` будущих неотправленных
+напоминаний и ``--delivered`` уже отправленных/прошедших, затем замеряется
+:func:`reminder_scheduler.rehydrate_reminders`: отдельно запрос и
+постановка в планировщик.
+
+По умолчанию база — временный SQLite-файл (aiosqlite); ``--url`` позволяет
+прогнать то же на Postgres (таблицы должны быть созданы миграциями, строки
+бенчмарка пользователя 0 удаляются в конце)::
+
+    python benchmarks/bench_reminder_rehydration.py --pending 100000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+from sqlalchemy import delete, insert  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import db_access  # noqa: E402
+import reminder_scheduler  # noqa: E402
+from db import Base, Reminder, User  # noqa: E402
+
+USER_ID = 0
+
+
+class NullBot:
+    async def send_message(self, chat_id: int, text: str) -> None:
+        pass
+
+
+async def fill(engine, pending: int, delivered: int) -> None:
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"telegram_id": USER_ID, "time": now + timedelta(days=1, seconds=i), "message": f"r{i}"}
+        for i in range(pending)
+    ] + [
+        {"telegram_id": USER_ID, "time": now - timedelta(seconds=i), "message": f"d{i}",
+         "delivered_at": now - timedelta(seconds=i)}
+        for i in range(delivered)
+    ]
+    async with engine.begin() as conn:
+        await conn.execute(delete(Reminder).where(Reminder.telegram_id == USER_ID))
+        await conn.execute(delete(User).where(User.telegram_id == USER_ID))
+        await conn.execute(insert(User).values(telegram_id=USER_ID, thread_id="bench"))
+        for i in range(0, len(rows), 10000):
+            await conn.execute(insert(Reminder), rows[i:i + 10000])
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pending", type=int, default=100_000)
+    parser.add_argument("--delivered", type=int, default=100_000)
+    parser.add_argument("--url", help="async URL базы, по умолчанию временный SQLite")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.url:
+        engine = create_async_engine(args.url)
+    else:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp.name}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    db_access.AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        await fill(engine, args.pending, args.delivered)
+
+        start = time.perf_counter()
+        rows = await db_access.get_pending_reminders_async(datetime.now(timezone.utc))
+        query = time.perf_counter() - start
+        print(f"запрос:        {len(rows)} строк за {query:.2f} с")
+
+        start = time.perf_counter()
+        count = await reminder_scheduler.rehydrate_reminders(NullBot())
+        total = time.perf_counter() - start
+        print(f"rehydrate:     {count} напоминаний за {total:.2f} с "
+              f"(постановка ≈ {max(total - query, 0):.2f} с)")
+    finally:
+        await reminder_scheduler.dispatcher.stop()
+        if args.url:
+            async with engine.begin() as conn:
+                await conn.execute(delete(Reminder).where(Reminder.telegram_id == USER_ID))
+                await conn.execute(delete(User).where(User.telegram_id == USER_ID))
+        await engine.dispose()
+        if tmp is not None:
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
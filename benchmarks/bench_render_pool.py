@@ -0,0 +1,92 @@
+"""Задержка event loop во время генерации отчётов: в корутине vs пул процессов.
+
+Параллельно с ``--reports`` отчётами (график + PDF за месяц) крутится
+«пульс» — корутина, которая каждые 10 мс замеряет, насколько опоздал её
+``sleep``.  Большое опоздание означает, что бот в это время не отвечал никому.
+
+Запуск::
+
+    python benchmarks/bench_render_pool.py --reports 8 --workers 2
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+import report_render  # noqa: E402
+from render_pool import RenderPool  # noqa: E402
+
+
+def month_data(points: int):
+    start = datetime.datetime(2025, 5, 1)
+    times = [start + datetime.timedelta(minutes=int(i * 30 * 24 * 60 / points)) for i in range(points)]
+    sugars = [round(random.uniform(4, 14), 1) for _ in range(points)]
+    summary = ["• Всего записей: %d" % points, "• Средний сахар: 7.9 ммоль/л"]
+    days = [f"{d:02d}.05: сахар 4.2–13.1, доза 24, углеводы 180" for d in range(1, 31)]
+    return times, sugars, summary, days, "Рекомендации.\n" * 40
+
+
+async def heartbeat(stop: asyncio.Event, lags: list[float]) -> None:
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - t - 0.01)
+
+
+async def run(mode: str, reports: int, points: int, pool: RenderPool | None) -> None:
+    data = [month_data(points) for _ in range(reports)]
+    lags: list[float] = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    await asyncio.sleep(0.05)
+
+    async def one(times, sugars, summary, days, text):
+        if pool is None:
+            report_render.render_chart(times, sugars, "месяц")
+            report_render.render_pdf(summary, [], days, text, times, sugars, "месяц")
+        else:
+            await pool.chart(times, sugars, "месяц")
+            await pool.pdf(summary, [], days, text, times, sugars, "месяц")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*d) for d in data))
+    total = time.perf_counter() - start
+    stop.set()
+    await beat
+    lags.sort()
+    print(f"{mode:>8}: {reports} отчётов за {total:.2f} с, "
+          f"лаг loop p50={statistics.median(lags) * 1000:.1f} мс, "
+          f"max={lags[-1] * 1000:.0f} мс")
+    if pool is not None:
+        print(f"          пул: {pool.stats()}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=8)
+    parser.add_argument("--points", type=int, default=300, help="точек сахара в отчёте")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    report_render.warm_up()
+    await run("inline", args.reports, args.points, None)
+
+    pool = RenderPool(args.workers, args.max_concurrency)
+    try:
+        await pool.start()
+        await run("pool", args.reports, args.points, pool)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""Повторный отчёт за тот же период: без кэша и из кэша готовых отчётов.
+
+Пользователь ``--repeat`` раз подряд запрашивает отчёт за месяц (``--entries``
+записей).  График и PDF рисует настоящий пул процессов, GPT — заглушка,
+отвечающая за ``--gpt-latency`` секунд и считающая токены запроса (≈4
+символа на токен).  Данные из базы подставлены, их чтение не замеряется.
+Режимы:
+
+* ``no-cache`` — каждый раз всё заново, как раньше;
+* ``cache`` — :mod:`report_cache` во временном каталоге, версия данных не
+  меняется, поэтому все запросы после первого — попадания.
+
+Печатается время полного ответа (до отправки PDF): первого и p50 повторных,
+а также потраченные токены::
+
+    python benchmarks/bench_report_cache.py --repeat 5
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+import report  # noqa: E402
+from render_pool import render_pool  # noqa: E402
+from report_cache import ReportCache  # noqa: E402
+
+
+class FakeGPT:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, **kwargs):
+        self.tokens += sum(len(m["content"]) for m in messages) // 4 + kwargs.get("max_tokens", 0)
+        await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content="Сахар в целевом диапазоне большую часть времени.\n" * 10)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class Message:
+    async def reply_text(self, text, **kwargs):
+        return SimpleNamespace(edit_text=self.edit_text)
+
+    async def edit_text(self, text, **kwargs):
+        pass
+
+    async def reply_photo(self, photo, caption=None):
+        pass
+
+    async def reply_document(self, document, filename=None, caption=None):
+        pass
+
+
+def fake_data(count: int):
+    random.seed(0)
+    start = datetime.datetime(2025, 5, 1, tzinfo=datetime.timezone.utc)
+    entries = [
+        SimpleNamespace(event_time=start + datetime.timedelta(hours=3 * i), sugar_before=round(random.uniform(4, 13), 1),
+                        dose=4.0, carbs_g=45.0, xe=3.7)
+        for i in range(count)
+    ]
+    days = {}
+    for e in entries:
+        day = days.setdefault(e.event_time.date(), SimpleNamespace(
+            local_date=e.event_time.date(), entries=0, sugar_count=0, sugar_sum=0.0, sugar_min=None,
+            sugar_max=None, sugar_sumsq=0.0, dose_count=0, dose_sum=0.0, dose_sumsq=0.0,
+            carbs_count=0, carbs_sum=0.0, carbs_sumsq=0.0))
+        day.entries += 1
+        day.sugar_count += 1
+        day.sugar_sum += e.sugar_before
+        day.sugar_sumsq += e.sugar_before ** 2
+        day.sugar_min = min(day.sugar_min or 99, e.sugar_before)
+        day.sugar_max = max(day.sugar_max or 0, e.sugar_before)
+        day.dose_count += 1
+        day.dose_sum += e.dose
+        day.carbs_count += 1
+        day.carbs_sum += e.carbs_g
+    return entries, list(days.values())
+
+
+async def run(mode: str, args, cache_dir: str) -> None:
+    entries, days = fake_data(args.entries)
+
+    async def stats(*a):
+        return days
+
+    async def series(*a):
+        return entries
+
+    async def zone(*a):
+        return datetime.timezone.utc
+
+    async def version(*a):
+        return "2025-01-01T00:00:00/1"
+
+    gpt = FakeGPT(args.gpt_latency)
+    report.get_daily_stats_async = stats
+    report.get_report_series_async = series
+    report.get_user_timezone_async = zone
+    report.get_data_version_async = version
+    report.client = gpt
+    report.report_cache = ReportCache(cache_dir if mode == "cache" else "", max_bytes=200 * 2 ** 20)
+
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=1), message=Message())
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        await report.send_report(update, None, datetime.datetime(2025, 5, 1), "месяц")
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f"{mode:>8}: первый {timings[0]:7.1f} мс, повторные p50 {statistics.median(timings[1:]):7.1f} мс, "
+          f"токенов GPT {gpt.tokens}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--entries", type=int, default=240)
+    parser.add_argument("--gpt-latency", type=float, default=4.0, help="ответ GPT, с")
+    args = parser.parse_args()
+    await render_pool.start()
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for mode in ("no-cache", "cache"):
+                await run(mode, args, cache_dir)
+    finally:
+        render_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
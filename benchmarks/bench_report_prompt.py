@@ -0,0 +1,115 @@
+"""Размер промпта анализа отчёта и задержка GPT: все записи против статистики.
+
+Дневник с ``--per-day`` записями в день; для отчётов за 7, 30 и 90 дней
+строятся два промпта:
+
+* ``rows`` — как раньше: сводка, строки по дням и строка на каждую запись;
+* ``stats`` — :func:`report_prompt.build_prompt` в бюджете ``REPORT_PROMPT_TOKENS``.
+
+Токены считаются :func:`report_prompt.count_tokens` (tiktoken, если
+установлен, иначе оценка с запасом).  Задержка GPT — модель: ``--base``
+секунд плюс ``--prefill`` секунд на 1000 входных токенов плюс ``--output``
+токенов ответа со скоростью ``--tps``; с ``--live`` промпты отправляются в
+настоящий gpt-4o-mini (нужен OPENAI_API_KEY)::
+
+    python benchmarks/bench_report_prompt.py --per-day 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+import report  # noqa: E402
+import report_prompt  # noqa: E402
+
+PERIODS = (7, 30, 90)
+
+
+def diary(days: int, per_day: int):
+    random.seed(0)
+    start = datetime(2025, 5, 1, 6, tzinfo=timezone.utc)
+    entries = [
+        SimpleNamespace(event_time=start + timedelta(days=d, minutes=int(i * 16 * 60 / per_day)),
+                        sugar_before=round(random.gauss(8, 2.8), 1), carbs_g=random.choice([None, 30.0, 55.0]),
+                        xe=None, dose=random.choice([None, 3.0, 5.5]))
+        for d in range(days) for i in range(per_day)
+    ]
+    rows = []
+    for d in range(days):
+        day = entries[d * per_day:(d + 1) * per_day]
+        sugars = [e.sugar_before for e in day]
+        rows.append(SimpleNamespace(
+            local_date=date(2025, 5, 1) + timedelta(days=d), entries=len(day),
+            sugar_count=len(sugars), sugar_sum=sum(sugars), sugar_sumsq=sum(s * s for s in sugars),
+            sugar_min=min(sugars), sugar_max=max(sugars),
+            dose_count=sum(e.dose is not None for e in day), dose_sum=sum(e.dose or 0 for e in day), dose_sumsq=0,
+            carbs_count=sum(e.carbs_g is not None for e in day), carbs_sum=sum(e.carbs_g or 0 for e in day),
+            carbs_sumsq=0,
+        ))
+    return rows, entries
+
+
+def rows_prompt(label, summary_lines, day_lines, entries) -> str:
+    """Прежний промпт send_report со строкой на каждую запись."""
+    detail = "\n".join(
+        f"{e.event_time:%Y-%m-%d %H:%M}: сахар={e.sugar_before or '-'} ммоль/л, углеводы={e.carbs_g or '-'} г, "
+        f"ХЕ={e.xe or '-'}, доза={e.dose or '-'}"
+        for e in entries
+    )
+    return (f"Вот сводка по дневнику диабетика за {label}:\n" + "\n".join(summary_lines)
+            + "\nДинамика по дням:\n" + "\n".join(day_lines) + "\n\nПодробные записи:\n" + detail
+            + "\n\nСделай анализ, дай советы по контролю сахара и питанию, укажи возможные проблемы.")
+
+
+async def live_latency(prompt: str) -> float:
+    from openai_client import client
+    started = time.perf_counter()
+    await client.chat.completions.create(
+        model="gpt-4o-mini", temperature=0.2, max_tokens=600,
+        messages=[{"role": "system", "content": "Ты — медицинский ассистент для диабетиков."},
+                  {"role": "user", "content": prompt}],
+    )
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--per-day", type=int, default=10)
+    parser.add_argument("--base", type=float, default=0.5, help="задержка без промпта, с")
+    parser.add_argument("--prefill", type=float, default=0.25, help="секунд на 1000 входных токенов")
+    parser.add_argument("--output", type=int, default=500, help="токенов ответа")
+    parser.add_argument("--tps", type=float, default=80, help="токенов ответа в секунду")
+    parser.add_argument("--live", action="store_true", help="замерить настоящий gpt-4o-mini")
+    args = parser.parse_args()
+
+    counter = "tiktoken" if report_prompt.tiktoken is not None else "оценка len/2.5"
+    print(f"токены: {counter}, бюджет {report_prompt.REPORT_PROMPT_TOKENS}")
+    for days in PERIODS:
+        rows, entries = diary(days, args.per_day)
+        mean, sd = report._period_stats(rows, "sugar")
+        summary_lines = [f"• Всего записей: {len(entries)}", f"• Средний сахар: {mean:.1f} ммоль/л"]
+        old = rows_prompt(f"{days} дней", summary_lines, [report._day_line(r) for r in rows], entries)
+        started = time.perf_counter()
+        new = report_prompt.build_prompt(f"{days} дней", summary_lines, rows, entries, timezone.utc, mean, sd)
+        build_ms = (time.perf_counter() - started) * 1000
+        line = f"{days:>3} дн.:"
+        for name, prompt in (("rows", old), ("stats", new)):
+            tokens = report_prompt.count_tokens(prompt)
+            if args.live:
+                latency = await live_latency(prompt)
+            else:
+                latency = args.base + tokens / 1000 * args.prefill + args.output / args.tps
+            line += f" {name} {tokens:6d} ток., GPT {latency:5.2f} с;"
+        print(line + f" сборка stats {build_ms:.1f} мс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""Чтение записей для отчёта: ORM-объекты ``Entry`` и проекция столбцов.
+
+Пользователь ведёт дневник ``--days`` дней по ``--per-day`` записей, у
+каждой — путь к фото и ответ GPT на ``--summary-chars`` символов.  Для
+окон 1, 30 и 365 дней замеряются медианная задержка и пик памяти
+(tracemalloc) при чтении:
+
+* ``orm`` — как раньше, :func:`db_access.get_entries_since_async`;
+* ``projection`` — :func:`db_access.get_report_series_async`, только
+  ``event_time`` и числовые столбцы.
+
+По умолчанию база — временный SQLite-файл (aiosqlite); ``--url`` — то же
+на Postgres (строки пользователя 0 удаляются в конце)::
+
+    python benchmarks/bench_report_query.py --days 365 --per-day 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+from sqlalchemy import delete, insert  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import db_access  # noqa: E402
+from db import Base, Entry, User  # noqa: E402
+
+USER_ID = 0
+WINDOWS = (1, 30, 365)
+
+
+async def fill(engine, args, now: datetime) -> None:
+    random.seed(0)
+    summary = "Углеводы примерно 45 г, 3.7 ХЕ. " * (args.summary_chars // 32 + 1)
+    rows = [
+        {"telegram_id": USER_ID, "event_time": now - timedelta(days=d, hours=2 * i + 1),
+         "sugar_before": round(random.uniform(4, 12), 1), "dose": 4.0, "carbs_g": 45.0, "xe": 3.7,
+         "photo_path": f"photos/{USER_ID}_{d}_{i}.jpg", "gpt_summary": summary[:args.summary_chars]}
+        for d in range(args.days) for i in range(args.per_day)
+    ]
+    async with engine.begin() as conn:
+        await conn.execute(delete(Entry).where(Entry.telegram_id == USER_ID))
+        await conn.execute(delete(User).where(User.telegram_id == USER_ID))
+        await conn.execute(insert(User).values(telegram_id=USER_ID, thread_id="bench"))
+        for i in range(0, len(rows), 5000):
+            await conn.execute(insert(Entry), rows[i:i + 5000])
+
+
+async def measure(call, repeat: int) -> tuple[float, float, int]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    rows = await call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings) * 1000, peak / 2 ** 20, len(rows)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--per-day", type=int, default=8)
+    parser.add_argument("--summary-chars", type=int, default=800)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", help="async URL базы, напр. postgresql+asyncpg://…")
+    args = parser.parse_args()
+
+    tmp = None
+    url = args.url
+    if url is None:
+        tmp = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+        url = f"sqlite+aiosqlite:///{tmp.name}"
+    engine = create_async_engine(url)
+    if tmp is not None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    db_access.AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    now = datetime.now(timezone.utc)
+    try:
+        await fill(engine, args, now)
+        for days in WINDOWS:
+            since = now - timedelta(days=days)
+            orm = await measure(lambda: db_access.get_entries_since_async(USER_ID, since), args.repeat)
+            projection = await measure(lambda: db_access.get_report_series_async(USER_ID, since), args.repeat)
+            print(f"{days:>3} дн. ({orm[2]:>4} записей): "
+                  f"orm {orm[0]:7.1f} мс, {orm[1]:6.2f} МБ; "
+                  f"projection {projection[0]:6.1f} мс, {projection[1]:5.2f} МБ")
+    finally:
+        if args.url:
+            async with engine.begin() as conn:
+                await conn.execute(delete(Entry).where(Entry.telegram_id == USER_ID))
+                await conn.execute(delete(User).where(User.telegram_id == USER_ID))
+        await engine.dispose()
+        if tmp is not None:
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
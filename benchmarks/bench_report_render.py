@@ -0,0 +1,82 @@
+"""Холодный старт бота и отрисовка отчёта: время и размер PDF.
+
+* холодный старт — ``import bot.handlers`` в свежем интерпретаторе
+  (медиана из ``--starts`` запусков) и загружен ли при этом matplotlib;
+* отрисовка — PNG-превью для Telegram (:func:`report_render.render_chart`,
+  matplotlib) и PDF с векторным графиком (:func:`report_render.render_pdf`)
+  для отчёта из ``--points`` измерений, медиана из ``--repeat`` повторов,
+  и размер файлов::
+
+    python benchmarks/bench_report_render.py --points 240
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+import report_render  # noqa: E402
+
+COLD_START = (
+    "import sys, time; t = time.perf_counter(); import bot.handlers; "
+    "print(time.perf_counter() - t, 'matplotlib' in sys.modules)"
+)
+
+
+def cold_start(runs: int) -> tuple[float, bool]:
+    timings = []
+    loaded = False
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", COLD_START], cwd=ROOT, capture_output=True,
+                             text=True, check=True).stdout.split()
+        timings.append(float(out[0]))
+        loaded = out[1] == "True"
+    return statistics.median(timings) * 1000, loaded
+
+
+def measure(func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--starts", type=int, default=5)
+    parser.add_argument("--points", type=int, default=240, help="измерений сахара в отчёте")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    start_ms, loaded = cold_start(args.starts)
+    print(f"холодный старт: {start_ms:.0f} мс, matplotlib загружен: {'да' if loaded else 'нет'}")
+
+    random.seed(0)
+    first = datetime.datetime(2025, 5, 1)
+    times = [first + datetime.timedelta(hours=720 / args.points * i) for i in range(args.points)]
+    sugars = [round(random.uniform(4, 13), 1) for _ in times]
+    summary = [f"• Всего записей: {args.points}", "• Средний сахар: 7.9 ммоль/л"]
+    days = [f"{d:02d}.05: сахар 4.2–13.1, доза 24, углеводы 180" for d in range(1, 31)]
+    text = "Рекомендации по питанию и контролю сахара.\n" * 20
+
+    report_render.warm_up()
+    chart_ms, png = measure(lambda: report_render.render_chart(times, sugars, "месяц"), args.repeat)
+    pdf_ms, pdf = measure(
+        lambda: report_render.render_pdf(summary, [], days, text, times, sugars, "месяц"), args.repeat
+    )
+    print(f"PNG-превью: {chart_ms:.1f} мс, {len(png) / 1024:.1f} КБ")
+    print(f"PDF с векторным графиком: {pdf_ms:.1f} мс, {len(pdf) / 1024:.1f} КБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Задержка run'а ассистента по мере роста переписки: без ротации и с ней.
+
+Один пользователь отправляет ``--messages`` сообщений через
+:func:`thread_manager.chat`.  Заглушка Assistants API хранит thread'ы в
+памяти и отвечает за ``--base`` секунд плюс ``--per-ktoken`` секунд на 1000
+токенов контекста (инструкции + вся переписка thread'а), как растёт run у
+OpenAI; печатается эта модельная задержка run'а и токены контекста.  Режимы:
+
+* ``unbounded`` — как раньше, один thread навсегда;
+* ``rotating`` — ротация по ``THREAD_MAX_MESSAGES`` / ``THREAD_MAX_TOKENS``
+  с кратким содержанием прошлого thread'а.
+
+    python benchmarks/bench_thread_growth.py --messages 200
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import thread_manager  # noqa: E402
+from db import Base, User  # noqa: E402
+
+INSTRUCTIONS_TOKENS = 800
+USER_TOKENS = 40
+REPLY_TOKENS = 180
+SUMMARY_TOKENS = 200
+
+
+class FakeAssistants:
+    """Threads in memory; run latency grows with the context it re-reads."""
+
+    def __init__(self, args):
+        self.args = args
+        self.threads: dict[str, list[tuple[str, int]]] = {}
+        self.runs: list[tuple[float, int]] = []  # (задержка, токены контекста)
+        self._ids = itertools.count()
+        self.beta = SimpleNamespace(threads=SimpleNamespace(
+            create=self._create, delete=self._delete,
+            messages=SimpleNamespace(list=self._list),
+        ))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._summarize))
+
+    def new_thread(self, seed: list[tuple[str, int]]) -> str:
+        thread_id = f"th_{next(self._ids)}"
+        self.threads[thread_id] = list(seed)
+        return thread_id
+
+    async def _create(self, messages=()):
+        return SimpleNamespace(id=self.new_thread([("assistant", SUMMARY_TOKENS) for _ in messages]))
+
+    async def _delete(self, thread_id):
+        self.threads.pop(thread_id, None)
+
+    async def _list(self, thread_id, **kwargs):
+        block = SimpleNamespace(text=SimpleNamespace(value="…"))
+        return SimpleNamespace(data=[SimpleNamespace(role=r, content=[block]) for r, _ in self.threads[thread_id]])
+
+    async def _summarize(self, **kwargs):
+        await asyncio.sleep(0)
+        message = SimpleNamespace(content="краткое содержание")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def run_assistant(self, thread_id, content=None, **kwargs):
+        thread = self.threads[thread_id]
+        thread.append(("user", USER_TOKENS))
+        prompt = INSTRUCTIONS_TOKENS + sum(tokens for _, tokens in thread)
+        self.runs.append((self.args.base + prompt / 1000 * self.args.per_ktoken, prompt))
+        await asyncio.sleep(0)
+        thread.append(("assistant", REPLY_TOKENS))
+        return "ответ", SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt))
+
+
+async def run(mode: str, args) -> None:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    fake = FakeAssistants(args)
+    thread_manager.AsyncSessionLocal = sessions
+    thread_manager.client = fake
+    thread_manager.run_assistant = fake.run_assistant
+    if mode == "unbounded":
+        thread_manager.THREAD_MAX_MESSAGES = thread_manager.THREAD_MAX_TOKENS = 10 ** 9
+    else:
+        thread_manager.THREAD_MAX_MESSAGES = args.max_messages
+        thread_manager.THREAD_MAX_TOKENS = args.max_tokens
+
+    user = User(telegram_id=1, thread_id=fake.new_thread([]))
+    async with sessions() as session:
+        session.add(user)
+        await session.commit()
+
+    for _ in range(args.messages):
+        await thread_manager.chat(user, "сообщение")
+        await thread_manager.drain()  # ротация успевает, пока пользователь читает ответ
+    await engine.dispose()
+
+    latencies = [latency for latency, _ in fake.runs]
+    checkpoints = [n for n in (1, 10, 25, 50, 100, 200, 500, 1000) if n <= args.messages]
+    points = ", ".join(f"№{n}: {latencies[n - 1]:4.1f} с" for n in checkpoints)
+    print(f"{mode:>9}: {points}; среднее {statistics.mean(latencies):4.1f} с, "
+          f"контекст в среднем {statistics.mean(tokens for _, tokens in fake.runs):6.0f} токенов, "
+          f"максимум {max(tokens for _, tokens in fake.runs)}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--base", type=float, default=1.5, help="задержка run'а без контекста, с")
+    parser.add_argument("--per-ktoken", type=float, default=0.15, help="секунд на 1000 токенов контекста")
+    parser.add_argument("--max-messages", type=int, default=40)
+    parser.add_argument("--max-tokens", type=int, default=12000)
+    args = parser.parse_args()
+    for mode in ("unbounded", "rotating"):
+        await run(mode, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
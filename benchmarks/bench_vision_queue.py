@@ -0,0 +1,97 @@
+"""Обеденный пик фото: run'ы Vision сразу или через очередь заданий.
+
+``--users`` пользователей присылают по фото в течение ``--spread`` секунд.
+Заглушка OpenAI держит не больше ``--limit`` одновременных run'ов, лишние
+получают ошибку rate limit (как 429 у API).  Run длится ``--service``
+секунд.  Режимы:
+
+* ``inline`` — как раньше, run запускается прямо в обработчике;
+* ``queue`` — :class:`vision_queue.VisionQueue` с ``--workers`` воркерами.
+
+Печатаются ответы, ошибки rate limit, p50/p95 полного ответа и, для очереди,
+ожидание в ней и время обслуживания::
+
+    python benchmarks/bench_vision_queue.py --users 500 --spread 10 --limit 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from vision_queue import VisionQueue  # noqa: E402
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class FakeOpenAI:
+    def __init__(self, limit: int, service: float):
+        self.limit = limit
+        self.service = service
+        self.active = 0
+
+    async def run(self) -> str:
+        if self.active >= self.limit:
+            raise RateLimitError()
+        self.active += 1
+        try:
+            await asyncio.sleep(self.service * random.uniform(0.7, 1.3))
+        finally:
+            self.active -= 1
+        return "Углеводы: 40 г"
+
+
+async def run(mode: str, args) -> None:
+    random.seed(0)
+    openai = FakeOpenAI(args.limit, args.service)
+    queue = VisionQueue(workers=args.workers, max_queue=args.users)
+    latencies = []
+    errors = 0
+
+    async def photo(user: int) -> None:
+        nonlocal errors
+        await asyncio.sleep(random.uniform(0, args.spread))
+        start = time.perf_counter()
+        try:
+            if mode == "inline":
+                await openai.run()
+            else:
+                await queue.submit(user, openai.run).future
+        except RateLimitError:
+            errors += 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(photo(user) for user in range(args.users)))
+    await queue.stop()
+
+    latencies.sort()
+    line = (f"{mode:>6}: ответов {len(latencies)}/{args.users}, rate limit {errors}; "
+            f"ответ p50={statistics.median(latencies):5.2f} с, p95={latencies[int(len(latencies) * 0.95)]:5.2f} с")
+    if mode == "queue":
+        stats = queue.stats()
+        line += (f"; в очереди p50={stats['wait_p50']:5.2f} с, p95={stats['wait_p95']:5.2f} с, "
+                 f"обслуживание p50={stats['service_p50']:5.2f} с")
+    print(line)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=10.0, help="за сколько секунд приходят фото")
+    parser.add_argument("--limit", type=int, default=20, help="одновременных run'ов до rate limit")
+    parser.add_argument("--service", type=float, default=0.5, help="длительность run'а, с")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+    for mode in ("inline", "queue"):
+        await run(mode, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""Нагрузочный тест webhook-маршрута ``api.py``: апдейты/с и p99 задержки.
+
+По умолчанию всё идёт в одном процессе: FastAPI-приложение вызывается через
+ASGI-транспорт httpx, а вместо PTB ``Application`` стоит заглушка, которая
+разбирает очередь апдейтов и «обрабатывает» каждый за ``--work`` секунд.
+Задержка обработки — от отправки POST до конца обработки апдейта::
+
+    python benchmarks/bench_webhook.py --updates 20000 --concurrency 200
+
+С ``--url`` синтетические апдейты уходят на работающий сервер
+(``uvicorn api:app --workers N``); тогда задержка — время ответа маршрута,
+а ``--secret`` должен совпадать с ``WEBHOOK_SECRET`` сервера.  Апдейты идут
+от ``--chats`` разных чатов, так что на боевом боте каждый из них получит
+ответ — используйте тестового бота.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+for name in ("TELEGRAM_TOKEN", "OPENAI_API_KEY", "OPENAI_ASSISTANT_ID"):
+    os.environ.setdefault(name, "bench")
+
+import api  # noqa: E402
+from config import WEBHOOK_PATH  # noqa: E402
+
+
+def make_update(update_id: int, chat_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "text": "сахар 7.5",
+        },
+    }
+
+
+async def consume(queue: asyncio.Queue, sent_at: dict, done_at: dict, work: float) -> None:
+    """Stand-in for PTB's update fetcher: takes updates off the queue and 'handles' them."""
+    async def handle(update):
+        await asyncio.sleep(work)
+        done_at[update.update_id] = time.perf_counter()
+
+    while True:
+        update = await queue.get()
+        asyncio.create_task(handle(update))
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run(args) -> None:
+    sent_at: dict[int, float] = {}
+    done_at: dict[int, float] = {}
+    consumer = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url.rstrip("/"), timeout=30)
+        path = args.path
+    else:
+        api.WEBHOOK_SECRET = args.secret
+        queue: asyncio.Queue = asyncio.Queue()
+        api.app.state.telegram_app = SimpleNamespace(update_queue=queue, bot=None)
+        consumer = asyncio.create_task(consume(queue, sent_at, done_at, args.work))
+        client = httpx.AsyncClient(app=api.app, base_url="http://bench", timeout=30)
+        path = WEBHOOK_PATH
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret}
+    ids = itertools.count(1)
+    errors = 0
+
+    async def sender() -> None:
+        nonlocal errors
+        while (update_id := next(ids)) <= args.updates:
+            sent_at[update_id] = time.perf_counter()
+            response = await client.post(path, json=make_update(update_id, update_id % args.chats), headers=headers)
+            if response.status_code != 200:
+                errors += 1
+            elif args.url:
+                done_at[update_id] = time.perf_counter()
+            else:
+                # ASGI-транспорт не отдаёт управление циклу, как сокет, — отдаём сами
+                await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(args.concurrency)))
+    while len(done_at) + errors < args.updates and time.perf_counter() - start < 600:
+        await asyncio.sleep(0.01)
+    total = time.perf_counter() - start
+    if consumer:
+        consumer.cancel()
+    await client.aclose()
+
+    latencies = [done_at[i] - sent_at[i] for i in done_at]
+    where = args.url or "в процессе (ASGI)"
+    print(f"{where}: {len(done_at)}/{args.updates} апдейтов за {total:.2f} с — "
+          f"{len(done_at) / total:.0f} апдейтов/с, ошибок: {errors}")
+    if latencies:
+        print(f"  задержка обработки: p50={statistics.median(latencies) * 1000:.1f} мс, "
+              f"p99={percentile(latencies, 0.99) * 1000:.1f} мс, max={max(latencies) * 1000:.1f} мс")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=200, help="одновременных POST")
+    parser.add_argument("--chats", type=int, default=5_000)
+    parser.add_argument("--work", type=float, default=0.01, help="время обработки апдейта заглушкой, с")
+    parser.add_argument("--url", help="адрес работающего сервера, напр. http://127.0.0.1:8000")
+    parser.add_argument("--path", default=WEBHOOK_PATH)
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET") or "bench-secret")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Telegram ``Application`` factory shared by polling (``bot.py``) and webhook (``api.py``) modes."""
+import asyncio
+import logging
+
+from telegram import BotCommand, Update
+from telegram.ext import (
+    Application,
+    ApplicationBuilder,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+    MessageHandler,
+    TypeHandler,
+    filters,
+)
+
+from config import MAX_CONCURRENT_UPDATES, PERSISTENCE_STORE, REMINDER_LEASES, TELEGRAM_TOKEN
+import image_prep
+import openai_client
+import photo_storage
+import thread_manager
+from profile_cache import profile_cache
+from render_pool import render_pool
+from reminder_scheduler import ReminderLeaser, dispatcher as reminder_dispatcher, rehydrate_reminders
+from state_persistence import MemoryStateStore, StatePersistence
+from vision_queue import vision_queue
+from bot.rate_limiter import OutboundRateLimiter
+from bot.update_processor import ChatOrderedUpdateProcessor
+from bot.conversations import (
+    onboarding_conv,
+    sugar_conv,
+    photo_conv,
+    dose_conv,
+    profile_conv,
+)
+from bot.handlers import (
+    start,
+    menu_handler,
+    reset_handler,
+    history_handler,
+    profile_command,
+    profile_view,
+    sugar_start,
+    photo_request,
+    report_handler,
+    photo_cancel_handler,
+    callback_router,
+    freeform_handler,
+    help_handler,
+)
+
+
+logger = logging.getLogger("bot")
+reminder_leaser = ReminderLeaser(reminder_dispatcher)
+
+
+async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Log the error and send a notification to the user."""
+    logger.error("Exception while handling an update:", exc_info=context.error)
+
+    if update and update.effective_chat:
+        try:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="Произошла непредвиденная ошибка. Попробуйте еще раз позже.",
+            )
+        except Exception:  # pragma: no cover - best effort to notify
+            logger.exception("Failed to send error message to user")
+
+
+async def refresh_state(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """No-op: matching every update makes PTB call ``refresh_user_data``.
+
+    It runs in group -1, so another worker's ``user_data`` and conversation
+    steps are loaded before the conversation handlers look at the update.
+    """
+
+
+async def post_init(application: Application) -> None:
+    """Configure bot commands after the application is initialized."""
+    await application.bot.set_my_commands(
+        [
+            BotCommand("start", "Запустить бота"),
+            BotCommand("menu", "Главное меню"),
+            BotCommand("reset", "Сбросить разговор"),
+            BotCommand("history", "История сахара"),
+            BotCommand("profile", "Профиль"),
+            BotCommand("report", "Отчёт"),
+            BotCommand("help", "Помощь"),
+        ]
+    )
+    await render_pool.start()
+    # без updater — режим webhook, где воркеров uvicorn обычно несколько:
+    # без аренды каждый из них отправил бы все напоминания
+    if REMINDER_LEASES or application.updater is None:
+        reminder_leaser.start(application.bot)
+    else:
+        await rehydrate_reminders(application.bot)
+
+async def post_shutdown(application: Application) -> None:
+    """Release pooled OpenAI connections and stop background workers."""
+    await reminder_leaser.stop()
+    await reminder_dispatcher.stop()
+    await vision_queue.stop()
+    await openai_client.close()
+    await photo_storage.drain()
+    await thread_manager.drain()
+    # ждёт текущий рендер в процессе — вне event loop
+    await asyncio.to_thread(render_pool.shutdown)
+    image_prep.shutdown()
+
+
+def build_application(webhook: bool = False) -> Application:
+    """Build the bot with all handlers.
+
+    In webhook mode the application has no updater: updates are put into
+    ``application.update_queue`` by the FastAPI route in :mod:`api`.
+    """
+    store = MemoryStateStore() if PERSISTENCE_STORE == "memory" else None
+    persistence = StatePersistence(store)
+    persistence.register_conversations(onboarding_conv, sugar_conv, photo_conv, dose_conv, profile_conv)
+    builder = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .persistence(persistence)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .rate_limiter(OutboundRateLimiter())
+        .concurrent_updates(ChatOrderedUpdateProcessor(MAX_CONCURRENT_UPDATES))
+    )
+    if webhook:
+        builder = builder.updater(None)
+        # воркеров несколько, а кэш профилей сбрасывается только в своём процессе
+        profile_cache.disable()
+    application = builder.build()
+    application.add_error_handler(error_handler)
+    application.add_handler(TypeHandler(Update, refresh_state), group=-1)
+    application.add_handler(onboarding_conv)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("menu", menu_handler))
+    application.add_handler(CommandHandler("reset", reset_handler))
+    application.add_handler(CommandHandler("history", history_handler))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(MessageHandler(filters.Regex("^📄 Мой профиль$"), profile_view))
+    application.add_handler(MessageHandler(filters.Regex(r"^📊 История$"), history_handler))
+    application.add_handler(MessageHandler(filters.Regex(r"^❓ Мой сахар$"), sugar_start))
+    application.add_handler(sugar_conv)
+    application.add_handler(photo_conv)
+    application.add_handler(profile_conv)
+    application.add_handler(dose_conv)
+    # /cancel вне диалога: фото может ждать Vision на другом воркере, и здесь
+    # диалог photo не виден — отметка в user_data остановит тот воркер
+    application.add_handler(CommandHandler("cancel", photo_cancel_handler))
+    application.add_handler(MessageHandler(filters.Regex(r"^📷 Фото еды$"), photo_request))
+    application.add_handler(CommandHandler("report", report_handler))
+    application.add_handler(MessageHandler(filters.Regex("^📈 Отчёт$"), report_handler))
+    application.add_handler(CallbackQueryHandler(callback_router))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, freeform_handler))
+    application.add_handler(CommandHandler("help", help_handler))
+
+    return application
@@ -13,6 +13,8 @@ from .handlers import (
     sugar_val,
     photo_handler,
     doc_handler,
+    photo_cancel_handler,
+    photo_busy_handler,
     photo_sugar_handler,
     dose_start,
     dose_method_choice,
@@ -62,6 +64,8 @@ onboarding_conv = ConversationHandler(
         CommandHandler("cancel", cancel_handler),
         MessageHandler(filters.TEXT & ~filters.COMMAND, freeform_handler),
     ],
+    name="onboarding",
+    persistent=True,
 )
 
 # Sugar conversation
@@ -74,21 +78,31 @@ sugar_conv = ConversationHandler(
         CommandHandler("cancel", cancel_handler),
         MessageHandler(filters.TEXT & ~filters.COMMAND, freeform_handler),
     ],
+    name="sugar",
+    persistent=True,
 )
 
 # Photo processing conversation
 photo_conv = ConversationHandler(
+    # фото ждёт Vision в очереди неблокирующе: пока оно там, апдейты чата
+    # обрабатываются дальше, и /cancel (состояние WAITING) снимает задание
     entry_points=[
-        MessageHandler(filters.PHOTO, photo_handler),
-        MessageHandler(filters.Document.IMAGE, doc_handler),
+        MessageHandler(filters.PHOTO, photo_handler, block=False),
+        MessageHandler(filters.Document.IMAGE, doc_handler, block=False),
     ],
     states={
         PHOTO_SUGAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, photo_sugar_handler)],
+        ConversationHandler.WAITING: [
+            CommandHandler("cancel", photo_cancel_handler),
+            MessageHandler(filters.PHOTO | filters.Document.IMAGE, photo_busy_handler),
+        ],
     },
     fallbacks=[
         CommandHandler("cancel", cancel_handler),
         MessageHandler(filters.TEXT & ~filters.COMMAND, freeform_handler),
     ],
+    name="photo",
+    persistent=True,
 )
 
 # Dose calculation conversation
@@ -107,6 +121,8 @@ dose_conv = ConversationHandler(
         CommandHandler("cancel", cancel_handler),
         MessageHandler(filters.TEXT & ~filters.COMMAND, freeform_handler),
     ],
+    name="dose",
+    persistent=True,
 )
 
 # Profile editing conversation
@@ -124,4 +140,6 @@ profile_conv = ConversationHandler(
         CommandHandler("cancel", cancel_handler),
         MessageHandler(filters.TEXT & ~filters.COMMAND, freeform_handler),
     ],
+    name="profile",
+    persistent=True,
 )
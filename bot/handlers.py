@@ -1,3 +1,4 @@
+import io
 import logging
 import re
 import asyncio
@@ -11,27 +12,44 @@ logger = logging.getLogger("bot")
 from gpt_command_parser import parse_command
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, WebAppInfo
 from telegram.ext import ConversationHandler, ContextTypes
-from db import SessionLocal, User, Profile, Entry
-from gpt_client import create_thread, send_message, client
+from db import AsyncSessionLocal, User, Profile, Entry, DailyStat
+from gpt_client import create_thread, ask_assistant, RunFailedError
 from functions import PatientProfile, calc_bolus
+from profile_cache import profile_cache
 
-from sqlalchemy import func
+from sqlalchemy import delete, select
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from pathlib import Path
 
-from .utils import extract_nutrition_info
+from .utils import extract_nutrition_info, user_locks
+import image_prep
+import photo_storage
+import thread_manager
+import vision_cache
+from vision_cache import VisionResult
+from vision_queue import VisionBusy, VisionCancelled, VisionQueueFull, vision_queue
 
 from report import send_report
-
-from db_access import save_profile, get_profile, add_entry, add_reminder
-from reminder_scheduler import schedule_reminder
+from report_cache import report_cache
+
+from db_access import (
+    save_profile_async,
+    get_profile_async,
+    add_entry_async,
+    add_reminder_async,
+    get_entries_for_day_async,
+    get_user_timezone_async,
+    refresh_daily_stats,
+)
+from reminder_scheduler import parse_rule, schedule_reminder
 PROFILE_ICR, PROFILE_CF, PROFILE_TARGET         = range(0, 3)    # 0,1,2
 DOSE_METHOD, DOSE_XE, DOSE_SUGAR, DOSE_CARBS    = range(3, 7)    # 3,4,5,6
 PHOTO_SUGAR                                     = 7              # после DOSE_CARBS
 SUGAR_VAL                                       = 8              # конверсация /sugar
 # (подтверждение/переопределение дозы при желании  можно сделать 9 и 10)
 
-WAITING_GPT_FLAG = "waiting_gpt_response"
+# ключ user_data: когда пришёл /cancel, которого не видел воркер с заданием Vision
+VISION_CANCELLED_AT = "vision_cancelled_at"
 
 WEBAPP_BASE_URL = os.getenv("WEBAPP_URL", "")
 WEBAPP_VERSION = os.getenv("WEBAPP_VERSION")
@@ -161,8 +179,8 @@ async def freeform_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not parts:
             await update.message.reply_text("Не вижу ни одного поля для изменения.")
             return
-        with SessionLocal() as s:
-            entry = s.get(Entry, context.user_data["edit_id"])
+        async with AsyncSessionLocal() as s:
+            entry = await s.get(Entry, context.user_data["edit_id"])
             if not entry:
                 await update.message.reply_text("Запись уже удалена.")
                 context.user_data.pop("edit_id")
@@ -173,7 +191,8 @@ async def freeform_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if "сахар" in parts or "sugar" in parts:
                 entry.sugar_before = float(parts.get("сахар") or parts["sugar"])
             entry.updated_at = datetime.now(timezone.utc)
-            s.commit()
+            await refresh_daily_stats(s, entry.telegram_id, entry.event_time)
+            await s.commit()
         context.user_data.pop("edit_id")
         context.user_data.pop('pending_entry', None)
         await update.message.reply_text("✅ Запись обновлена!")
@@ -190,21 +209,33 @@ async def freeform_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if action == "set_reminder":
         time_str = parsed.get("time")
         message  = parsed.get("message") or (parsed.get("fields") or {}).get("message")
+        try:
+            rule = parse_rule(parsed.get("repeat"))
+        except ValueError:
+            logger.warning("Unsupported reminder rule %r", parsed.get("repeat"))
+            rule = None
+        tz = await get_user_timezone_async(update.effective_user.id)
         if time_str:
             try:
                 hh, mm = map(int, time_str.split(":"))
-                now = datetime.now(timezone.utc)
-                run_time = datetime.combine(now.date(), dtime(hh, mm, tzinfo=timezone.utc))
+                now = datetime.now(tz)
+                run_time = datetime.combine(now.date(), dtime(hh, mm), tzinfo=tz)
                 if run_time <= now:
-                    run_time += timedelta(days=1)
+                    run_time = datetime.combine(now.date() + timedelta(days=1), dtime(hh, mm), tzinfo=tz)
             except Exception:
                 run_time = datetime.now(timezone.utc) + timedelta(minutes=1)
         else:
             run_time = datetime.now(timezone.utc) + timedelta(minutes=1)
-        add_reminder(update.effective_user.id, run_time, message)
-        schedule_reminder(context.bot, update.effective_user.id, run_time, message)
+        reminder = await add_reminder_async(update.effective_user.id, run_time, message, rule=rule)
+        schedule_reminder(
+            context.bot, update.effective_user.id, run_time, message,
+            reminder_id=reminder.id, rule=rule, tz=tz,
+        )
+        repeat = {"daily": ", ежедневно", "weekdays": ", по будням"}.get(
+            rule, f", каждые {rule.split(':')[1]} ч" if rule else ""
+        )
         await update.message.reply_text(
-            f"⏰ Напоминание на {run_time.strftime('%H:%M')} сохранено"
+            f"⏰ Напоминание на {run_time.strftime('%H:%M')}{repeat} сохранено"
         )
         return
 
@@ -280,7 +311,7 @@ async def callback_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not entry_data:
             await query.edit_message_text("❗ Нет данных для сохранения.")
             return
-        add_entry(entry_data)
+        await add_entry_async(entry_data)
         await query.edit_message_text("✅ Запись сохранена в дневник!")
         return
     if data == "edit_entry":
@@ -307,14 +338,15 @@ async def callback_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # --- Старый код: обработка истории ---
     if ":" in data:
         action, entry_id = data.split(":", 1)
-        with SessionLocal() as s:
-            entry = s.get(Entry, int(entry_id))
+        async with AsyncSessionLocal() as s:
+            entry = await s.get(Entry, int(entry_id))
             if not entry:
                 await query.edit_message_text("Запись не найдена (уже удалена).")
                 return
             if action == "del":
-                s.delete(entry)
-                s.commit()
+                await s.delete(entry)
+                await refresh_daily_stats(s, entry.telegram_id, entry.event_time)
+                await s.commit()
                 await query.edit_message_text("❌ Запись удалена.")
                 return
             if action == "edit":
@@ -329,17 +361,15 @@ async def callback_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    session = SessionLocal()
     user_id = update.effective_user.id
-    user = session.get(User, user_id)
-
-    if not user:
-        thread_id = create_thread()
-        user = User(telegram_id=user_id, thread_id=thread_id)
-        session.add(user)
-        session.commit()
+    async with AsyncSessionLocal() as session:
+        user = await session.get(User, user_id)
 
-    session.close()
+        if not user:
+            thread_id = await create_thread()
+            user = User(telegram_id=user_id, thread_id=thread_id)
+            session.add(user)
+            await session.commit()
 
     await update.message.reply_text(
         "👋 <b>Привет, рад снова тебя видеть!</b>\n"
@@ -373,22 +403,23 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def reset_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    session = SessionLocal()
     user_id = update.effective_user.id
-    session.query(Entry).filter_by(telegram_id=user_id).delete()
-    session.query(Profile).filter_by(telegram_id=user_id).delete()
-    session.query(User).filter_by(telegram_id=user_id).delete()  # Теперь удаляем и пользователя
-    session.commit()
-    session.close()
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(DailyStat).where(DailyStat.telegram_id == user_id))
+        await session.execute(delete(Entry).where(Entry.telegram_id == user_id))
+        await session.execute(delete(Profile).where(Profile.telegram_id == user_id))
+        await session.execute(delete(User).where(User.telegram_id == user_id))  # Теперь удаляем и пользователя
+        await session.commit()
+    profile_cache.invalidate(user_id)
+    # ключи старых отчётов уже не совпадут (новый users.created_at) — освобождаем место
+    await report_cache.invalidate_user(user_id)
     await update.message.reply_text("Профиль и история удалены. Вы можете начать заново.", reply_markup=menu_keyboard)
 
 # === Профиль ===
 async def profile_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = SessionLocal()
     user_id = update.effective_user.id
-    profile = session.get(Profile, user_id)
-    session.close()
-    
+    profile = await get_profile_async(user_id)
+
     current_value = f"(текущее: {profile.icr} г/ед.)" if profile and profile.icr else ""
     await update.message.reply_text(
         f"Введите ИКХ (сколько г углеводов на 1 ед. инсулина) {current_value}:"
@@ -398,10 +429,8 @@ async def profile_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def profile_icr(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         context.user_data['icr'] = float(update.message.text)
-        
-        session = SessionLocal()
-        profile = session.get(Profile, update.effective_user.id)
-        session.close()
+
+        profile = await get_profile_async(update.effective_user.id)
 
         current_value = f"(текущее: {profile.cf} ммоль/л)" if profile and profile.cf else ""
         await update.message.reply_text(
@@ -416,9 +445,7 @@ async def profile_cf(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         context.user_data['cf'] = float(update.message.text)
 
-        session = SessionLocal()
-        profile = session.get(Profile, update.effective_user.id)
-        session.close()
+        profile = await get_profile_async(update.effective_user.id)
 
         current_value = f"(текущее: {profile.target_bg} ммоль/л)" if profile and profile.target_bg else ""
         await update.message.reply_text(
@@ -433,7 +460,7 @@ async def profile_target(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         context.user_data['target'] = float(update.message.text)
         user_id = update.effective_user.id
-        save_profile(user_id, context.user_data["icr"], context.user_data["cf"], context.user_data["target"])
+        await save_profile_async(user_id, context.user_data["icr"], context.user_data["cf"], context.user_data["target"])
         await update.message.reply_text("✅ Профиль сохранён.", reply_markup=menu_keyboard)
         return ConversationHandler.END
     except ValueError:
@@ -469,7 +496,7 @@ async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
 
         user_id = update.effective_user.id
-        save_profile(user_id, cf, icr, target)
+        await save_profile_async(user_id, cf, icr, target)
 
         await update.message.reply_text(
             f"✅ Профиль обновлён:\n"
@@ -489,7 +516,7 @@ async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def profile_view(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     user_id = update.effective_user.id
-    profile = get_profile(user_id)
+    profile = await get_profile_async(user_id)
 
     if not profile:
         await update.message.reply_text(
@@ -542,9 +569,11 @@ async def sugar_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             sugar = float(context.args[0].replace(",", "."))
             # Записываем в БД
-            session = SessionLocal()
-            entry = Entry(telegram_id=update.effective_user.id, sugar_before=sugar)
-            session.add(entry); session.commit(); session.close()
+            await add_entry_async({
+                'telegram_id': update.effective_user.id,
+                'event_time': datetime.now(timezone.utc),
+                'sugar_before': sugar,
+            })
             await update.message.reply_text(f"✅ Уровень сахара сохранён: {sugar} ммоль/л", reply_markup=menu_keyboard)
             return ConversationHandler.END
         except ValueError:
@@ -601,15 +630,11 @@ async def dose_sugar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return DOSE_SUGAR
 
     user_id = update.effective_user.id
-    session = SessionLocal()
-    profile = session.get(Profile, user_id)
+    profile = await get_profile_async(user_id)
     if not profile:
-        session.close()
         await update.message.reply_text("Профиль не найден. Используйте /profile.")
         return ConversationHandler.END
 
-    icr, cf, target_bg = profile.icr, profile.cf, profile.target_bg
-
     last_carbs = context.user_data.get("last_carbs")
     last_photo_time = context.user_data.get("last_photo_time")
     now = time.time()
@@ -620,16 +645,14 @@ async def dose_sugar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         xe_val = context.user_data["xe"]
         carbs = xe_val * 12          # 1 ХЕ = 12 г
     else:
-        session.close()
         await update.message.reply_text(
             "Нет данных о количестве углеводов. Сначала отправьте фото блюда или введите углеводы вручную.",
             reply_markup=menu_keyboard
         )
         return ConversationHandler.END
 
-    dose = calc_bolus(carbs, sugar, PatientProfile(icr, cf, target_bg))
+    dose = calc_bolus(carbs, sugar, profile)
     event_time = datetime.now(timezone.utc)
-    session.close()
 
     # Сохраняем все данные во временный блок
     context.user_data['pending_entry'] = {
@@ -743,69 +766,105 @@ async def dose_xe_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
-async def photo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, demo: bool = False):
-    from gpt_client import client, send_message, create_thread
+async def _download(file) -> bytes:
+    """Скачивает файл Telegram в память, минуя диск."""
+    buffer = io.BytesIO()
+    await file.download_to_memory(buffer)
+    return buffer.getvalue()
+
 
+async def photo_handler(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    demo: bool = False,
+    image: bytes | None = None,
+    image_name: str | None = None,
+):
     message = update.message or update.callback_query.message
     user_id = update.effective_user.id
 
-    if context.user_data.get(WAITING_GPT_FLAG):
+    lock = user_locks(user_id)
+    if lock.locked():
         await message.reply_text("⏳ Уже обрабатываю фото, подождите…")
         return ConversationHandler.END
-    context.user_data[WAITING_GPT_FLAG] = True
-
-    # 1. Получение file_path
-    file_path = context.user_data.pop("__file_path", None)
-    if not file_path:
-        try:
-            photo = update.message.photo[-1]
-        except (AttributeError, IndexError):
-            await message.reply_text("❗ Файл не распознан как изображение.")
-            context.user_data.pop(WAITING_GPT_FLAG, None)
-            return ConversationHandler.END
-
-        os.makedirs("photos", exist_ok=True)
-        file_path = f"photos/{user_id}_{photo.file_unique_id}.jpg"
-        file = await context.bot.get_file(photo.file_id)
-        await file.download_to_drive(file_path)
-
-    logging.info("[PHOTO] Saved to %s", file_path)
+    await lock.acquire()  # свободный замок берётся без переключения задач
 
     try:
-        # 2. Запуск Vision run
-        thread_id = context.user_data.get("thread_id") or create_thread()
-        run = await asyncio.to_thread(
-            send_message,
-            thread_id=thread_id,
-            content="Определи количество углеводов и ХЕ на фото блюда. Используй формат из системных инструкций ассистента.",
-            image_path=file_path,
-        )
-        await message.reply_text("🔍 Анализирую фото (это займёт 5‑10 с)…")
-
-        # 3. Ждать окончания run
-        while run.status not in ("completed", "failed", "cancelled", "expired"):
-            await asyncio.sleep(2)
-            run = client.beta.threads.runs.retrieve(thread_id=run.thread_id, run_id=run.id)
+        # 1. Байты изображения: документ (image), демо-файл или фото из сообщения
+        file_path = context.user_data.pop("__file_path", None)
+        if image is None and file_path:
+            image = await asyncio.to_thread(Path(file_path).read_bytes)
+            image_name = Path(file_path).name
+        elif image is None:
+            try:
+                # самого большого размера Vision не нужно — хватит наименьшего подходящего
+                photo = image_prep.pick_photo(update.message.photo)
+            except (AttributeError, IndexError, TypeError):
+                await message.reply_text("❗ Файл не распознан как изображение.")
+                return ConversationHandler.END
+            image_name = f"{user_id}_{photo.file_unique_id}.jpg"
+            image = await _download(await context.bot.get_file(photo.file_id))
+        if not file_path:
+            # копия на диск пишется в фоне — Vision её не ждёт
+            file_path = photo_storage.save_later(image_name, image)
+        logging.info("[PHOTO] Received %s (%d bytes)", image_name, len(image))
+
+        # 2. Тот же снимок уже распознавали — отвечаем из кэша
+        cached = await vision_cache.lookup(image)
+        if cached:
+            vision_text, carbs_g, xe = cached.vision_text, cached.carbs_g, cached.xe
+        else:
+            # 3. Vision run — через общую очередь, не больше VISION_WORKERS одновременно
+            thread_id = context.user_data.get("thread_id") or await create_thread()
+
+            async def run() -> str:
+                return await ask_assistant(
+                    thread_id,
+                    content="Определи количество углеводов и ХЕ на фото блюда. Используй формат из системных инструкций ассистента.",
+                    image=image,
+                    image_name=image_name,
+                )
 
-        if run.status != "completed":
-            logging.error(f"[VISION][RUN_FAILED] run.status={run.status}")
-            await message.reply_text("⚠️ Vision не смог обработать фото.")
-            return ConversationHandler.END
+            submitted_at = time.time()
+            try:
+                job = vision_queue.submit(user_id, run)
+            except VisionBusy:
+                await message.reply_text("⏳ Уже обрабатываю фото, подождите…")
+                return ConversationHandler.END
+            except VisionQueueFull:
+                await message.reply_text("⏳ Сейчас слишком много фото на распознавании. Попробуйте через минуту.")
+                return ConversationHandler.END
+            position = vision_queue.position(job)
+            status = await message.reply_text(_vision_status_text(position))
+            vision_queue.watch(job, lambda position: _edit_vision_status(status, position), position)
+
+            # 4. Ждать ответ ассистента (стриминг run'а); /cancel снимает задание
+            try:
+                vision_text = await job.future
+            except VisionCancelled:
+                return ConversationHandler.END
+            except RunFailedError as e:
+                logging.error(f"[VISION][RUN_FAILED] run.status={e.status}")
+                await message.reply_text("⚠️ Vision не смог обработать фото.")
+                return ConversationHandler.END
+            logging.info(
+                "[VISION] user=%s waited %.1f s, run took %.1f s",
+                user_id, job.started_at - job.enqueued_at, time.monotonic() - job.started_at,
+            )
 
-        # 4. Читать все сообщения в thread (и логировать)
-        messages = client.beta.threads.messages.list(thread_id=run.thread_id)
-        for m in messages.data:
-            logging.warning(f"[VISION][MSG] m.role={m.role}; content={m.content}")
+            carbs_g, xe = extract_nutrition_info(vision_text)
+            if carbs_g is not None or xe is not None:
+                await vision_cache.store(image, VisionResult(vision_text, carbs_g, xe))
+            if await _cancelled_elsewhere(context, user_id, submitted_at):
+                logging.info("[VISION] user=%s cancelled on another worker", user_id)
+                return ConversationHandler.END
 
-        # 5. Ищем ответ ассистента
-        vision_text = next((m.content[0].text.value for m in messages.data if m.role == "assistant" and m.content), "")
-        logging.warning(f"[VISION][RESPONSE] Ответ Vision для {file_path}:\n{vision_text}")
+        logging.warning(f"[VISION][RESPONSE] Ответ Vision для {image_name}:\n{vision_text}")
 
-        carbs_g, xe = extract_nutrition_info(vision_text)
         if carbs_g is None and xe is None:
             # ЛОГИРУЕМ ОТВЕТ Vision и файл
             logging.warning(
-                "[VISION][NO_PARSE] Ответ ассистента: %r для файла: %s", vision_text, file_path
+                "[VISION][NO_PARSE] Ответ ассистента: %r для файла: %s", vision_text, image_name
             )
             await message.reply_text(
                 "⚠️ Не смог разобрать углеводы на фото.\n\n"
@@ -817,7 +876,7 @@ async def photo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, demo
             return ConversationHandler.END
 
 
-        # 6. Сохраняем и показываем
+        # 5. Сохраняем и показываем
         context.user_data.update({"carbs": carbs_g, "xe": xe, "photo_path": file_path})
         await message.reply_text(
             f"🍽️ На фото:\n{vision_text}\n\n"
@@ -832,7 +891,44 @@ async def photo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, demo
         return ConversationHandler.END
 
     finally:
-        context.user_data.pop(WAITING_GPT_FLAG, None)
+        lock.release()
+
+
+def _vision_status_text(position: int) -> str:
+    if position:
+        return f"🕒 Вы №{position} в очереди на распознавание. /cancel — отменить."
+    return "🔍 Анализирую фото (это займёт 5‑10 с)…"
+
+
+async def _edit_vision_status(status, position: int) -> None:
+    """Обновляет сообщение о месте в очереди (вызывается очередью Vision)."""
+    await status.edit_text(_vision_status_text(position))
+
+
+async def _cancelled_elsewhere(context: ContextTypes.DEFAULT_TYPE, user_id: int, since: float) -> bool:
+    """/cancel после ``since`` пришёл на другой воркер (см. :func:`photo_cancel_handler`)."""
+    persistence = getattr(getattr(context, "application", None), "persistence", None)
+    if persistence is not None:
+        # отметка приходит вместе с user_data из bot_state
+        await persistence.refresh_user_data(user_id, context.user_data)
+    return context.user_data.get(VISION_CANCELLED_AT, 0) >= since
+
+
+async def photo_cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/cancel, пока фото ждёт Vision: снимает задание из очереди.
+
+    Задание может стоять в очереди другого воркера — тогда в ``user_data``
+    остаётся отметка времени, и тот воркер не пришлёт ответ Vision.
+    """
+    if vision_queue.cancel(update.effective_user.id):
+        await update.message.reply_text("❌ Распознавание фото отменено.", reply_markup=menu_keyboard)
+    else:
+        context.user_data[VISION_CANCELLED_AT] = time.time()
+        await update.message.reply_text("❌ Действие отменено.", reply_markup=menu_keyboard)
+
+
+async def photo_busy_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text("⏳ Уже обрабатываю фото, подождите…")
 
 
 async def doc_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -843,14 +939,13 @@ async def doc_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     user_id = update.effective_user.id
     ext = Path(document.file_name).suffix or ".jpg"
-    file_path = f"photos/{user_id}_{document.file_unique_id}{ext}"
-    os.makedirs("photos", exist_ok=True)
-
-    file = await context.bot.get_file(document.file_id)
-    await file.download_to_drive(file_path)
-
-    context.user_data["__file_path"] = file_path
-    return await photo_handler(update, context)
+    image = await _download(await context.bot.get_file(document.file_id))
+    prepared = await image_prep.prepare(image)
+    if prepared is not None:
+        image, ext = prepared, ".jpg"
+    return await photo_handler(
+        update, context, image=image, image_name=f"{user_id}_{document.file_unique_id}{ext}"
+    )
 
 async def photo_sugar_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -863,16 +958,13 @@ async def photo_sugar_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     carbs = context.user_data.get("carbs")
     xe = context.user_data.get("xe")
     photo_path = context.user_data.get("photo_path")
-    session = SessionLocal()
-    profile = session.get(Profile, user_id)
+    profile = await get_profile_async(user_id)
     if not profile or carbs is None:
-        session.close()
         await update.message.reply_text("Нет данных для расчёта. Начните заново.", reply_markup=menu_keyboard)
         return ConversationHandler.END
 
-    dose = calc_bolus(carbs, sugar, PatientProfile(profile.icr, profile.cf, profile.target_bg))
+    dose = calc_bolus(carbs, sugar, profile)
     event_time = datetime.now(timezone.utc)
-    session.close()
 
     context.user_data['pending_entry'] = {
         'telegram_id': user_id,
@@ -925,17 +1017,18 @@ async def history_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-    with SessionLocal() as s:
-        query = s.query(Entry).filter_by(telegram_id=user_id)
-        if day:
-            query = query.filter(func.date(Entry.event_time) == day)
-
-        entries = (
-            query
-            .order_by(Entry.event_time.desc())
-            .limit(None if day else 5)
-            .all()
-        )
+    tz = await get_user_timezone_async(user_id)
+    if day:
+        entries = await get_entries_for_day_async(user_id, day, tz)
+    else:
+        async with AsyncSessionLocal() as s:
+            result = await s.execute(
+                select(Entry)
+                .where(Entry.telegram_id == user_id)
+                .order_by(Entry.event_time.desc())
+                .limit(5)
+            )
+            entries = result.scalars().all()
 
     if not entries:
         await update.message.reply_text("История пуста.")
@@ -946,7 +1039,7 @@ async def history_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # ── выводим каждую запись отдельным сообщением ───────────────
     for e in entries:
-        when   = e.event_time.astimezone().strftime("%d.%m %H:%M")
+        when   = e.event_time.astimezone(tz).strftime("%d.%m %H:%M")
         carbs  = f"{e.carbs_g:.0f} г" if e.carbs_g else f"{e.xe:.1f} ХЕ" if e.xe else "-"
         dose   = f"{e.dose:.1f} ед"   if e.dose else "-"
         sugar  = f"{e.sugar_before:.1f}" if e.sugar_before else "-"
@@ -970,49 +1063,30 @@ async def chat_with_gpt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.text:
         return  # игнорируем не‑текст
 
-    session   = SessionLocal()
     user_id   = update.effective_user.id
-    user      = session.get(User, user_id)
-    session.close()
+    async with AsyncSessionLocal() as session:
+        user = await session.get(User, user_id)
     if not user:
         await update.message.reply_text("Сначала используйте /start.")
         return
 
-    # 1) отправляем сообщение (или изображение) в GPT
-    run = await asyncio.to_thread(
-        send_message,
-        user.thread_id,
-        content=update.message.text,
-    )
     await update.message.reply_text("⏳ Жду ответ от GPT...")
 
-    # 2) ждём, пока Assistant закончит
-    while run.status not in ("completed", "failed", "cancelled", "expired"):
-        await asyncio.sleep(2)
-        run = client.beta.threads.runs.retrieve(
-            thread_id=user.thread_id,
-            run_id=run.id
-        )
-
-    # 3) если не completed – сообщаем об ошибке и выходим
-    if run.status != "completed":
+    # 1) отправляем сообщение в GPT и ждём ответ этого run'а
+    try:
+        reply_text = await thread_manager.chat(user, update.message.text)
+    except RunFailedError as e:
+        # 2) если не completed – сообщаем об ошибке и выходим
         await update.message.reply_text(
-            f"⚠️ GPT не смог ответить (status={run.status}). Попробуйте позже."
+            f"⚠️ GPT не смог ответить (status={e.status}). Попробуйте позже."
         )
-        logging.error(f"GPT run failed: {run}")
+        logging.error(f"GPT run failed: {e}")
         return
 
-    # 4) получаем последний ответ Assistant'а
-    messages = client.beta.threads.messages.list(thread_id=user.thread_id)
-    reply_msg = next(
-        (m for m in messages.data if m.role == "assistant"), None
-    )
-
-    if not reply_msg:
+    if not reply_text:
         await update.message.reply_text("⚠️ Ответ пустой.")
         return
 
-    reply_text = reply_msg.content[0].text.value
     await update.message.reply_text(reply_text)
 
 async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1120,17 +1194,10 @@ async def onb_cf(update, context):
 async def onb_target(update, context):
     try:
         context.user_data['target'] = float(update.message.text)
-        session = SessionLocal()
         user_id = update.effective_user.id
-        prof = session.get(Profile, user_id)
-        if not prof:
-            prof = Profile(telegram_id=user_id)
-            session.add(prof)
-        prof.icr = context.user_data['icr']
-        prof.cf = context.user_data['cf']
-        prof.target_bg = context.user_data['target']
-        session.commit()
-        session.close()
+        await save_profile_async(
+            user_id, context.user_data['icr'], context.user_data['cf'], context.user_data['target']
+        )
         img_path = "assets/demo.jpg"
         with open(img_path, "rb") as f:
             await update.message.reply_photo(
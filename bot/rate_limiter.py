@@ -0,0 +1,42 @@
+from typing import Any
+
+from telegram.ext import BaseRateLimiter
+
+from outbound_queue import PRIORITY_INTERACTIVE, OutboundQueue, in_queue_worker, outbound
+
+# то, что Telegram ограничивает по сообщениям в секунду; getFile,
+# answerCallbackQuery, setWebhook и прочее в лимит не входят
+_QUEUED_PREFIXES = ("send", "edit")
+_QUEUED_ENDPOINTS = {"copyMessage", "forwardMessage"}
+
+
+class OutboundRateLimiter(BaseRateLimiter[dict]):
+    """Routes message-sending Bot API requests through the shared :class:`OutboundQueue`.
+
+    Handler replies get interactive priority and overtake queued reminders.
+    A call can pass ``rate_limit_args={"priority": ...}`` to change that.
+    Requests made by the queue's own workers are already rate limited and go
+    straight through, as does everything that does not send or edit a
+    message (``getFile``, ``answerCallbackQuery``, ``getMe``...).
+    """
+
+    def __init__(self, queue: OutboundQueue = outbound):
+        self.queue = queue
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        await self.queue.stop()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args) -> Any:
+        if in_queue_worker.get() or not _is_queued(endpoint):
+            return await callback(*args, **kwargs)
+        priority = (rate_limit_args or {}).get("priority", PRIORITY_INTERACTIVE)
+        # inline-сообщения редактируются без chat_id и делят общий «нулевой» чат
+        chat_id = data.get("chat_id", 0)
+        return await self.queue.submit(chat_id, lambda: callback(*args, **kwargs), priority)
+
+
+def _is_queued(endpoint: str) -> bool:
+    return endpoint.startswith(_QUEUED_PREFIXES) or endpoint in _QUEUED_ENDPOINTS
@@ -0,0 +1,68 @@
+"""Concurrent update processing that keeps each chat's updates in order.
+
+A Vision run or a month report takes seconds.  With PTB's default sequential
+processing this delays every other user.  :class:`ChatOrderedUpdateProcessor`
+lets updates of different chats run in parallel, up to
+``max_concurrent_updates`` at a time.  Updates of one chat run one after
+another in arrival order, so conversation steps and ``user_data`` never race.
+"""
+import logging
+from collections import deque
+from typing import Any, Awaitable
+
+from telegram.ext import BaseUpdateProcessor
+
+
+def _chat_key(update: object):
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return ("user", user.id)
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """``BaseUpdateProcessor`` with a per-chat FIFO.
+
+    The first update of an idle chat takes a concurrency slot and then works
+    through everything that arrives for the chat meanwhile.  Queued updates
+    hold no slot, so one busy chat occupies at most one slot.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chats: dict[Any, deque[Awaitable]] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = _chat_key(update)
+        if key is None:
+            await coroutine
+            return
+        pending = self._chats.get(key)
+        if pending is not None:
+            # чат уже обрабатывается — апдейт выполнит тот же обработчик после текущего
+            pending.append(coroutine)
+            return
+        pending = self._chats[key] = deque([coroutine])
+        try:
+            while pending:
+                try:
+                    await pending.popleft()
+                except Exception:  # pragma: no cover - PTB сам передаёт ошибки error_handler
+                    logging.exception("Update processing failed for chat %s", key)
+        finally:
+            del self._chats[key]
+
+    def stats(self) -> dict:
+        return {
+            "active_chats": len(self._chats),
+            "queued": sum(len(pending) for pending in self._chats.values()),
+        }
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -1,5 +1,7 @@
 import re
 
+from user_locks import UserLocks
+
 
 def extract_nutrition_info(text: str) -> tuple[float | None, float | None]:
     """Parse carbs and XE values from Vision text.
@@ -28,3 +30,6 @@ def extract_nutrition_info(text: str) -> tuple[float | None, float | None]:
             xe = (float(rng.group(1).replace(",", ".")) + float(rng.group(2).replace(",", "."))) / 2
 
     return carbs, xe
+
+
+user_locks = UserLocks()
@@ -1,5 +1,7 @@
 # config.py
 import os
+import socket
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 
 load_dotenv()  # Загрузка переменных из .env файла
@@ -14,7 +16,98 @@ DB_NAME     = os.getenv('DB_NAME', 'diabetes_bot')
 DB_USER     = os.getenv('DB_USER', 'diabetes_user')
 DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 
+# Режим webhook: бот принимает апдейты через FastAPI-приложение api.py
+WEBHOOK_URL    = os.getenv('WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_PATH   = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+
 OPENAI_PROXY = os.getenv('OPENAI_PROXY')
+OPENAI_TIMEOUT         = float(os.getenv('OPENAI_TIMEOUT', '60'))
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '50'))
+OPENAI_MAX_RETRIES     = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+# Streaming runs Assistants API; 0 — если прокси/окружение не пропускает SSE
+OPENAI_STREAM_RUNS     = os.getenv('OPENAI_STREAM_RUNS', '1') not in ('0', 'false', 'False')
+
+# Thread ассистента сжимается в краткое содержание и начинается заново, когда
+# в нём столько сообщений или run прочитал столько токенов контекста
+THREAD_MAX_MESSAGES = int(os.getenv('THREAD_MAX_MESSAGES', '40'))
+THREAD_MAX_TOKENS   = int(os.getenv('THREAD_MAX_TOKENS', '12000'))
+
+# Часовой пояс по умолчанию для пользователей без собственного users.timezone
+TIMEZONE = ZoneInfo(os.getenv('TIMEZONE', 'UTC'))
+
+# Кэш профилей в памяти процесса: максимум записей и время жизни (сек);
+# в режиме webhook кэш выключен — профиль может изменить другой воркер
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '10000'))
+PROFILE_CACHE_TTL  = float(os.getenv('PROFILE_CACHE_TTL', '60'))
+
+# Минимальная уверенность локального парсера, ниже — разбор через LLM
+LOCAL_PARSER_MIN_CONFIDENCE = float(os.getenv('LOCAL_PARSER_MIN_CONFIDENCE', '0.9'))
+
+# Пул процессов для графиков и PDF отчётов
+RENDER_WORKERS         = int(os.getenv('RENDER_WORKERS', '2'))
+RENDER_MAX_CONCURRENCY = int(os.getenv('RENDER_MAX_CONCURRENCY', '4'))
+
+# Несколько экземпляров бота: напоминания разбираются через аренду строк в БД
+# (в режиме webhook аренда включена всегда)
+REMINDER_LEASES        = os.getenv('REMINDER_LEASES', '0') == '1'
+REMINDER_WORKER_ID     = os.getenv('REMINDER_WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+REMINDER_LEASE         = float(os.getenv('REMINDER_LEASE', '300'))
+REMINDER_POLL_INTERVAL = float(os.getenv('REMINDER_POLL_INTERVAL', '5'))
+REMINDER_HORIZON       = float(os.getenv('REMINDER_HORIZON', '60'))
+REMINDER_CLAIM_BATCH   = int(os.getenv('REMINDER_CLAIM_BATCH', '1000'))
+
+# Повтор неотправленного напоминания: пауза (сек) и число попыток
+REMINDER_RETRY_DELAY    = float(os.getenv('REMINDER_RETRY_DELAY', '60'))
+REMINDER_RETRY_ATTEMPTS = int(os.getenv('REMINDER_RETRY_ATTEMPTS', '3'))
+
+# Сколько чатов бот обслуживает одновременно; апдейты одного чата идут по очереди
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '32'))
+
+# Состояние диалогов: db — общее для всех процессов (таблица bot_state),
+# memory — только в памяти процесса
+PERSISTENCE_STORE          = os.getenv('PERSISTENCE_STORE', 'db')
+PERSISTENCE_CACHE_SIZE     = int(os.getenv('PERSISTENCE_CACHE_SIZE', '10000'))
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '1'))
+PERSISTENCE_REFRESH_AFTER  = float(os.getenv('PERSISTENCE_REFRESH_AFTER', '1'))
+
+# Очередь исходящих сообщений: лимит Telegram ~30 сообщений/с на бота
+OUTBOUND_RATE         = float(os.getenv('OUTBOUND_RATE', '30'))
+OUTBOUND_WORKERS      = int(os.getenv('OUTBOUND_WORKERS', '8'))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv('OUTBOUND_MAX_ATTEMPTS', '3'))
+
+# Копии фото еды на диске (для entries.photo_path); пусто — не сохранять
+PHOTOS_DIR            = os.getenv('PHOTOS_DIR', 'photos')
+PHOTOS_RETENTION_DAYS = float(os.getenv('PHOTOS_RETENTION_DAYS', '90'))
+
+# Подготовка фото для Vision: из размеров Telegram берётся наименьший с длинной
+# стороной не меньше VISION_PHOTO_MIN_EDGE; изображения-документы ужимаются
+# до VISION_IMAGE_MAX_EDGE и пережимаются в JPEG без EXIF
+VISION_PHOTO_MIN_EDGE = int(os.getenv('VISION_PHOTO_MIN_EDGE', '800'))
+VISION_IMAGE_MAX_EDGE = int(os.getenv('VISION_IMAGE_MAX_EDGE', '1280'))
+VISION_IMAGE_QUALITY  = int(os.getenv('VISION_IMAGE_QUALITY', '85'))
+IMAGE_PREP_WORKERS    = int(os.getenv('IMAGE_PREP_WORKERS', '2'))
+
+# Очередь заданий Vision: одновременных run'ов ассистента на процесс, сколько
+# фото может ждать в очереди и как часто обновлять сообщение «вы №N в очереди»
+VISION_WORKERS         = int(os.getenv('VISION_WORKERS', '8'))
+VISION_MAX_QUEUE       = int(os.getenv('VISION_MAX_QUEUE', '200'))
+VISION_STATUS_INTERVAL = float(os.getenv('VISION_STATUS_INTERVAL', '3'))
+
+# Кэш результатов Vision по хэшу фото; поиск по перцептивному хэшу может
+# выдать результат похожего фото другого блюда, поэтому выключен по умолчанию
+VISION_CACHE_TTL         = float(os.getenv('VISION_CACHE_TTL', str(30 * 24 * 3600)))
+VISION_CACHE_MAX_ENTRIES = int(os.getenv('VISION_CACHE_MAX_ENTRIES', '50000'))
+VISION_CACHE_PHASH       = os.getenv('VISION_CACHE_PHASH', '0') in ('1', 'true', 'True')
+
+# Готовые отчёты (сводка, график, анализ GPT, PDF) на локальном диске;
+# пустой REPORT_CACHE_DIR или REPORT_CACHE_MAX_MB=0 отключают кэш
+REPORT_CACHE_DIR    = os.getenv('REPORT_CACHE_DIR', 'report_cache')
+REPORT_CACHE_MAX_MB = float(os.getenv('REPORT_CACHE_MAX_MB', '200'))
+
+# Бюджет токенов промпта анализа отчёта (report_prompt): длинные периоды
+# описываются всё грубее, пока не уложатся
+REPORT_PROMPT_TOKENS = int(os.getenv('REPORT_PROMPT_TOKENS', '1500'))
 
 
 def validate_tokens() -> None:
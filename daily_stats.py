@@ -0,0 +1,49 @@
+# daily_stats.py
+"""Rebuild the ``daily_stats`` rollup from ``entries``.
+
+Run once after the migration that creates the table, and again for a user
+whose ``users.timezone`` was changed by hand (their days are cut at other
+hours; :func:`db_access.set_user_timezone_async` rebuilds them itself)::
+
+    python daily_stats.py               # все пользователи
+    python daily_stats.py --user 12345  # один пользователь
+
+Each user is rebuilt and committed in its own transaction, so the bot can
+keep running meanwhile.
+"""
+import argparse
+import logging
+
+from sqlalchemy import select
+
+from db import SessionLocal, User
+from db_access import rebuild_daily_stats, zone_or_default
+
+
+def backfill(user_id: int | None = None) -> int:
+    """Rebuild rows of one or all users; returns the number of days written."""
+    with SessionLocal() as session:
+        query = select(User.telegram_id, User.timezone)
+        if user_id is not None:
+            query = query.where(User.telegram_id == user_id)
+        users = session.execute(query).all()
+    total = 0
+    for telegram_id, tz_name in users:
+        with SessionLocal() as session:
+            days = rebuild_daily_stats(session, telegram_id, zone_or_default(tz_name))
+            session.commit()
+        logging.info("[DAILY_STATS] user=%s days=%s", telegram_id, days)
+        total += days
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user", type=int, help="telegram_id одного пользователя")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    print(f"Дней пересчитано: {backfill(args.user)}")
+
+
+if __name__ == "__main__":
+    main()
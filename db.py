@@ -2,20 +2,30 @@
 
 from sqlalchemy import (
     create_engine, Column, Integer, BigInteger, String,
-    Float, Text, TIMESTAMP, ForeignKey, func
+    Float, Text, TIMESTAMP, Date, ForeignKey, Index, LargeBinary, func
 )
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
 from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
 
 
 # ────────────────── подключение к Postgres ──────────────────
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL       = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 engine       = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
 Base         = declarative_base()
 
+# Асинхронный движок для хендлеров бота: запросы не блокируют event loop.
+# expire_on_commit=False — объекты остаются читаемыми после commit без
+# повторного (неявного, а значит синхронного) похода в базу.
+async_engine      = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True)
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
 
 # ───────────────────────── модели ────────────────────────────
 class User(Base):
@@ -23,8 +33,19 @@ class User(Base):
 
     telegram_id = Column(BigInteger, primary_key=True, index=True)
     thread_id   = Column(String, nullable=False)
+    timezone    = Column(String)  # IANA‑имя, напр. "Europe/Moscow"; None → config.TIMEZONE
     created_at  = Column(TIMESTAMP, server_default=func.now())
 
+    # Жизненный цикл thread ассистента (thread_manager): сколько в нём сообщений,
+    # сколько токенов прочитал последний run и сжатое содержание прошлых thread'ов
+    thread_messages = Column(Integer, nullable=False, default=0, server_default="0")
+    thread_tokens   = Column(Integer, nullable=False, default=0, server_default="0")
+    thread_summary  = Column(Text)
+
+    # Растёт при каждом добавлении, изменении и удалении записи дневника:
+    # ключ кэша готовых отчётов (report_cache)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
+
 
 class Profile(Base):
     __tablename__ = "profiles"
@@ -53,6 +74,49 @@ class Entry(Base):
     dose         = Column(Float)
     gpt_summary  = Column(Text)
 
+    # Обслуживает выборки «записи пользователя за период», свежие первыми
+    __table_args__ = (
+        Index("ix_entries_telegram_id_event_time", telegram_id, event_time.desc()),
+    )
+
+
+class DailyStat(Base):
+    """Итоги дневника за локальный день пользователя (по ``users.timezone``).
+
+    По каждой величине — число заполненных записей, сумма, минимум, максимум
+    и сумма квадратов: средние и разброс за любой период складываются из
+    строк его дней, не читая сами записи.  Обновляется вместе с ``entries``
+    в db_access; пересобрать целиком — ``python daily_stats.py``.
+    """
+    __tablename__ = "daily_stats"
+
+    telegram_id = Column(BigInteger, ForeignKey("users.telegram_id"), primary_key=True)
+    local_date  = Column(Date, primary_key=True)
+    entries     = Column(Integer, nullable=False, default=0)
+
+    sugar_count = Column(Integer, nullable=False, default=0)
+    sugar_sum   = Column(Float, nullable=False, default=0)
+    sugar_min   = Column(Float)
+    sugar_max   = Column(Float)
+    sugar_sumsq = Column(Float, nullable=False, default=0)
+
+    dose_count  = Column(Integer, nullable=False, default=0)
+    dose_sum    = Column(Float, nullable=False, default=0)
+    dose_min    = Column(Float)
+    dose_max    = Column(Float)
+    dose_sumsq  = Column(Float, nullable=False, default=0)
+
+    carbs_count = Column(Integer, nullable=False, default=0)
+    carbs_sum   = Column(Float, nullable=False, default=0)
+    carbs_min   = Column(Float)
+    carbs_max   = Column(Float)
+    carbs_sumsq = Column(Float, nullable=False, default=0)
+
+    xe_count    = Column(Integer, nullable=False, default=0)
+    xe_sum      = Column(Float, nullable=False, default=0)
+    xe_min      = Column(Float)
+    xe_max      = Column(Float)
+    xe_sumsq    = Column(Float, nullable=False, default=0)
 
 class Reminder(Base):
     __tablename__ = "reminders"
@@ -62,6 +126,40 @@ class Reminder(Base):
     time        = Column(TIMESTAMP(timezone=True), nullable=False)
     message     = Column(Text, nullable=False)
     created_at  = Column(TIMESTAMP, server_default=func.now())
+    rule        = Column(String(32))  # daily | weekdays | hours:N, NULL — разовое
+    delivered_at = Column(TIMESTAMP(timezone=True))  # NULL — ещё не отправлено
+    # аренда при нескольких экземплярах бота: кто взял напоминание и до когда
+    claimed_by  = Column(String(64))
+    lease_expires_at = Column(TIMESTAMP(timezone=True))
+
+    # При старте бот поднимает только неотправленные будущие напоминания
+    __table_args__ = (
+        Index("ix_reminders_pending_time", time, postgresql_where=delivered_at.is_(None)),
+    )
+
+
+class VisionCache(Base):
+    """Результаты Vision по содержимому фото (sha256 байтов изображения)."""
+    __tablename__ = "vision_cache"
+
+    content_hash = Column(String(64), primary_key=True)
+    phash        = Column(BigInteger, index=True)   # перцептивный aHash 8×8, знаковый int64
+    vision_text  = Column(Text, nullable=False)
+    carbs_g      = Column(Float)
+    xe           = Column(Float)
+    created_at   = Column(TIMESTAMP(timezone=True), nullable=False)
+    last_used_at = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
+
+
+class BotState(Base):
+    """Состояние диалогов пользователя (user_data и шаги ConversationHandler)
+    для нескольких процессов бота; ``version`` растёт при каждой записи."""
+    __tablename__ = "bot_state"
+
+    telegram_id = Column(BigInteger, primary_key=True)
+    data        = Column(LargeBinary, nullable=False)  # JSON в UTF-8
+    version     = Column(Integer, nullable=False)
+    updated_at  = Column(TIMESTAMP(timezone=True), nullable=False)
 
 
 # ────────────────────── инициализация ────────────────────────
@@ -1,8 +1,17 @@
 import logging
-from datetime import datetime
+from datetime import date, datetime, time as dtime, timedelta, timezone, tzinfo
 from typing import List
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from pydantic import BaseModel, ConfigDict
-from db import SessionLocal, Profile, Entry, Reminder
+from sqlalchemy import BigInteger, Date, cast, delete, func, insert, literal, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+import config
+from db import SessionLocal, AsyncSessionLocal, User, Profile, Entry, Reminder, DailyStat
+from functions import PatientProfile
+from profile_cache import profile_cache
 
 
 class EntryData(BaseModel):
@@ -18,6 +27,41 @@ class EntryData(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
 
+def local_day_bounds(day: date, tz: tzinfo) -> tuple[datetime, datetime]:
+    """Return the UTC half-open range ``[start, end)`` of local day ``day``.
+
+    Comparing ``event_time`` against plain timestamps (instead of
+    ``func.date(event_time)``) lets Postgres serve the lookup from
+    ``ix_entries_telegram_id_event_time``.  DST days come out 23 or 25 hours
+    long, as they should.
+    """
+    start = datetime.combine(day, dtime.min, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), dtime.min, tzinfo=tz)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+def entries_in_range(
+    user_id: int,
+    start: datetime,
+    end: datetime | None = None,
+    newest_first: bool = False,
+    columns: tuple = (),
+) -> Select:
+    """Build the ``SELECT`` of a user's entries with ``start <= event_time < end``.
+
+    With ``columns`` only those columns are selected instead of ``Entry``.
+    """
+    query = (
+        select(*columns or (Entry,))
+        .where(Entry.telegram_id == user_id)
+        .where(Entry.event_time >= start)
+    )
+    if end is not None:
+        query = query.where(Entry.event_time < end)
+    order = Entry.event_time.desc() if newest_first else Entry.event_time
+    return query.order_by(order)
+
+
 def save_profile(user_id: int, icr: float, cf: float, target: float) -> None:
     with SessionLocal() as session:
         profile = session.get(Profile, user_id)
@@ -33,6 +77,8 @@ def save_profile(user_id: int, icr: float, cf: float, target: float) -> None:
             logging.exception("Failed to save profile")
             session.rollback()
             raise
+        finally:
+            profile_cache.invalidate(user_id)
 
 
 def get_profile(user_id: int) -> Profile | None:
@@ -46,6 +92,11 @@ def add_entry(entry_data: dict) -> None:
         entry = Entry(**data.model_dump())
         session.add(entry)
         try:
+            tz = zone_or_default(session.scalar(
+                select(User.timezone).where(User.telegram_id == entry.telegram_id)
+            ))
+            session.execute(_daily_stats_increment(session, entry, tz))
+            session.execute(_bump_data_version(entry.telegram_id))
             session.commit()
         except Exception:
             logging.exception("Failed to add entry")
@@ -99,3 +150,493 @@ def delete_reminder(reminder_id: int) -> None:
                 logging.exception("Failed to delete reminder")
                 session.rollback()
                 raise
+
+
+# ───────────── асинхронные версии для хендлеров бота ─────────────
+async def save_profile_async(user_id: int, icr: float, cf: float, target: float) -> None:
+    async with AsyncSessionLocal() as session:
+        profile = await session.get(Profile, user_id)
+        if not profile:
+            profile = Profile(telegram_id=user_id)
+            session.add(profile)
+        profile.icr = icr
+        profile.cf = cf
+        profile.target_bg = target
+        try:
+            await session.commit()
+        except Exception:
+            logging.exception("Failed to save profile")
+            await session.rollback()
+            raise
+        finally:
+            profile_cache.invalidate(user_id)
+
+
+async def get_profile_async(user_id: int) -> PatientProfile | None:
+    """Profile snapshot, served from :data:`profile_cache` when possible."""
+    cached = profile_cache.get(user_id)
+    if cached is not None:
+        return cached
+    generation = profile_cache.generation()
+    async with AsyncSessionLocal() as session:
+        profile = await session.get(Profile, user_id)
+    if profile is None:
+        return None
+    snapshot = PatientProfile(profile.icr, profile.cf, profile.target_bg)
+    profile_cache.put(user_id, snapshot, generation)
+    return snapshot
+
+
+async def add_entry_async(entry_data: dict) -> None:
+    data = EntryData.model_validate(entry_data)
+    async with AsyncSessionLocal() as session:
+        entry = Entry(**data.model_dump())
+        session.add(entry)
+        try:
+            tz = zone_or_default(await session.scalar(
+                select(User.timezone).where(User.telegram_id == entry.telegram_id)
+            ))
+            # итоги дня меняются в той же транзакции, что и сама запись
+            await session.execute(_daily_stats_increment(session, entry, tz))
+            await session.execute(_bump_data_version(entry.telegram_id))
+            await session.commit()
+        except Exception:
+            logging.exception("Failed to add entry")
+            await session.rollback()
+            raise
+
+
+async def get_entries_since_async(user_id: int, date_from: datetime) -> List[Entry]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(entries_in_range(user_id, date_from))
+        return list(result.scalars())
+
+
+REPORT_COLUMNS = (Entry.event_time, Entry.sugar_before, Entry.dose, Entry.carbs_g, Entry.xe)
+
+
+async def get_report_series_async(user_id: int, start: datetime, end: datetime | None = None) -> list:
+    """Rows ``(event_time, sugar_before, dose, carbs_g, xe)`` of a report period, oldest first.
+
+    Reports need only these columns: no ``Entry`` objects are built and the
+    ``gpt_summary`` / ``photo_path`` texts are not read.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(entries_in_range(user_id, start, end, columns=REPORT_COLUMNS))
+        return list(result)
+
+
+async def get_entries_for_day_async(user_id: int, day: date, tz: tzinfo) -> List[Entry]:
+    """Entries of local day ``day`` in ``tz``, newest first."""
+    start, end = local_day_bounds(day, tz)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            entries_in_range(user_id, start, end, newest_first=True)
+        )
+        return list(result.scalars())
+
+
+def zone_or_default(name: str | None) -> tzinfo:
+    """``ZoneInfo`` for an IANA name, :data:`config.TIMEZONE` if unset or unknown."""
+    if name:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logging.warning("Unknown timezone %r", name)
+    return config.TIMEZONE
+
+
+async def get_user_timezone_async(user_id: int) -> tzinfo:
+    """User's own timezone, falling back to :data:`config.TIMEZONE`."""
+    async with AsyncSessionLocal() as session:
+        name = await session.scalar(
+            select(User.timezone).where(User.telegram_id == user_id)
+        )
+    return zone_or_default(name)
+
+
+async def add_reminder_async(user_id: int, time: datetime, message: str,
+                             rule: str | None = None) -> Reminder:
+    async with AsyncSessionLocal() as session:
+        reminder = Reminder(telegram_id=user_id, time=time, message=message, rule=rule)
+        session.add(reminder)
+        try:
+            await session.commit()
+        except Exception:
+            logging.exception("Failed to add reminder")
+            await session.rollback()
+            raise
+        await session.refresh(reminder)
+        return reminder
+
+
+async def get_reminders_async(user_id: int) -> List[Reminder]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Reminder)
+            .where(Reminder.telegram_id == user_id)
+            .order_by(Reminder.time)
+        )
+        return list(result.scalars())
+
+
+async def get_pending_reminders_async(now: datetime) -> list[tuple]:
+    """Undelivered reminders as ``(id, telegram_id, time, message, rule, timezone)``.
+
+    One-shot reminders are returned only if due after ``now``; recurring ones
+    always, the scheduler moves missed ones to their next occurrence.  One
+    query over the partial ``ix_reminders_pending_time`` index; only the
+    columns the scheduler needs are loaded, without building ORM objects.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Reminder.id, Reminder.telegram_id, Reminder.time, Reminder.message,
+                   Reminder.rule, User.timezone)
+            .outerjoin(User, User.telegram_id == Reminder.telegram_id)
+            .where(
+                Reminder.delivered_at.is_(None),
+                or_(Reminder.time > now, Reminder.rule.is_not(None)),
+            )
+            .order_by(Reminder.time)
+        )
+        return [tuple(row) for row in result]
+
+
+async def mark_reminder_delivered_async(reminder_id: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Reminder)
+            .where(Reminder.id == reminder_id)
+            .values(delivered_at=datetime.now(timezone.utc), claimed_by=None, lease_expires_at=None)
+        )
+        try:
+            await session.commit()
+        except Exception:
+            logging.exception("Failed to mark reminder %s delivered", reminder_id)
+            await session.rollback()
+            raise
+
+
+async def reschedule_reminder_async(reminder_id: int, next_time: datetime) -> None:
+    """Move a recurring reminder to its next occurrence and release its lease."""
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Reminder)
+            .where(Reminder.id == reminder_id)
+            .values(time=next_time, claimed_by=None, lease_expires_at=None)
+        )
+        try:
+            await session.commit()
+        except Exception:
+            logging.exception("Failed to reschedule reminder %s", reminder_id)
+            await session.rollback()
+            raise
+
+
+async def claim_due_reminders_async(worker_id: str, horizon: datetime, not_before: datetime,
+                                    lease: timedelta, limit: int) -> list[tuple]:
+    """Lease up to ``limit`` reminders due by ``horizon`` to ``worker_id``.
+
+    Rows are picked with ``FOR UPDATE SKIP LOCKED``, so concurrent workers
+    never claim the same reminder; rows whose lease has expired (their worker
+    died) are claimable again.  Unleased one-shot reminders older than
+    ``not_before`` are too late to send: they get ``delivered_at`` so they
+    drop out of the pending index instead of being scanned on every claim.
+    Returns the same tuples as :func:`get_pending_reminders_async`.
+    """
+    now = datetime.now(timezone.utc)
+    free = or_(Reminder.lease_expires_at.is_(None), Reminder.lease_expires_at < now)
+    async with AsyncSessionLocal() as session:
+        skipped = await session.execute(
+            update(Reminder)
+            .where(Reminder.delivered_at.is_(None), Reminder.rule.is_(None),
+                   Reminder.time < not_before, free)
+            .values(delivered_at=now, claimed_by=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        if skipped.rowcount:
+            logging.warning("Skipped %s one-shot reminders due before %s", skipped.rowcount, not_before)
+        ids = list(await session.scalars(
+            select(Reminder.id)
+            .where(
+                Reminder.delivered_at.is_(None),
+                Reminder.time <= horizon,
+                or_(Reminder.time >= not_before, Reminder.rule.is_not(None)),
+                free,
+            )
+            .order_by(Reminder.time)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ))
+        rows = []
+        if ids:
+            await session.execute(
+                update(Reminder)
+                .where(Reminder.id.in_(ids))
+                .values(claimed_by=worker_id, lease_expires_at=now + lease)
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(
+                select(Reminder.id, Reminder.telegram_id, Reminder.time, Reminder.message,
+                       Reminder.rule, User.timezone)
+                .outerjoin(User, User.telegram_id == Reminder.telegram_id)
+                .where(Reminder.id.in_(ids))
+                .order_by(Reminder.time)
+            )
+            rows = [tuple(row) for row in result]
+        try:
+            await session.commit()
+        except Exception:
+            logging.exception("Failed to claim reminders for %s", worker_id)
+            await session.rollback()
+            raise
+        return rows
+
+
+async def renew_reminder_leases_async(worker_id: str, lease: timedelta) -> int:
+    """Extend the leases ``worker_id`` still holds; returns how many."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(Reminder)
+            .where(Reminder.claimed_by == worker_id, Reminder.delivered_at.is_(None))
+            .values(lease_expires_at=datetime.now(timezone.utc) + lease)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def delete_reminder_async(reminder_id: int) -> None:
+    async with AsyncSessionLocal() as session:
+        reminder = await session.get(Reminder, reminder_id)
+        if reminder:
+            await session.delete(reminder)
+            try:
+                await session.commit()
+            except Exception:
+                logging.exception("Failed to delete reminder")
+                await session.rollback()
+                raise
+
+
+# ───────────── дневные итоги (daily_stats) ─────────────
+DAILY_METRICS = {
+    "sugar": Entry.sugar_before,
+    "dose": Entry.dose,
+    "carbs": Entry.carbs_g,
+    "xe": Entry.xe,
+}
+_STAT_SUFFIXES = ("count", "sum", "min", "max", "sumsq")
+
+
+def local_date(moment: datetime, tz: tzinfo) -> date:
+    """Local calendar day of ``moment`` in ``tz``; naive values are taken as UTC."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(tz).date()
+
+
+def _daily_stats_increment(session, entry: Entry, tz: tzinfo):
+    """``INSERT … ON CONFLICT DO UPDATE`` adding one new entry to its day."""
+    postgres = session.get_bind().dialect.name == "postgresql"
+    dialect_insert = postgresql.insert if postgres else sqlite.insert
+    # в SQLite двухаргументные min/max — скалярные функции
+    least, greatest = (func.least, func.greatest) if postgres else (func.min, func.max)
+
+    values = {
+        "telegram_id": entry.telegram_id,
+        "local_date": local_date(entry.event_time, tz),
+        "entries": 1,
+    }
+    updates = {"entries": DailyStat.entries + 1}
+    for metric, column in DAILY_METRICS.items():
+        value = getattr(entry, column.key)
+        filled = value is not None
+        values.update({
+            f"{metric}_count": int(filled),
+            f"{metric}_sum": value if filled else 0.0,
+            f"{metric}_min": value,
+            f"{metric}_max": value,
+            f"{metric}_sumsq": value * value if filled else 0.0,
+        })
+        if not filled:
+            continue
+        stat = {suffix: getattr(DailyStat, f"{metric}_{suffix}") for suffix in _STAT_SUFFIXES}
+        updates.update({
+            f"{metric}_count": stat["count"] + 1,
+            f"{metric}_sum": stat["sum"] + value,
+            f"{metric}_min": least(func.coalesce(stat["min"], value), value),
+            f"{metric}_max": greatest(func.coalesce(stat["max"], value), value),
+            f"{metric}_sumsq": stat["sumsq"] + value * value,
+        })
+    return (
+        dialect_insert(DailyStat)
+        .values(**values)
+        .on_conflict_do_update(index_elements=["telegram_id", "local_date"], set_=updates)
+    )
+
+
+def _daily_aggregates() -> tuple[list, list[str]]:
+    """Aggregate columns over ``entries`` and the ``daily_stats`` columns they fill."""
+    columns = [func.count()]
+    names = ["entries"]
+    for metric, column in DAILY_METRICS.items():
+        columns += [
+            func.count(column),
+            func.coalesce(func.sum(column), 0.0),
+            func.min(column),
+            func.max(column),
+            func.coalesce(func.sum(column * column), 0.0),
+        ]
+        names += [f"{metric}_{suffix}" for suffix in _STAT_SUFFIXES]
+    return columns, names
+
+
+def _daily_stats_recompute(user_id: int, day: date, tz: tzinfo) -> tuple:
+    """Statements rebuilding one day's row from ``entries``.
+
+    Used after an edit or a delete: a minimum or maximum cannot be taken
+    back incrementally.  The row disappears when the day has no entries.
+    """
+    start, end = local_day_bounds(day, tz)
+    aggregates, names = _daily_aggregates()
+    source = (
+        select(literal(user_id, BigInteger), literal(day, Date), *aggregates)
+        .where(Entry.telegram_id == user_id)
+        .where(Entry.event_time >= start, Entry.event_time < end)
+        .having(func.count() > 0)
+    )
+    return (
+        delete(DailyStat).where(DailyStat.telegram_id == user_id, DailyStat.local_date == day),
+        insert(DailyStat).from_select(["telegram_id", "local_date", *names], source),
+    )
+
+
+def _bump_data_version(user_id: int):
+    """``UPDATE`` marking that the user's entries changed (see :mod:`report_cache`)."""
+    return (
+        update(User)
+        .where(User.telegram_id == user_id)
+        .values(data_version=User.data_version + 1)
+    )
+
+
+async def get_data_version_async(user_id: int) -> str:
+    """Opaque version of the user's entries, never reused for another state.
+
+    ``data_version`` restarts at 0 when the user is re-created after /reset;
+    ``created_at`` tells the two lives apart.
+    """
+    async with AsyncSessionLocal() as session:
+        row = (await session.execute(
+            select(User.created_at, User.data_version).where(User.telegram_id == user_id)
+        )).first()
+    if row is None:
+        return "-"
+    created_at, version = row
+    return f"{created_at.isoformat() if created_at else '-'}/{version}"
+
+
+async def refresh_daily_stats(session: AsyncSession, user_id: int, *moments: datetime) -> None:
+    """Recompute the days of ``moments`` inside the caller's transaction.
+
+    Call after changing or deleting entries, before ``commit``; pass both
+    the old and the new ``event_time`` if an entry moved to another day.
+    Also bumps ``users.data_version``.
+    """
+    await session.flush()
+    await session.execute(_bump_data_version(user_id))
+    tz = zone_or_default(await session.scalar(
+        select(User.timezone).where(User.telegram_id == user_id)
+    ))
+    for day in sorted({local_date(moment, tz) for moment in moments}):
+        for statement in _daily_stats_recompute(user_id, day, tz):
+            await session.execute(statement)
+
+
+def rebuild_daily_stats(session, user_id: int, tz: tzinfo) -> int:
+    """Replace all rows of a user by totals computed from ``entries``.
+
+    Backfill after the migration or after ``users.timezone`` changed (see
+    :func:`set_user_timezone_async`); bumps ``users.data_version`` and
+    returns the number of days written.  The caller commits.  On Postgres
+    the days are grouped by the database in one ``INSERT … SELECT … GROUP BY
+    date_trunc('day', event_time AT TIME ZONE …)``; SQLite knows no IANA
+    zones, there the rows are summed up here.
+    """
+    zone = getattr(tz, "key", None)
+    if session.get_bind().dialect.name == "postgresql" and zone:
+        local_day = cast(func.date_trunc("day", func.timezone(zone, Entry.event_time)), Date)
+        aggregates, names = _daily_aggregates()
+        source = (
+            select(literal(user_id, BigInteger), local_day, *aggregates)
+            .where(Entry.telegram_id == user_id)
+            .group_by(local_day)
+        )
+        session.execute(delete(DailyStat).where(DailyStat.telegram_id == user_id))
+        result = session.execute(
+            insert(DailyStat).from_select(["telegram_id", "local_date", *names], source)
+        )
+        session.execute(_bump_data_version(user_id))
+        return result.rowcount
+
+    columns = list(DAILY_METRICS.values())
+    rows = session.execute(
+        select(Entry.event_time, *columns).where(Entry.telegram_id == user_id)
+    )
+    days: dict[date, dict] = {}
+    for event_time, *values in rows:
+        day = local_date(event_time, tz)
+        totals = days.get(day)
+        if totals is None:
+            totals = days[day] = {"telegram_id": user_id, "local_date": day, "entries": 0}
+            for metric in DAILY_METRICS:
+                totals.update({f"{metric}_count": 0, f"{metric}_sum": 0.0,
+                               f"{metric}_min": None, f"{metric}_max": None, f"{metric}_sumsq": 0.0})
+        totals["entries"] += 1
+        for metric, value in zip(DAILY_METRICS, values):
+            if value is None:
+                continue
+            totals[f"{metric}_count"] += 1
+            totals[f"{metric}_sum"] += value
+            totals[f"{metric}_sumsq"] += value * value
+            low, high = totals[f"{metric}_min"], totals[f"{metric}_max"]
+            totals[f"{metric}_min"] = value if low is None else min(low, value)
+            totals[f"{metric}_max"] = value if high is None else max(high, value)
+    session.execute(delete(DailyStat).where(DailyStat.telegram_id == user_id))
+    if days:
+        session.execute(insert(DailyStat), list(days.values()))
+    session.execute(_bump_data_version(user_id))
+    return len(days)
+
+
+async def set_user_timezone_async(user_id: int, name: str | None) -> None:
+    """Store the user's IANA timezone and re-cut their ``daily_stats`` days.
+
+    The rows are keyed by local date, so they are rebuilt in the same
+    transaction; cached reports go stale through ``data_version``.
+    """
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(User).where(User.telegram_id == user_id).values(timezone=name))
+        days = await session.run_sync(lambda sync: rebuild_daily_stats(sync, user_id, zone_or_default(name)))
+        try:
+            await session.commit()
+        except Exception:
+            logging.exception("Failed to set timezone of user %s", user_id)
+            await session.rollback()
+            raise
+    logging.info("[DAILY_STATS] user=%s timezone=%s days=%s", user_id, name, days)
+
+
+async def get_daily_stats_async(user_id: int, day_from: date, day_to: date | None = None) -> List[DailyStat]:
+    """Rows of local days ``day_from``..``day_to`` (inclusive), oldest first."""
+    query = (
+        select(DailyStat)
+        .where(DailyStat.telegram_id == user_id)
+        .where(DailyStat.local_date >= day_from)
+    )
+    if day_to is not None:
+        query = query.where(DailyStat.local_date <= day_to)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(query.order_by(DailyStat.local_date))
+        return list(result.scalars())
@@ -1,68 +1,181 @@
 # gpt_client.py
 
-import openai
-import os
+import asyncio
 import logging
-from config import (
-    OPENAI_API_KEY,
-    OPENAI_ASSISTANT_ID,
-    OPENAI_PROXY,
-    validate_tokens,
-)
+from config import OPENAI_ASSISTANT_ID, OPENAI_STREAM_RUNS
+from openai_client import client
 
-validate_tokens()
+RUN_TERMINAL_STATUSES = ("completed", "failed", "cancelled", "expired", "incomplete", "requires_action")
 
-# --- Только здесь прописываем прокси ---
-if OPENAI_PROXY is not None:
-    os.environ["HTTP_PROXY"] = OPENAI_PROXY
-    os.environ["HTTPS_PROXY"] = OPENAI_PROXY
-
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Адаптивный опрос (когда стриминг недоступен): 0.2 с → ×1.5 → не больше 2 с
+POLL_INITIAL_DELAY = 0.2
+POLL_BACKOFF       = 1.5
+POLL_MAX_DELAY     = 2.0
 
 logging.info("[OpenAI] Using assistant: %s", OPENAI_ASSISTANT_ID)
 
 
-def create_thread() -> str:
+async def create_thread() -> str:
     """Создаём пустой thread (ассистент задаётся позже, в runs.create)."""
-    thread = client.beta.threads.create()
+    thread = await client.beta.threads.create()
     return thread.id
 
-def send_message(thread_id: str, content: str | None = None, image_path: str | None = None):
-    """
-    Отправляет текст или (изображение + текст) в thread
-    и запускает run с ассистентом.  Возвращает объект run.
-    Требует хотя бы один из параметров: content или image_path.
+async def _post_message(
+    thread_id: str,
+    content: str | None,
+    image_path: str | None,
+    image: bytes | None = None,
+    image_name: str = "photo.jpg",
+) -> None:
+    """Добавляет в thread сообщение пользователя (текст или изображение + текст).
+
+    Изображение передаётся байтами (``image``) — прямо из памяти, без
+    записи на диск — или путём к файлу (``image_path``).
     """
-    if content is None and image_path is None:
-        logging.warning("[OpenAI] send_message called without content or image_path")
-        raise ValueError("Either content or image_path must be provided")
+    if content is None and image_path is None and image is None:
+        logging.warning("[OpenAI] send_message called without content or image")
+        raise ValueError("Either content or image must be provided")
     # 1. Подготовка контента
-    if image_path:
+    if image is not None or image_path:
+        source = image_name if image is not None else image_path
         try:
-            with open(image_path, "rb") as f:
-                file = client.files.create(file=f, purpose="vision")
-            logging.info("[OpenAI] Uploaded image %s, file_id=%s", image_path, file.id)
+            if image is not None:
+                file = await client.files.create(file=(image_name, image), purpose="vision")
+            else:
+                with open(image_path, "rb") as f:
+                    file = await client.files.create(file=f, purpose="vision")
+            logging.info("[OpenAI] Uploaded image %s, file_id=%s", source, file.id)
             content_block = [
                 {"type": "image_file", "image_file": {"file_id": file.id}},
                 {"type": "text",       "text": content or "Что изображено на фото?"}
             ]
         except Exception as e:
-            logging.exception("[OpenAI] Failed to upload %s: %s", image_path, e)
+            logging.exception("[OpenAI] Failed to upload %s: %s", source, e)
             raise
     else:
         content_block = content
 
     # 2. Создаём сообщение в thread
-    client.beta.threads.messages.create(
+    await client.beta.threads.messages.create(
         thread_id=thread_id,
         role="user",
         content=content_block
     )
 
+
+async def send_message(
+    thread_id: str,
+    content: str | None = None,
+    image_path: str | None = None,
+    image: bytes | None = None,
+    image_name: str = "photo.jpg",
+):
+    """
+    Отправляет текст или (изображение + текст) в thread
+    и запускает run с ассистентом.  Возвращает объект run.
+    Требует хотя бы один из параметров: content, image_path или image.
+    """
+    await _post_message(thread_id, content, image_path, image, image_name)
+
     # 3. Запускаем ассистента
-    run = client.beta.threads.runs.create(
+    run = await client.beta.threads.runs.create(
         thread_id=thread_id,
         assistant_id=OPENAI_ASSISTANT_ID
     )
     logging.debug("[OpenAI] Run %s started (thread %s)", run.id, thread_id)
     return run
+
+
+class RunFailedError(RuntimeError):
+    """Run ассистента завершился не со статусом ``completed``."""
+
+    def __init__(self, status: str | None):
+        super().__init__(f"Assistant run finished with status={status}")
+        self.status = status
+
+
+def message_text(message) -> str:
+    """Текст первого текстового блока сообщения Assistants API («» если его нет)."""
+    return next(
+        (block.text.value for block in message.content or [] if getattr(block, "text", None)),
+        "",
+    )
+
+
+async def wait_for_reply(run) -> str:
+    """Дожидается окончания run опросом с экспоненциальной задержкой.
+
+    Возвращает текст ответа ассистента из этого run — без чтения всего thread.
+    """
+    return (await _poll_reply(run))[0]
+
+
+async def _poll_reply(run):
+    delay = POLL_INITIAL_DELAY
+    while run.status not in RUN_TERMINAL_STATUSES:
+        await asyncio.sleep(delay)
+        delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+        run = await client.beta.threads.runs.retrieve(thread_id=run.thread_id, run_id=run.id)
+    if run.status != "completed":
+        raise RunFailedError(run.status)
+
+    messages = await client.beta.threads.messages.list(
+        thread_id=run.thread_id, run_id=run.id, order="desc", limit=1
+    )
+    return next((message_text(m) for m in messages.data if m.role == "assistant"), ""), run
+
+
+async def _stream_reply(thread_id: str):
+    """Запускает run через streaming API и читает поток до конца.
+
+    Текст берётся из события ``thread.message.completed``, но возврат — только
+    после завершения потока: статус и ``usage`` run известны лишь в конце.
+    """
+    reply = ""
+    async with client.beta.threads.runs.stream(
+        thread_id=thread_id,
+        assistant_id=OPENAI_ASSISTANT_ID,
+    ) as stream:
+        async for event in stream:
+            if event.event == "thread.message.completed" and event.data.role == "assistant":
+                reply = message_text(event.data)
+        run = stream.current_run
+    status = run.status if run else None
+    if status != "completed":
+        raise RunFailedError(status)
+    return reply, run
+
+
+async def ask_assistant(
+    thread_id: str,
+    content: str | None = None,
+    image_path: str | None = None,
+    image: bytes | None = None,
+    image_name: str = "photo.jpg",
+) -> str:
+    """Отправляет сообщение ассистенту и возвращает текст его ответа.
+
+    По умолчанию run идёт через streaming API (завершение видно без опроса,
+    по событиям потока); при ``OPENAI_STREAM_RUNS=0`` — обычный run с адаптивным
+    опросом.  Бросает :class:`RunFailedError`, если run не завершился.
+    """
+    reply, _ = await run_assistant(thread_id, content, image_path, image, image_name)
+    return reply
+
+
+async def run_assistant(
+    thread_id: str,
+    content: str | None = None,
+    image_path: str | None = None,
+    image: bytes | None = None,
+    image_name: str = "photo.jpg",
+):
+    """Как :func:`ask_assistant`, но возвращает ``(текст, run)``.
+
+    У завершённого run есть ``usage`` — по ``prompt_tokens`` видно, какой
+    длины контекст thread ассистент прочитал.
+    """
+    if not OPENAI_STREAM_RUNS:
+        return await _poll_reply(await send_message(thread_id, content, image_path, image, image_name))
+    await _post_message(thread_id, content, image_path, image, image_name)
+    return await _stream_reply(thread_id)
@@ -1,17 +1,12 @@
-import os, json, logging, asyncio
-from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_PROXY, validate_tokens
+import json, logging
+from collections import Counter
 
-validate_tokens()
+from config import LOCAL_PARSER_MIN_CONFIDENCE
+from local_command_parser import parse_local
+from openai_client import client
 
-# 1️⃣ СРАЗУ ставим переменные окружения — до создания клиента!
-if OPENAI_PROXY is not None:
-    os.environ["HTTP_PROXY"] = OPENAI_PROXY
-    os.environ["HTTPS_PROXY"] = OPENAI_PROXY
-
-# 2️⃣ Создаём обычный клиент OpenAI — без extra‑аргументов,
-#    он возьмёт прокси из env автоматически.
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Сколько сообщений разобрано локально и сколько ушло в LLM
+PARSE_STATS: Counter = Counter()
 
 # gpt_command_parser.py  ← замените весь блок SYSTEM_PROMPT
 SYSTEM_PROMPT = (
@@ -26,6 +21,7 @@ SYSTEM_PROMPT = (
     '  "entry_date": "YYYY-MM-DDTHH:MM:SS",      // ⇦ указывай ТОЛЬКО если есть полная дата\n'
     '  "time": "HH:MM",                          // ⇦ если в сообщении было лишь время\n'
     '  "message": "text",                       // ⇦ для set_reminder\n'
+    '  "repeat": "daily" | "weekdays" | "hours:N", // ⇦ для повторяющегося set_reminder\n'
     '  "fields": { ... }                         // xe, carbs_g, dose, sugar_before и пр.\n'
     "}\n\n"
 
@@ -52,14 +48,18 @@ SYSTEM_PROMPT = (
 async def parse_command(text: str) -> dict | None:
     """Parse user's free-form text into a structured command.
 
-    The OpenAI client call is executed in a background thread to avoid
-    blocking the event loop.
+    Routine diary messages are handled by :func:`parse_local`; the LLM is
+    called only when the local rules are not confident.  The OpenAI request
+    goes through the shared async client, so it never blocks the event loop.
     """
+    local, confidence = parse_local(text)
+    if local is not None and confidence >= LOCAL_PARSER_MIN_CONFIDENCE:
+        PARSE_STATS["local"] += 1
+        logging.info("Local parse (confidence %.2f): %s", confidence, local)
+        return local
+    PARSE_STATS["llm"] += 1
     try:
-        # Run the blocking client call in a separate thread so the event loop
-        # remains responsive.
-        response = await asyncio.to_thread(
-            client.chat.completions.create,
+        response = await client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
@@ -0,0 +1,92 @@
+# image_prep.py
+"""Shrink meal photos before they are uploaded to Vision.
+
+Upload time and Vision token cost grow with the image, and beyond a
+phone-screen resolution the carb estimate does not get any better.  Telegram
+already keeps several sizes of every photo, so :func:`pick_photo` takes the
+smallest one that is still large enough.  Images sent as documents arrive
+untouched (multi-megabyte PNGs, camera JPEGs with GPS in EXIF);
+:func:`prepare` downsizes them to ``VISION_IMAGE_MAX_EDGE`` and re-encodes
+them as JPEG without metadata in a small thread pool.
+"""
+import asyncio
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence, TypeVar
+
+from config import IMAGE_PREP_WORKERS, VISION_IMAGE_MAX_EDGE, VISION_IMAGE_QUALITY, VISION_PHOTO_MIN_EDGE
+
+try:  # без Pillow документы уходят в Vision как есть
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = ImageOps = None
+
+PhotoSizeT = TypeVar("PhotoSizeT")
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def pick_photo(sizes: Sequence[PhotoSizeT], min_edge: int = VISION_PHOTO_MIN_EDGE) -> PhotoSizeT:
+    """Smallest ``PhotoSize`` whose long edge is at least ``min_edge``.
+
+    Falls back to the largest size when none is big enough.
+    """
+    ordered = sorted(sizes, key=lambda size: size.width * size.height)
+    for size in ordered:
+        if max(size.width, size.height) >= min_edge:
+            return size
+    return ordered[-1]
+
+
+def downscale(
+    data: bytes, max_edge: int = VISION_IMAGE_MAX_EDGE, quality: int = VISION_IMAGE_QUALITY
+) -> bytes | None:
+    """Return ``data`` as an EXIF-free JPEG with the long edge ``<= max_edge``.
+
+    A JPEG that is already small enough and carries no metadata is returned
+    unchanged.  ``None`` means the image could not be decoded (no Pillow,
+    HEIC without a plugin, a broken file).
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format == "JPEG" and max(img.size) <= max_edge and not img.info.get("exif"):
+                return data
+            # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8)
+            img.draft("RGB", (max_edge, max_edge))
+            img = ImageOps.exif_transpose(img)  # поворот из EXIF, пока он ещё есть
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, "white")
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, "JPEG", quality=quality, optimize=True)
+            return out.getvalue()
+    except Exception:
+        logging.debug("[IMAGE_PREP] Cannot decode image", exc_info=True)
+        return None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IMAGE_PREP_WORKERS, thread_name_prefix="image-prep")
+    return _executor
+
+
+async def prepare(data: bytes) -> bytes | None:
+    """:func:`downscale` in the image thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), downscale, data)
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
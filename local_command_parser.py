@@ -0,0 +1,141 @@
+# local_command_parser.py
+"""Deterministic parser for routine diary messages.
+
+Handles the highly regular inputs ("5 ХЕ, сахар 9, уколол 4 ед",
+"сахар 7.5", "напомни измерить сахар в 21:00") without a round trip to the
+LLM.  The result uses the same JSON schema as :mod:`gpt_command_parser`
+(``action``, ``time``, ``entry_date``, ``message``, ``fields``) together with a
+confidence score — the share of the message the rules actually understood.
+Anything unusual gets a low score and is left to the LLM.
+"""
+import re
+
+_NUM = r"(\d+(?:[.,]\d+)?)"
+
+# Поля записи: (поле, шаблон).  Шаблоны с ключевым словом идут первыми,
+# чтобы «уколол 4 ед» целиком ушло в dose, а не разбилось на части.
+_FIELD_PATTERNS = [
+    ("sugar_before", rf"\b(?:сахар\w*|глюкоз\w*|ск)\s*[:=]?\s*{_NUM}(?:\s*ммоль(?:\s*/\s*л)?)?"),
+    ("dose", rf"\b(?:доза|инсулин\w*|уколол\w*|вколол\w*|укол)\s*[:=]?\s*{_NUM}(?:\s*(?:ед\w*|units?|u)\b\.?)?"),
+    ("carbs_g", rf"\bуглевод\w*\s*[:=]?\s*{_NUM}(?:\s*(?:г|гр|грамм\w*)\b\.?)?"),
+    ("xe", rf"\b(?:хе|xe)\s*[:=]?\s*{_NUM}"),
+    ("xe", rf"{_NUM}\s*(?:хе|xe|хлебн\w*\s+единиц\w*)\b"),
+    # «200 г» без слова «углеводы» — скорее вес порции, а не углеводы
+    ("carbs_g", rf"{_NUM}\s*(?:г|гр|грамм\w*)\b\.?\s+углевод\w*"),
+    ("dose", rf"{_NUM}\s*(?:ед|единиц\w*|units?)\b\.?(?:\s+инсулин\w*)?"),
+    ("sugar_before", rf"{_NUM}\s*ммоль(?:\s*/\s*л)?"),
+]
+_FIELD_PATTERNS = [(field, re.compile(p, re.IGNORECASE)) for field, p in _FIELD_PATTERNS]
+
+# «9:00» или «в 9.30»; точка без «в» — это скорее дробное число («сахар 12.30»)
+_TIME_RE = re.compile(
+    r"(?:\bв\s*)?\b([01]?\d|2[0-3]):([0-5]\d)\b|\bв\s*([01]?\d|2[0-3])\.([0-5]\d)\b",
+    re.IGNORECASE,
+)
+_DATE_RES = [
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), ("y", "m", "d")),
+    (re.compile(r"\b(\d{1,2})\.(\d{1,2})\.(\d{4})\b"), ("d", "m", "y")),
+]
+_REMINDER_RE = re.compile(r"^\s*(?:напомни(?:ть)?|напоминание)\b[\s,:]*(?:мне\b)?(.*)$", re.IGNORECASE | re.DOTALL)
+
+# Слова, которые ничего не меняют в записи («съел», «сегодня» — дату бот
+# подставит сам, как и в промпте LLM).
+_FILLER = {
+    "я", "и", "а", "еще", "ещё", "съел", "съела", "поел", "поела", "покушал", "покушала",
+    "сделал", "сделала", "ввел", "ввёл", "ввела", "уколол", "уколола", "сегодня", "сейчас",
+    "запиши", "записать", "добавь", "добавить", "был", "была", "было", "перед", "едой", "на",
+}
+# Слова, при которых смысл точно не «добавить запись» — отдаём LLM.
+_VETO_RE = re.compile(
+    r"\b(?:не|нет|удали\w*|измени\w*|исправ\w*|отч[её]т\w*|статистик\w*|профил\w*|"
+    r"икх|кч|сколько|почему|как|что|вчера|позавчера|через|каждый|каждое|ежедневно)\b",
+    re.IGNORECASE,
+)
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def _num(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+def _mask(text: str, match: re.Match) -> str:
+    return text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+
+
+def _coverage(original: str, leftover: str) -> float:
+    """Share of word characters that were recognised (or are filler).
+
+    A number left unrecognised may be a value the rules misread, so such a
+    message never reaches the confidence threshold.
+    """
+    if any(ch.isdigit() for ch in leftover):
+        return 0.5
+    total = sum(len(t) for t in _TOKEN_RE.findall(original))
+    unknown = sum(len(t) for t in _TOKEN_RE.findall(leftover) if t.lower() not in _FILLER)
+    return 1.0 if total == 0 else 1.0 - unknown / total
+
+
+def _extract_time(text: str) -> tuple[str | None, str]:
+    match = _TIME_RE.search(text)
+    if not match:
+        return None, text
+    hours, minutes = match.group(1, 2) if match.group(1) else match.group(3, 4)
+    return f"{int(hours):02d}:{minutes}", _mask(text, match)
+
+
+def _extract_date(text: str) -> tuple[tuple[int, int, int] | None, str]:
+    for regex, order in _DATE_RES:
+        match = regex.search(text)
+        if match:
+            parts = dict(zip(order, map(int, match.groups())))
+            return (parts["y"], parts["m"], parts["d"]), _mask(text, match)
+    return None, text
+
+
+def _parse_reminder(text: str) -> tuple[dict | None, float]:
+    match = _REMINDER_RE.match(text)
+    body = match.group(1)
+    time_str, rest = _extract_time(body)
+    message = re.sub(r"\s+", " ", rest).strip(" ,.!:;-")
+    if not time_str or not message or _VETO_RE.search(body):
+        return None, 0.0
+    return {"action": "set_reminder", "time": time_str, "message": message}, 1.0
+
+
+def parse_local(text: str) -> tuple[dict | None, float]:
+    """Parse ``text`` without the LLM.
+
+    Returns ``(command, confidence)``; ``command`` is ``None`` when the rules
+    do not recognise the message at all.
+    """
+    if not text or not text.strip():
+        return None, 0.0
+    if _REMINDER_RE.match(text):
+        return _parse_reminder(text)
+    if _VETO_RE.search(text):
+        return None, 0.0
+
+    rest = text
+    date, rest = _extract_date(rest)
+    time_str, rest = _extract_time(rest)
+
+    fields: dict[str, float] = {}
+    for field, regex in _FIELD_PATTERNS:
+        for match in list(regex.finditer(rest)):
+            value = _num(match.group(1))
+            if field in fields and fields[field] != value:
+                return None, 0.0  # два разных значения одного поля
+            fields[field] = value
+            rest = _mask(rest, match)
+    if not fields:
+        return None, 0.0
+
+    command: dict = {"action": "add_entry", "fields": fields}
+    if date:
+        if not time_str:
+            return None, 0.0  # дата без времени — пусть решает LLM
+        y, m, d = date
+        command["entry_date"] = f"{y:04d}-{m:02d}-{d:02d}T{time_str}:00"
+    elif time_str:
+        command["time"] = time_str
+    return command, _coverage(text, rest)
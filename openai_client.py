@@ -0,0 +1,48 @@
+# openai_client.py  ← единственный клиент OpenAI на весь процесс
+"""Shared :class:`openai.AsyncOpenAI` client.
+
+All GPT call sites (Assistants runs, the command parser, reports) use this
+one client, so they share a single httpx connection pool with keep-alive and
+never block the event loop.  Proxy settings live only here; the process
+environment is no longer mutated.
+"""
+import logging
+
+import httpx
+import openai
+
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_PROXY,
+    OPENAI_TIMEOUT,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_RETRIES,
+    validate_tokens,
+)
+
+validate_tokens()
+
+http_client = openai.DefaultAsyncHttpxClient(
+    proxies=OPENAI_PROXY or None,
+    limits=httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+        keepalive_expiry=60,
+    ),
+    # connect — быстро падаем на недоступном прокси; read — Vision бывает долгим
+    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=10.0),
+)
+
+client = openai.AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    http_client=http_client,
+    max_retries=OPENAI_MAX_RETRIES,
+)
+
+if OPENAI_PROXY:
+    logging.info("[OpenAI] Using proxy for API requests")
+
+
+async def close() -> None:
+    """Close pooled connections (call on application shutdown)."""
+    await client.close()
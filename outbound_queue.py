@@ -0,0 +1,231 @@
+"""Rate-limited, prioritized queue for outgoing Telegram messages.
+
+Reminders cluster at round times (08:00, 21:00), and sending them all at once
+exceeds Telegram's ~30 messages per second and ends in 429 errors.  Every send
+goes through :class:`OutboundQueue` instead:
+
+* a token bucket caps the global rate;
+* messages to one chat are delivered strictly in order, one at a time;
+* lower ``priority`` values go first, so interactive replies overtake a
+  backlog of reminders;
+* a 429 ``retry_after`` pauses the whole queue and the message is retried;
+* a connection error that provably never reached Telegram is retried a few
+  times with backoff — the chat waits, the worker does not.  Anything else
+  (``BadRequest``, ``Forbidden``, a timeout after the request went out) fails
+  at once: the message may already be delivered, and a resend would
+  duplicate it.
+
+:meth:`OutboundQueue.stats` reports queue depth and delivery lag.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from config import OUTBOUND_MAX_ATTEMPTS, OUTBOUND_RATE, OUTBOUND_WORKERS
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REMINDER = 10
+
+# Выставлен внутри воркеров очереди: запросы бота оттуда уже прошли очередь
+in_queue_worker: contextvars.ContextVar[bool] = contextvars.ContextVar("in_queue_worker", default=False)
+
+
+class TokenBucket:
+    """Token bucket in its GCRA form: each caller reserves the next free slot.
+
+    Slots are reserved before sleeping, so oversleeping never loses capacity
+    and concurrent callers need no lock.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self._next_free = 0.0
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        slot = max(self._next_free, now - (self.burst - 1) / self.rate)
+        self._next_free = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def not_sent(exc: BaseException) -> bool:
+    """True when the request failed before it reached Telegram."""
+    try:
+        from telegram.error import NetworkError
+    except ImportError:  # pragma: no cover - без PTB повторять нечего
+        return False
+    # PTB оборачивает ошибку httpx в NetworkError/TimedOut через ``from``
+    return isinstance(exc, NetworkError) and isinstance(
+        exc.__cause__, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    )
+
+
+@dataclass(slots=True)
+class _Message:
+    chat_id: Any
+    call: Callable[[], Awaitable]
+    priority: int
+    seq: int
+    due: float
+    future: asyncio.Future
+    attempts: int = field(default=0)
+
+
+class OutboundQueue:
+    def __init__(self, rate: float = OUTBOUND_RATE, workers: int = OUTBOUND_WORKERS,
+                 max_attempts: int = OUTBOUND_MAX_ATTEMPTS,
+                 retryable: Callable[[BaseException], bool] = not_sent):
+        self.rate = rate
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retryable = retryable
+        self._bucket: TokenBucket | None = None
+        self._chats: dict[Any, deque[_Message]] = {}
+        self._busy: set = set()
+        self._ready: list[tuple[int, int, Any]] = []  # (priority, seq, chat_id)
+        self._has_ready: asyncio.Event | None = None
+        self._paused_until = 0.0
+        self._seq = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+        self._depth: Counter = Counter()  # priority -> сообщений в очереди
+        self._lags: deque[float] = deque(maxlen=10000)
+        self.counters: Counter = Counter()
+
+    def _ensure_started(self) -> None:
+        if self._tasks and not self._tasks[0].done():
+            return
+        # без запаса: сообщения идут ровно, не пачкой в начале секунды
+        self._bucket = TokenBucket(self.rate)
+        self._has_ready = asyncio.Event()
+        if self._ready:
+            self._has_ready.set()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def enqueue(self, chat_id, call: Callable[[], Awaitable], priority: int = PRIORITY_INTERACTIVE,
+                due: float | None = None) -> asyncio.Future:
+        """Queue ``call()`` for ``chat_id``; the returned future gets its result.
+
+        ``due`` is the wall-clock timestamp the message was meant to go out at
+        (defaults to now) and is used for the delivery lag metric.
+        """
+        self._ensure_started()
+        msg = _Message(chat_id, call, priority, next(self._seq), due or time.time(),
+                       asyncio.get_running_loop().create_future())
+        pending = self._chats.setdefault(chat_id, deque())
+        pending.append(msg)
+        self._depth[priority] += 1
+        if len(pending) == 1 and chat_id not in self._busy:
+            self._push_ready(msg)
+        return msg.future
+
+    async def submit(self, chat_id, call: Callable[[], Awaitable], priority: int = PRIORITY_INTERACTIVE,
+                     due: float | None = None):
+        """Queue ``call()`` and wait until it has been sent."""
+        return await self.enqueue(chat_id, call, priority, due)
+
+    def _push_ready(self, msg: _Message) -> None:
+        heapq.heappush(self._ready, (msg.priority, msg.seq, msg.chat_id))
+        self._has_ready.set()
+
+    async def _next_chat(self):
+        while not self._ready:
+            self._has_ready.clear()
+            await self._has_ready.wait()
+        return heapq.heappop(self._ready)[2]
+
+    async def _worker(self) -> None:
+        in_queue_worker.set(True)
+        while True:
+            await self._bucket.acquire()
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            chat_id = await self._next_chat()
+            msg = self._chats[chat_id].popleft()
+            self._busy.add(chat_id)
+            backoff = None
+            try:
+                backoff = await self._send(msg)
+            finally:
+                if backoff:
+                    # чат ждёт повтора, а воркер берёт следующие сообщения
+                    asyncio.get_running_loop().call_later(backoff, self._release, chat_id)
+                else:
+                    self._release(chat_id)
+
+    def _release(self, chat_id) -> None:
+        self._busy.discard(chat_id)
+        pending = self._chats.get(chat_id)
+        if pending:
+            self._push_ready(pending[0])
+        elif pending is not None:
+            del self._chats[chat_id]
+
+    async def _send(self, msg: _Message) -> float | None:
+        """Send ``msg``; returns a delay before the chat's next message, if any."""
+        msg.attempts += 1
+        try:
+            result = await msg.call()
+        except Exception as exc:
+            retry_after = getattr(exc, "retry_after", None)
+            if retry_after is not None:
+                # 429: притормаживаем всю очередь, сообщение уходит первым после паузы
+                self.counters["rate_limited"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + float(retry_after))
+                msg.attempts -= 1
+                self._chats[msg.chat_id].appendleft(msg)
+                return None
+            if msg.attempts < self.max_attempts and self.retryable(exc):
+                self.counters["retried"] += 1
+                self._chats[msg.chat_id].appendleft(msg)
+                return 0.5 * 2 ** (msg.attempts - 1)
+            self._finish(msg)
+            self.counters["failed"] += 1
+            logging.warning("Dropping message to %s after %d attempts: %s", msg.chat_id, msg.attempts, exc)
+            if not msg.future.done():
+                msg.future.set_exception(exc)
+            return None
+        self._finish(msg)
+        self.counters["sent"] += 1
+        if not msg.future.done():
+            msg.future.set_result(result)
+        return None
+
+    def _finish(self, msg: _Message) -> None:
+        self._depth[msg.priority] -= 1
+        self._lags.append(time.time() - msg.due)
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+        return {
+            "queue_depth": sum(self._depth.values()),
+            "depth_by_priority": {p: n for p, n in self._depth.items() if n},
+            "in_flight": len(self._busy),
+            "sent": self.counters["sent"],
+            "failed": self.counters["failed"],
+            "retried": self.counters["retried"],
+            "rate_limited": self.counters["rate_limited"],
+            "lag_p50": lags[len(lags) // 2] if lags else 0.0,
+            "lag_p95": lags[int(len(lags) * 0.95)] if lags else 0.0,
+            "lag_max": lags[-1] if lags else 0.0,
+        }
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+outbound = OutboundQueue()
@@ -0,0 +1,79 @@
+# photo_storage.py
+"""Optional on-disk copies of meal photos, written off the critical path.
+
+Photos go from Telegram to the Vision upload in memory; the copy in
+``PHOTOS_DIR`` is kept only for the ``entries.photo_path`` history.  The
+write runs in a background thread after the handler has moved on, and files
+older than ``PHOTOS_RETENTION_DAYS`` are pruned along the way.
+"""
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+
+from config import PHOTOS_DIR, PHOTOS_RETENTION_DAYS
+
+PRUNE_INTERVAL = 3600  # не чаще раза в час
+
+_tasks: set[asyncio.Task] = set()
+_last_prune = 0.0
+
+
+def _write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".part")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def prune(directory: Path, max_age_days: float) -> int:
+    """Delete files older than ``max_age_days``; return how many were removed."""
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for path in directory.glob("*"):
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            logging.debug("[PHOTO] Cannot prune %s", path, exc_info=True)
+    return removed
+
+
+def _save_and_prune(path: Path, data: bytes) -> None:
+    global _last_prune
+    _write(path, data)
+    if PHOTOS_RETENTION_DAYS > 0 and time.monotonic() - _last_prune > PRUNE_INTERVAL:
+        _last_prune = time.monotonic()
+        removed = prune(path.parent, PHOTOS_RETENTION_DAYS)
+        if removed:
+            logging.info("[PHOTO] Pruned %d photos older than %s days", removed, PHOTOS_RETENTION_DAYS)
+
+
+def save_later(name: str, data: bytes) -> str | None:
+    """Schedule writing ``data`` to ``PHOTOS_DIR/name``.
+
+    Returns the future path right away, or ``None`` when copies are disabled
+    (``PHOTOS_DIR`` is empty).  A failed write is logged, never raised.
+    """
+    if not PHOTOS_DIR:
+        return None
+    path = Path(PHOTOS_DIR) / name
+
+    async def save() -> None:
+        try:
+            await asyncio.to_thread(_save_and_prune, path, data)
+        except Exception:
+            logging.exception("[PHOTO] Failed to save %s", path)
+
+    task = asyncio.get_running_loop().create_task(save())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return str(path)
+
+
+async def drain() -> None:
+    """Wait for pending writes (shutdown, tests)."""
+    if _tasks:
+        await asyncio.gather(*_tasks, return_exceptions=True)
@@ -0,0 +1,83 @@
+# profile_cache.py
+"""In-process LRU+TTL cache of patient profiles keyed by ``telegram_id``.
+
+Profiles are read on every dose calculation but change rarely, so the bot
+keeps immutable :class:`functions.PatientProfile` snapshots here and drops
+them explicitly whenever a profile is written or deleted.
+
+Invalidation is local to the process: when several bot processes share the
+database (webhook mode with many workers) the cache is disabled, see
+:meth:`ProfileCache.disable`.
+"""
+import time
+from collections import OrderedDict
+
+from config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL
+from functions import PatientProfile
+
+
+class ProfileCache:
+    """Bounded LRU mapping ``telegram_id -> PatientProfile`` with expiry.
+
+    Only found profiles are cached; a miss always goes to the database so a
+    freshly created profile is visible immediately. A reader takes
+    :meth:`generation` before querying and passes it to :meth:`put`, so a
+    snapshot read before a concurrent invalidation is not stored.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._data: OrderedDict[int, tuple[float, PatientProfile]] = OrderedDict()
+
+    def get(self, user_id: int) -> PatientProfile | None:
+        item = self._data.get(user_id)
+        if item is not None:
+            expires_at, profile = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return profile
+            del self._data[user_id]
+        self.misses += 1
+        return None
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, user_id: int, profile: PatientProfile, generation: int | None = None) -> None:
+        if self.maxsize <= 0 or (generation is not None and generation != self._generation):
+            return
+        self._data[user_id] = (time.monotonic() + self.ttl, profile)
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._generation += 1
+        self._data.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def disable(self) -> None:
+        """Stop caching: another process may change a profile unnoticed."""
+        self.maxsize = 0
+        self.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+profile_cache = ProfileCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
@@ -1,14 +1,265 @@
-from datetime import datetime, timezone
+"""Reminder dispatcher.
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+All pending reminders live in one binary heap of ``(fire_at, reminder_id)``
+pairs plus a dict with the payload, instead of a scheduler job object per
+reminder.  A single task sleeps until the earliest fire time, so scheduling
+and firing cost O(log n) and memory per reminder stays small and constant.
+Due reminders are handed to the rate-limited :mod:`outbound_queue` with
+reminder priority rather than sent directly.
+
+Recurring reminders carry a rule:
+
+* ``"daily"`` — every day at the same local wall-clock time;
+* ``"weekdays"`` — Monday to Friday at the same local time;
+* ``"hours:N"`` — every ``N`` hours.
+
+Local time is taken in the user's timezone (``users.timezone``), so a daily
+08:00 reminder stays at 08:00 across DST changes.
+
+A single instance loads all pending reminders at startup
+(:func:`rehydrate_reminders`).  With several replicas each one runs a
+:class:`ReminderLeaser` that leases due reminders from the table instead.
+"""
+import asyncio
+import heapq
+import logging
+import re
+import time
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import partial
 
 import config
+from db_access import (
+    claim_due_reminders_async,
+    get_pending_reminders_async,
+    mark_reminder_delivered_async,
+    renew_reminder_leases_async,
+    reschedule_reminder_async,
+    zone_or_default,
+)
+from outbound_queue import PRIORITY_REMINDER, OutboundQueue, outbound as default_outbound
+
+RULE_DAILY = "daily"
+RULE_WEEKDAYS = "weekdays"
+_HOURS_RE = re.compile(r"^hours:(\d+)$")
+
+
+def parse_rule(rule: str | None) -> str | None:
+    """Validate a recurrence rule, return it normalized or ``None`` for one-shot."""
+    if not rule:
+        return None
+    rule = rule.strip().lower()
+    if rule in (RULE_DAILY, RULE_WEEKDAYS):
+        return rule
+    match = _HOURS_RE.match(rule)
+    if match and 0 < int(match.group(1)) <= 24 * 7:
+        return rule
+    raise ValueError(f"Unknown reminder rule: {rule!r}")
+
+
+def next_occurrence(rule: str, prev: datetime, tz: tzinfo, now: datetime | None = None) -> datetime:
+    """Next fire time of a recurring reminder after ``prev`` (and after ``now``).
+
+    Reminders missed while the bot was down are skipped, not fired in a burst.
+    """
+    now = now or datetime.now(timezone.utc)
+    match = _HOURS_RE.match(rule)
+    if match:
+        step = timedelta(hours=int(match.group(1)))
+        nxt = prev + step
+        if nxt <= now:
+            nxt += step * ((now - nxt) // step + 1)
+        return nxt
+
+    local = prev.astimezone(tz)
+    wall = local.time().replace(tzinfo=None)
+    day = local.date()
+    while True:
+        day += timedelta(days=1)
+        if rule == RULE_WEEKDAYS and day.weekday() >= 5:
+            continue
+        nxt = datetime.combine(day, wall, tzinfo=tz).astimezone(timezone.utc)
+        if nxt > now:
+            return nxt
+
+
+class ReminderDispatcher:
+    """Fires reminders from a heap-ordered next-fire index."""
+
+    def __init__(self, outbound: OutboundQueue = default_outbound):
+        self.bot = None
+        self.outbound = outbound
+        # при аренде (несколько экземпляров бота) строки из БД приходят только
+        # через ReminderLeaser, а следующий повтор отдаётся обратно в общий пул
+        self.leased = False
+        self._heap: list[tuple[float, int]] = []
+        # reminder_id -> (fire_at, chat_id, text, rule, tz)
+        self._entries: dict[int, tuple] = {}
+        self._next_local_id = -1  # для напоминаний без строки в БД
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._inflight: set[asyncio.Task] = set()
+        # reminder_id -> неудачных попыток подряд (для повторов)
+        self._failures: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def schedule(self, reminder_id: int | None, chat_id: int, run_time: datetime, text: str,
+                 rule: str | None = None, tz: tzinfo | None = None) -> int:
+        """Add or replace a reminder; returns its id."""
+        if reminder_id is None:
+            reminder_id = self._next_local_id
+            self._next_local_id -= 1
+        fire_at = run_time.timestamp()
+        self._entries[reminder_id] = (fire_at, chat_id, text, rule, tz)
+        heapq.heappush(self._heap, (fire_at, reminder_id))
+        if self._heap[0][1] == reminder_id and self._wakeup is not None:
+            self._wakeup.set()
+        return reminder_id
+
+    def load(self, items) -> int:
+        """Bulk-add ``(reminder_id, chat_id, run_time, text, rule, tz)`` in O(n)."""
+        count = 0
+        for reminder_id, chat_id, run_time, text, rule, tz in items:
+            fire_at = run_time.timestamp()
+            self._entries[reminder_id] = (fire_at, chat_id, text, rule, tz)
+            self._heap.append((fire_at, reminder_id))
+            count += 1
+        heapq.heapify(self._heap)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return count
+
+    def cancel(self, reminder_id: int) -> None:
+        # запись в куче остаётся и будет пропущена при извлечении
+        self._entries.pop(reminder_id, None)
+
+    def pop_due(self, now: float) -> list[tuple]:
+        """Remove and return ``(reminder_id, chat_id, text, rule, tz, fire_at)`` due by ``now``."""
+        due = []
+        heap, entries = self._heap, self._entries
+        while heap and heap[0][0] <= now:
+            fire_at, reminder_id = heapq.heappop(heap)
+            entry = entries.get(reminder_id)
+            if entry is None or entry[0] != fire_at:
+                continue  # отменено или перенесено
+            del entries[reminder_id]
+            due.append((reminder_id, *entry[1:], fire_at))
+        return due
+
+    async def _run(self) -> None:
+        while True:
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            for item in self.pop_due(time.time()):
+                self._fire(*item)
+
+    def _fire(self, reminder_id, chat_id, text, rule, tz, fire_at) -> None:
+        next_time = None
+        if rule:
+            prev = datetime.fromtimestamp(fire_at, timezone.utc)
+            next_time = next_occurrence(rule, prev, tz or config.TIMEZONE)
+            if not (self.leased and reminder_id > 0):
+                self.schedule(reminder_id, chat_id, next_time, text, rule, tz)
+        future = self.outbound.enqueue(
+            chat_id,
+            partial(self.bot.send_message, chat_id=chat_id, text=text),
+            priority=PRIORITY_REMINDER,
+            due=fire_at,
+        )
+        future.add_done_callback(partial(self._sent, reminder_id, next_time, chat_id, text, tz))
+
+    def _sent(self, reminder_id: int, next_time: datetime | None, chat_id, text, tz,
+              future: asyncio.Future) -> None:
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self._retry(reminder_id, next_time, chat_id, text, tz, future.exception())
+            return
+        self._failures.pop(reminder_id, None)
+        if reminder_id > 0:
+            self._spawn(self._persist(reminder_id, next_time))
+
+    def _retry(self, reminder_id: int, next_time: datetime | None, chat_id, text, tz, exc) -> None:
+        """Try a failed reminder again in ``REMINDER_RETRY_DELAY`` seconds.
 
+        A one-shot stays undelivered and moves to the retry time (releasing
+        its lease, so any instance may pick it up).  A recurring one keeps its
+        next occurrence and is retried as a separate in-memory one-shot, so
+        the rule's wall-clock time does not drift.
+        """
+        attempt = self._failures.pop(reminder_id, 0) + 1
+        if attempt > config.REMINDER_RETRY_ATTEMPTS:
+            logging.error("Giving up on reminder %s after %d attempts: %s", reminder_id, attempt, exc)
+            if reminder_id > 0:
+                self._spawn(self._persist(reminder_id, next_time))
+            return
+        logging.warning("Failed to send reminder %s (attempt %d), retrying: %s", reminder_id, attempt, exc)
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=config.REMINDER_RETRY_DELAY)
+        if next_time is not None:
+            retry_id = self.schedule(None, chat_id, retry_at, text, None, tz)
+            if reminder_id > 0:
+                self._spawn(self._persist(reminder_id, next_time))
+        else:
+            retry_id = reminder_id
+            if not (self.leased and reminder_id > 0):
+                self.schedule(reminder_id, chat_id, retry_at, text, None, tz)
+            if reminder_id > 0:
+                self._spawn(self._persist(reminder_id, retry_at))
+        self._failures[retry_id] = attempt
 
-scheduler = AsyncIOScheduler()
+    def _spawn(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
 
+    async def _persist(self, reminder_id: int, next_time: datetime | None) -> None:
+        """Mark delivered, or move the row to ``next_time`` and release its lease."""
+        try:
+            if next_time is not None:
+                await reschedule_reminder_async(reminder_id, next_time)
+            else:
+                await mark_reminder_delivered_async(reminder_id)
+        except Exception:
+            # в худшем случае после рестарта разовое не поднимется, потому
+            # что время в прошлом
+            logging.exception("Reminder %s not updated in DB", reminder_id)
 
-def schedule_reminder(bot, chat_id: int, run_time: datetime, text: str) -> None:
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+dispatcher = ReminderDispatcher()
+
+
+def _aware(run_time: datetime) -> datetime:
+    if run_time.tzinfo is None:
+        tz = getattr(config, "TIMEZONE", timezone.utc)
+        run_time = run_time.replace(tzinfo=tz)
+    return run_time
+
+
+def schedule_reminder(bot, chat_id: int, run_time: datetime, text: str,
+                      reminder_id: int | None = None, rule: str | None = None,
+                      tz: tzinfo | None = None) -> None:
     """Schedule a reminder message.
 
     Parameters
@@ -24,17 +275,104 @@ def schedule_reminder(bot, chat_id: int, run_time: datetime, text: str) -> None:
         UTC otherwise.
     text:
         Message text to send.
+    reminder_id:
+        Row id in the ``reminders`` table.  When given, the row is marked
+        delivered (or moved to the next occurrence) after sending, and
+        scheduling the same id twice replaces the pending reminder.
+    rule:
+        Recurrence rule (see :func:`parse_rule`), ``None`` for a one-shot.
+    tz:
+        User's timezone for ``daily``/``weekdays`` rules.
     """
+    rule = parse_rule(rule)
+    if dispatcher.leased and reminder_id is not None:
+        return  # строку заберёт ReminderLeaser одного из экземпляров
+    dispatcher.bot = bot
+    dispatcher._ensure_running()
+    dispatcher.schedule(reminder_id, chat_id, _aware(run_time), text, rule, tz)
 
-    if run_time.tzinfo is None:
-        tz = getattr(config, "TIMEZONE", timezone.utc)
-        run_time = run_time.replace(tzinfo=tz)
 
-    if not scheduler.running:
-        scheduler.start()
-    scheduler.add_job(
-        bot.send_message,
-        "date",
-        run_date=run_time,
-        kwargs={"chat_id": chat_id, "text": text},
-    )
+def _to_items(rows, now: datetime):
+    """DB rows -> dispatcher items; missed recurring reminders move forward."""
+    zones: dict[str | None, tzinfo] = {}
+    for reminder_id, chat_id, run_time, text, rule, tz_name in rows:
+        if tz_name not in zones:
+            zones[tz_name] = zone_or_default(tz_name)
+        tz = zones[tz_name]
+        run_time = _aware(run_time)
+        if rule and run_time <= now:
+            run_time = next_occurrence(rule, run_time, tz, now)
+        yield reminder_id, chat_id, run_time, text, rule, tz
+
+
+async def rehydrate_reminders(bot) -> int:
+    """Schedule every pending reminder stored in the database.
+
+    The ``reminders`` table is the source of truth: at startup all undelivered
+    reminders are loaded in one query and put into the dispatcher in bulk.
+    Recurring reminders missed while the bot was down move to their next
+    occurrence.  Returns the number of scheduled reminders.
+    """
+    rows = await get_pending_reminders_async(datetime.now(timezone.utc))
+    dispatcher.bot = bot
+    dispatcher._ensure_running()
+    count = dispatcher.load(_to_items(rows, datetime.now(timezone.utc)))
+    logging.info("Rehydrated %d pending reminders", count)
+    return count
+
+
+class ReminderLeaser:
+    """Claims due reminders from the shared table for one bot instance.
+
+    Every ``poll`` seconds the instance renews the leases it holds and claims
+    reminders due within ``horizon`` (``FOR UPDATE SKIP LOCKED``), so several
+    replicas split the load without double delivery.  If an instance dies, its
+    reminders become claimable again when their ``lease`` expires.
+    """
+
+    def __init__(self, dispatcher: ReminderDispatcher, worker_id: str = config.REMINDER_WORKER_ID,
+                 lease: float = config.REMINDER_LEASE, poll: float = config.REMINDER_POLL_INTERVAL,
+                 horizon: float = config.REMINDER_HORIZON, batch: int = config.REMINDER_CLAIM_BATCH):
+        self.dispatcher = dispatcher
+        self.worker_id = worker_id
+        self.lease = timedelta(seconds=lease)
+        self.poll = poll
+        self.horizon = timedelta(seconds=horizon)
+        self.batch = batch
+        self._task: asyncio.Task | None = None
+
+    async def claim(self) -> int:
+        """Renew held leases and claim everything currently due; returns the claimed count."""
+        await renew_reminder_leases_async(self.worker_id, self.lease)
+        claimed = 0
+        while True:
+            now = datetime.now(timezone.utc)
+            rows = await claim_due_reminders_async(
+                self.worker_id, now + self.horizon, now - self.lease, self.lease, self.batch
+            )
+            claimed += self.dispatcher.load(_to_items(rows, now))
+            if len(rows) < self.batch:
+                return claimed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.claim()
+            except Exception:
+                logging.exception("Failed to claim reminders")
+            await asyncio.sleep(self.poll)
+
+    def start(self, bot) -> None:
+        self.dispatcher.bot = bot
+        self.dispatcher.leased = True
+        self.dispatcher._ensure_running()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,119 @@
+"""Process pool for report rendering.
+
+matplotlib and reportlab are CPU-bound and pyplot keeps global state, so
+charts and PDFs are rendered in separate worker processes instead of the
+event loop.  Workers are started with the ``spawn`` method (no forked copy of
+the bot's threads and sockets) and pre-warmed by
+:func:`report_render.warm_up`.  At most ``max_concurrency`` jobs are handed to
+the pool at once; the rest wait in :meth:`RenderPool.run`, and their number
+is reported as ``queue_depth``.
+
+Renderers are passed to the workers by name, so the bot process itself never
+imports :mod:`report_render` (and with it reportlab and matplotlib).
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import RENDER_MAX_CONCURRENCY, RENDER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+def _render(name: str, *args):
+    """Worker side: call ``report_render.<name>(*args)``."""
+    import report_render
+
+    return getattr(report_render, name)(*args)
+
+
+def _warm_up() -> None:
+    import report_render
+
+    report_render.warm_up()
+
+
+class RenderPool:
+    def __init__(self, workers: int, max_concurrency: int):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self._executor: ProcessPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._max_queue_depth = 0
+        self._wait_total = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_up,
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        """Spawn and warm up all workers ahead of the first report."""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        # пустые задачи заставляют пул поднять все процессы сразу
+        await asyncio.gather(*(loop.run_in_executor(executor, time.sleep, 0)
+                               for _ in range(self.workers)))
+        logger.info("Render pool started with %d workers", self.workers)
+
+    async def run(self, func, *args):
+        """Run ``func(*args)`` in a worker process and return its result."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._waiting += 1
+        if self._semaphore.locked():
+            self._max_queue_depth = max(self._max_queue_depth, self._waiting)
+        queued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._wait_total += time.perf_counter() - queued_at
+        self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool:
+            # упавший воркер ломает весь пул — следующий вызов создаст новый
+            logger.exception("Render pool is broken, restarting")
+            self._executor = None
+            raise
+        finally:
+            self._running -= 1
+            self._completed += 1
+            self._semaphore.release()
+
+    async def chart(self, times, sugars, period_label: str) -> bytes:
+        return await self.run(_render, "render_chart", times, sugars, period_label)
+
+    async def pdf(self, summary_lines, errors, day_lines, gpt_text, times, sugars, period_label: str) -> bytes:
+        return await self.run(
+            _render, "render_pdf", summary_lines, errors, day_lines, gpt_text, times, sugars, period_label
+        )
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._waiting,
+            "max_queue_depth": self._max_queue_depth,
+            "running": self._running,
+            "completed": self._completed,
+            "avg_wait": self._wait_total / self._completed if self._completed else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+render_pool = RenderPool(RENDER_WORKERS, RENDER_MAX_CONCURRENCY)
@@ -1,163 +1,142 @@
 import asyncio
 import io
 import logging
-import os
-import re
-import matplotlib.pyplot as plt
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase.pdfmetrics import stringWidth
-
-DEFAULT_FONT = "Helvetica"
-DEFAULT_FONT_BOLD = "Helvetica-Bold"
-
-# Fallback font with Cyrillic support
-FALLBACK_FONT_PATH = "/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf"
-FALLBACK_FONT_BOLD_PATH = "/usr/share/fonts/truetype/noto/NotoSans-Bold.ttf"
-
-
-def _register_fonts() -> tuple[str, str]:
-    """Register DejaVu fonts if available, else return defaults.
-
-    The font paths can be overridden via ``FONT_PATH`` and ``FONT_BOLD_PATH``
-    environment variables. If the files are not found, built-in Helvetica
-    fonts are used as a fallback.
-    """
-    regular_path = os.getenv(
-        "FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
-    )
-    bold_path = os.getenv(
-        "FONT_BOLD_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
-    )
-
-    if os.path.exists(regular_path) and os.path.exists(bold_path):
-        pdfmetrics.registerFont(TTFont("DejaVuSans", regular_path))
-        pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", bold_path))
-        return "DejaVuSans", "DejaVuSans-Bold"
-
-    fallback_regular = os.getenv("FALLBACK_FONT_PATH", FALLBACK_FONT_PATH)
-    fallback_bold = os.getenv("FALLBACK_FONT_BOLD_PATH", FALLBACK_FONT_BOLD_PATH)
-    if os.path.exists(fallback_regular) and os.path.exists(fallback_bold):
-        pdfmetrics.registerFont(TTFont("NotoSans", fallback_regular))
-        pdfmetrics.registerFont(TTFont("NotoSans-Bold", fallback_bold))
-        logging.warning(
-            "DejaVu fonts not found; using fallback fonts %s and %s",
-            "NotoSans",
-            "NotoSans-Bold",
+import math
+import time
+
+from db_access import (
+    get_daily_stats_async,
+    get_data_version_async,
+    get_report_series_async,
+    get_user_timezone_async,
+    local_date,
+    local_day_bounds,
+)
+from openai_client import client
+from render_pool import render_pool
+from report_cache import ReportArtifacts, ReportCache, report_cache
+from report_prompt import build_prompt
+
+GPT_FALLBACK = "Не удалось получить рекомендации."
+FOOTER = "ℹ️ Для подробного разбора покажите этот отчёт врачу."
+
+
+class _StageTimer:
+    """Collects per-stage durations of one report for the latency log."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def mark(self, stage: str) -> None:
+        """Record the time since the report started."""
+        self.stages[stage] = time.perf_counter() - self.start
+
+    async def measure(self, stage: str, aw):
+        """Await ``aw`` and record how long it took on its own."""
+        started = time.perf_counter()
+        try:
+            return await aw
+        finally:
+            self.stages[stage] = time.perf_counter() - started
+
+    def log(self, user_id: int) -> None:
+        self.mark("total")
+        logging.info(
+            "Report for %s: %s",
+            user_id,
+            ", ".join(f"{name}={sec * 1000:.0f}ms" for name, sec in self.stages.items()),
         )
-        return "NotoSans", "NotoSans-Bold"
-
-    logging.warning(
-        "DejaVu and Noto fonts not found; using default fonts %s and %s",
-        DEFAULT_FONT,
-        DEFAULT_FONT_BOLD,
-    )
-    return DEFAULT_FONT, DEFAULT_FONT_BOLD
 
 
-FONT_REGULAR, FONT_BOLD = _register_fonts()
-
-from db_access import get_entries_since
-from gpt_client import client
+async def _gpt_analysis(prompt: str) -> str:
+    try:
+        gpt_response = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "Ты — медицинский ассистент для диабетиков."},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.2,
+            max_tokens=600,
+        )
+        return gpt_response.choices[0].message.content.strip()
+    except Exception as e:
+        logging.error(f"Report generation failed: {e}")
+        return GPT_FALLBACK
+
+
+def _period_stats(days, metric: str) -> tuple[float, float | None] | None:
+    """Mean and standard deviation of ``metric`` over ``daily_stats`` rows."""
+    count = sum(getattr(day, f"{metric}_count") for day in days)
+    if not count:
+        return None
+    mean = sum(getattr(day, f"{metric}_sum") for day in days) / count
+    if count < 2:
+        return mean, None
+    sumsq = sum(getattr(day, f"{metric}_sumsq") for day in days)
+    return mean, math.sqrt(max(sumsq / count - mean * mean, 0.0))
+
+
+def _average(days, metric: str):
+    stats = _period_stats(days, metric)
+    return round(stats[0], 1) if stats else "-"
+
+
+def _day_line(day) -> str:
+    # суммы округляются: в итогах дня копится погрешность float
+    min_sugar = day.sugar_min if day.sugar_count else "-"
+    max_sugar = day.sugar_max if day.sugar_count else "-"
+    sum_dose = round(day.dose_sum, 1) if day.dose_count else "-"
+    sum_carbs = round(day.carbs_sum, 1) if day.carbs_count else "-"
+    return (
+        f"{day.local_date.strftime('%d.%m')}: сахар {min_sugar}–{max_sugar}, "
+        f"доза {sum_dose}, углеводы {sum_carbs}"
+    )
 
 
-def clean_markdown(text: str) -> str:
-    """Remove basic Markdown formatting"""
-    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-    text = re.sub(r'#+\s*', '', text)
-    text = re.sub(r'^\s*\d+\.\s*', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^\s*\*\s*', '', text, flags=re.MULTILINE)
-    text = re.sub(r'`([^`]+)`', r'\1', text)
-    return text
+def _report_message(header: str, gpt_text: str) -> str:
+    return header + f"<b>Анализ и рекомендации:</b>\n{gpt_text}\n\n" + FOOTER
 
 
-def split_text_by_width(text: str, font_name: str, font_size: int, max_width_mm: int):
-    """Split a line so it does not exceed max_width_mm."""
-    words = text.split()
-    lines = []
-    current = ""
-    for word in words:
-        test = (current + " " + word).strip()
-        width = stringWidth(test, font_name, font_size) / mm
-        if width > max_width_mm and current:
-            lines.append(current)
-            current = word
-        else:
-            current = test
-    if current:
-        lines.append(current)
-    return lines
-
-
-def generate_pdf_report(summary_lines, errors, day_lines, gpt_text, buf_graph):
-    pdf_buf = io.BytesIO()
-    c = canvas.Canvas(pdf_buf, pagesize=A4)
-    width, height = A4
-    y = height - 20 * mm
-    c.setFont(FONT_BOLD, 16)
-    c.drawString(20 * mm, y, "Отчёт по диабетическому дневнику")
-    y -= 12 * mm
-    c.setFont(FONT_REGULAR, 11)
-    for line in summary_lines:
-        c.drawString(20 * mm, y, line)
-        y -= 7 * mm
-    if errors:
-        y -= 5 * mm
-        c.setFont(FONT_BOLD, 11)
-        c.drawString(20 * mm, y, "Ошибки и критические значения:")
-        y -= 7 * mm
-        c.setFont(FONT_REGULAR, 11)
-        for line in errors:
-            c.drawString(22 * mm, y, line)
-            y -= 6 * mm
-    y -= 5 * mm
-    c.setFont(FONT_BOLD, 11)
-    c.drawString(20 * mm, y, "Динамика по дням:")
-    y -= 7 * mm
-    c.setFont(FONT_REGULAR, 11)
-    text_obj = c.beginText(22 * mm, y)
-    text_obj.setFont(FONT_REGULAR, 11)
-    for line in clean_markdown(gpt_text).splitlines():
-        for sub in split_text_by_width(line, FONT_REGULAR, 11, max_width_mm=170):
-            if text_obj.getY() < 30 * mm:
-                c.drawText(text_obj)
-                c.showPage()
-                y = height - 20 * mm
-                text_obj = c.beginText(22 * mm, y)
-                text_obj.setFont(FONT_REGULAR, 11)
-            text_obj.textLine(sub)
-    c.drawText(text_obj)
-    y = text_obj.getY()
-    if y < 30 * mm:
-        c.showPage()
-        y = height - 20 * mm
-    if buf_graph:
-        y -= 10 * mm
-        try:
-            c.drawImage(
-                ImageReader(buf_graph),
-                20 * mm,
-                y - 60 * mm,
-                width=170 * mm,
-                height=50 * mm,
-                preserveAspectRatio=True,
-            )
-            y -= 60 * mm
-        except Exception:
-            logging.exception("Failed to render graph in PDF report")
-    c.save()
-    pdf_buf.seek(0)
-    return pdf_buf
+async def _send_cached(update, query, artifacts: ReportArtifacts) -> None:
+    target = query.message if query else update.message
+    report_msg = _report_message(artifacts.header, artifacts.gpt_text)
+    if query:
+        await query.edit_message_text(report_msg, parse_mode="HTML")
+    else:
+        await update.message.reply_text(report_msg, parse_mode="HTML")
+    await target.reply_photo(io.BytesIO(artifacts.chart_png), caption="График сахара за период")
+    await target.reply_document(
+        io.BytesIO(artifacts.pdf_bytes), filename='diabetes_report.pdf', caption='PDF-отчёт для врача'
+    )
 
 
 async def send_report(update, context, date_from, period_label, query=None):
     user_id = update.effective_user.id
-    entries = get_entries_since(user_id, date_from)
-    if not entries:
+    timer = _StageTimer()
+    # отчёт охватывает целые дни в часовом поясе пользователя: сводка
+    # собирается из daily_stats, числовые столбцы записей нужны для ошибок,
+    # графика и GPT
+    tz, data_version = await asyncio.gather(
+        get_user_timezone_async(user_id), get_data_version_async(user_id)
+    )
+    day_from = local_date(date_from, tz)
+    # пока записи не менялись, тот же отчёт отдаётся с диска, без GPT
+    cache_key = ReportCache.key(user_id, day_from, period_label, data_version)
+    cached = await timer.measure("cache", report_cache.get(cache_key))
+    if cached is not None:
+        await _send_cached(update, query, cached)
+        timer.mark("cached_sent")
+        timer.log(user_id)
+        return
+
+    start, _ = local_day_bounds(day_from, tz)
+    days, entries = await timer.measure("fetch", asyncio.gather(
+        get_daily_stats_async(user_id, day_from),
+        get_report_series_async(user_id, start),
+    ))
+    if not days:
         text = f"Нет записей за {period_label}."
         if query:
             await query.edit_message_text(text)
@@ -165,17 +144,14 @@ async def send_report(update, context, date_from, period_label, query=None):
             await update.message.reply_text(text)
         return
 
-    sugars = [e.sugar_before for e in entries if e.sugar_before is not None]
-    doses = [e.dose for e in entries if e.dose is not None]
-    carbs = [e.carbs_g for e in entries if e.carbs_g is not None]
-    avg_sugar = round(sum(sugars) / len(sugars), 1) if sugars else "-"
-    avg_dose = round(sum(doses) / len(doses), 1) if doses else "-"
-    avg_carbs = round(sum(carbs) / len(carbs), 1) if carbs else "-"
+    sugar = _period_stats(days, "sugar")
+    avg_sugar = round(sugar[0], 1) if sugar else "-"
+    spread = f" (разброс ±{sugar[1]:.1f})" if sugar and sugar[1] is not None else ""
     summary_lines = [
-        f"• Всего записей: {len(entries)}",
-        f"• Средний сахар: {avg_sugar} ммоль/л",
-        f"• Средняя доза: {avg_dose} Ед",
-        f"• Средние углеводы: {avg_carbs} г",
+        f"• Всего записей: {sum(day.entries for day in days)}",
+        f"• Средний сахар: {avg_sugar} ммоль/л{spread}",
+        f"• Средняя доза: {_average(days, 'dose')} Ед",
+        f"• Средние углеводы: {_average(days, 'carbs')} г",
     ]
     errors = []
     for e in entries:
@@ -190,100 +166,63 @@ async def send_report(update, context, date_from, period_label, query=None):
                 f"⚠️ {e.event_time.strftime('%d.%m %H:%M')}: сахар {e.sugar_before} ммоль/л — критически высокий!"
             )
 
-    from collections import defaultdict
+    day_lines = [_day_line(day) for day in days]
 
-    day_stats = defaultdict(list)
-    for e in entries:
-        day = e.event_time.strftime('%d.%m')
-        day_stats[day].append(e)
-    day_lines = []
-    for day, day_entries in sorted(day_stats.items()):
-        sugars_day = [e.sugar_before for e in day_entries if e.sugar_before is not None]
-        doses_day = [e.dose for e in day_entries if e.dose is not None]
-        carbs_day = [e.carbs_g for e in day_entries if e.carbs_g is not None]
-        min_sugar = min(sugars_day) if sugars_day else "-"
-        max_sugar = max(sugars_day) if sugars_day else "-"
-        sum_dose = sum(doses_day) if doses_day else "-"
-        sum_carbs = sum(carbs_day) if carbs_day else "-"
-        day_lines.append(
-            f"{day}: сахар {min_sugar}–{max_sugar}, доза {sum_dose}, углеводы {sum_carbs}"
-        )
+    timer.mark("aggregate")
+
+    mean, sd = sugar if sugar else (None, None)
+    # в потоке: первый подсчёт токенов может загружать словарь tiktoken
+    gpt_prompt = await asyncio.to_thread(build_prompt, period_label, summary_lines, days, entries, tz, mean, sd)
+    timer.mark("prompt")
 
-    fig, ax = plt.subplots(figsize=(7, 3))
     times = [e.event_time for e in entries if e.sugar_before is not None]
     sugars_plot = [e.sugar_before for e in entries if e.sugar_before is not None]
-    ax.plot(times, sugars_plot, marker="o", label="Сахар (ммоль/л)")
-    ax.set_title(f"Динамика сахара за {period_label}")
-    ax.set_xlabel("Дата")
-    ax.set_ylabel("Сахар, ммоль/л")
-    ax.grid(True)
-    ax.legend()
-    fig.tight_layout()
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png")
-    buf.seek(0)
-    plt.close(fig)
-
-    summary = []
-    for e in entries:
-        when = e.event_time.strftime('%Y-%m-%d %H:%M')
-        summary.append(
-            f"{when}: сахар={e.sugar_before or '-'} ммоль/л, углеводы={e.carbs_g or '-'} г, ХЕ={e.xe or '-'}, доза={e.dose or '-'}"
-        )
-    summary_text = "\n".join(summary)
-    gpt_prompt = (
-        f"Вот сводка по дневнику диабетика за {period_label}:\n"
-        + "\n".join(summary_lines)
-        + "\n"
-        + ("\nОшибки и критические значения:\n" + "\n".join(errors) if errors else "")
-        + "\nДинамика по дням:\n"
-        + "\n".join(day_lines)
-        + "\n"
-        + "\nПодробные записи:\n"
-        + summary_text
-        + "\n\n"
-        + "Сделай анализ, дай советы по контролю сахара и питанию, укажи возможные проблемы."
+    chart_task = asyncio.create_task(
+        timer.measure("chart", render_pool.chart(times, sugars_plot, period_label))
     )
+    gpt_task = asyncio.create_task(timer.measure("gpt", _gpt_analysis(gpt_prompt)))
 
-    try:
-        gpt_response = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Ты — медицинский ассистент для диабетиков."},
-                {"role": "user", "content": gpt_prompt},
-            ],
-            temperature=0.2,
-            max_tokens=600,
-        )
-        gpt_text = gpt_response.choices[0].message.content.strip()
-    except Exception as e:
-        logging.error(f"Report generation failed: {e}")
-        gpt_text = "Не удалось получить рекомендации."
-
-    report_msg = (
+    header = (
         f"<b>📈 Отчёт за {period_label}</b>\n\n"
         + "\n".join(summary_lines)
         + "\n\n"
         + ("<b>Ошибки и критические значения:</b>\n" + "\n".join(errors) + "\n\n" if errors else "")
         + "<b>Динамика по дням:</b>\n" + "\n".join(day_lines) + "\n\n"
-        + f"<b>Анализ и рекомендации:</b>\n{gpt_text}\n\n"
-        + "ℹ️ Для подробного разбора покажите этот отчёт врачу."
     )
+    target = query.message if query else update.message
+    try:
+        # сводка и график уходят, пока GPT ещё думает; анализ дописывается
+        # в то же сообщение, PDF со своим векторным графиком — следом
+        pending_msg = header + "<b>Анализ и рекомендации:</b>\n⏳ Готовлю…"
+        if query:
+            await query.edit_message_text(pending_msg, parse_mode="HTML")
+        else:
+            sent = await update.message.reply_text(pending_msg, parse_mode="HTML")
+        timer.mark("summary_sent")
 
-    if query:
-        await query.edit_message_text(report_msg, parse_mode="HTML")
-        await query.message.reply_photo(buf, caption="График сахара за период")
-        buf.seek(0)
-        pdf_buf = generate_pdf_report(summary_lines, errors, day_lines, gpt_text, buf)
-        await query.message.reply_document(
-            pdf_buf, filename='diabetes_report.pdf', caption='PDF-отчёт для врача'
+        chart_png = await chart_task
+        await target.reply_photo(io.BytesIO(chart_png), caption="График сахара за период")
+        timer.mark("chart_sent")
+
+        gpt_text = await gpt_task
+        report_msg = _report_message(header, gpt_text)
+        if query:
+            await query.edit_message_text(report_msg, parse_mode="HTML")
+        else:
+            await sent.edit_text(report_msg, parse_mode="HTML")
+        timer.mark("analysis_sent")
+
+        pdf_bytes = await timer.measure(
+            "pdf", render_pool.pdf(summary_lines, errors, day_lines, gpt_text, times, sugars_plot, period_label)
         )
-    else:
-        await update.message.reply_text(report_msg, parse_mode="HTML")
-        await update.message.reply_photo(buf, caption="График сахара за период")
-        buf.seek(0)
-        pdf_buf = generate_pdf_report(summary_lines, errors, day_lines, gpt_text, buf)
-        await update.message.reply_document(
-            pdf_buf, filename='diabetes_report.pdf', caption='PDF-отчёт для врача'
+        await target.reply_document(
+            io.BytesIO(pdf_bytes), filename='diabetes_report.pdf', caption='PDF-отчёт для врача'
         )
+        timer.mark("pdf_sent")
+
+        if gpt_text != GPT_FALLBACK:  # неудачный анализ не запоминаем
+            await report_cache.put(cache_key, ReportArtifacts(header, chart_png, gpt_text, pdf_bytes))
+    finally:
+        for task in (chart_task, gpt_task):
+            task.cancel()
+        timer.log(user_id)
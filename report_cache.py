@@ -0,0 +1,195 @@
+# report_cache.py
+"""On-disk LRU cache of finished reports.
+
+Pressing "📈 Отчёт → Неделя" twice, or asking for the same PDF for a doctor,
+used to redo everything: statistics, the chart, the GPT analysis and the
+PDF.  :func:`report.send_report` now stores these artifacts under the user,
+the first day and label of the period, and the user's data version
+(``users.created_at`` plus ``users.data_version``, which grows with every
+entry insert, edit or delete).  While it stays the same, a repeated report
+is sent from here without touching GPT.  A user re-created after /reset gets
+a new ``created_at``, so a version is never reused: a report of the deleted
+data cannot match, even one stored late or on another worker's disk.
+
+A file is one JSON line with the text fields and the sizes of the chart and
+the PDF, followed by their raw bytes; nothing is unpickled.
+
+Files live in ``REPORT_CACHE_DIR``; their total size is kept under
+``REPORT_CACHE_MAX_MB`` by evicting the least recently used ones (recency
+is the file's mtime, so the bound survives restarts).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+
+from config import REPORT_CACHE_DIR, REPORT_CACHE_MAX_MB
+
+SUFFIX = ".report"
+
+
+@dataclass(frozen=True)
+class ReportArtifacts:
+    header: str      # сводка, ошибки и динамика по дням (HTML)
+    chart_png: bytes
+    gpt_text: str
+    pdf_bytes: bytes
+
+    def dumps(self) -> bytes:
+        meta = {"header": self.header, "gpt_text": self.gpt_text,
+                "chart_png": len(self.chart_png), "pdf_bytes": len(self.pdf_bytes)}
+        # json.dumps экранирует переводы строк — первая строка файла целиком JSON
+        return json.dumps(meta, ensure_ascii=False).encode() + b"\n" + self.chart_png + self.pdf_bytes
+
+    @classmethod
+    def loads(cls, data: bytes) -> "ReportArtifacts":
+        line, _, blob = data.partition(b"\n")
+        meta = json.loads(line)
+        chart_size, pdf_size = meta["chart_png"], meta["pdf_bytes"]
+        if len(blob) != chart_size + pdf_size:
+            raise ValueError("truncated report file")
+        return cls(meta["header"], blob[:chart_size], meta["gpt_text"], blob[chart_size:])
+
+
+class ReportCache:
+    """Size-bounded LRU of :class:`ReportArtifacts` files in ``directory``.
+
+    The blocking file work runs in a thread; the in-memory index
+    (name → size, least recently used first) is read from disk on first use.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = Path(directory) if directory else None
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index: OrderedDict[str, int] | None = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None and self.max_bytes > 0
+
+    @staticmethod
+    def key(user_id: int, day_from: date, period_label: str, data_version: str) -> str:
+        digest = hashlib.sha256(f"{day_from.isoformat()}|{period_label}|{data_version}".encode()).hexdigest()
+        return f"{user_id}_{digest[:32]}"
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{SUFFIX}"
+
+    def _load_index(self) -> OrderedDict[str, int]:
+        if self._index is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = []
+            for path in self.directory.glob(f"*{SUFFIX}"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, path.name[:-len(SUFFIX)], stat.st_size))
+            self._index = OrderedDict((name, size) for _, name, size in sorted(files))
+            self._bytes = sum(self._index.values())
+        return self._index
+
+    def _forget(self, key: str) -> None:
+        size = self._load_index().pop(key, None)
+        if size is not None:
+            self._bytes -= size
+
+    def get_sync(self, key: str) -> ReportArtifacts | None:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        with self._lock:
+            index = self._load_index()
+            try:
+                artifacts = ReportArtifacts.loads(path.read_bytes())
+                os.utime(path)
+            except FileNotFoundError:
+                self._forget(key)
+                self.misses += 1
+                return None
+            except Exception:
+                logging.warning("[REPORT_CACHE] Dropping unreadable %s", path, exc_info=True)
+                path.unlink(missing_ok=True)
+                self._forget(key)
+                self.misses += 1
+                return None
+            if key in index:
+                index.move_to_end(key)
+            self.hits += 1
+            return artifacts
+
+    def put_sync(self, key: str, artifacts: ReportArtifacts) -> None:
+        if not self.enabled:
+            return
+        data = artifacts.dumps()
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        with self._lock:
+            index = self._load_index()
+            tmp = path.with_suffix(".part")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._forget(key)
+            index[key] = len(data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(index) > 1:
+                old_key, size = index.popitem(last=False)
+                self._bytes -= size
+                self._path(old_key).unlink(missing_ok=True)
+                self.evictions += 1
+
+    def invalidate_user_sync(self, user_id: int) -> int:
+        """Delete all reports of a user (after /reset); return how many."""
+        if not self.enabled:
+            return 0
+        prefix = f"{user_id}_"
+        with self._lock:
+            keys = [key for key in self._load_index() if key.startswith(prefix)]
+            for key in keys:
+                self._forget(key)
+                self._path(key).unlink(missing_ok=True)
+        return len(keys)
+
+    async def get(self, key: str) -> ReportArtifacts | None:
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get_sync, key)
+
+    async def put(self, key: str, artifacts: ReportArtifacts) -> None:
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self.put_sync, key, artifacts)
+        except OSError:
+            logging.warning("[REPORT_CACHE] Cannot store %s", key, exc_info=True)
+
+    async def invalidate_user(self, user_id: int) -> int:
+        if not self.enabled:
+            return 0
+        return await asyncio.to_thread(self.invalidate_user_sync, user_id)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "files": len(self._index or ()),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+report_cache = ReportCache(REPORT_CACHE_DIR, int(REPORT_CACHE_MAX_MB * 2 ** 20))
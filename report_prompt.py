@@ -0,0 +1,234 @@
+# report_prompt.py
+"""Compact GPT prompt for diary reports.
+
+The report prompt used to list every entry of the period, so a busy month
+came to thousands of tokens.  :func:`build_prompt` describes the period by
+statistics instead: the summary, per-day (or, for long periods, per-week)
+totals from ``daily_stats``, time-of-day buckets, out-of-range episodes
+and the largest anomalies.  The result is measured with the model's
+tokenizer (``tiktoken``, if installed; otherwise a conservative estimate)
+and coarsened step by step until it fits ``REPORT_PROMPT_TOKENS``.
+
+The first count loads the tokenizer, which may download its BPE file, so
+:mod:`report` builds the prompt in a thread, not in the event loop.
+"""
+import logging
+import math
+import threading
+from datetime import datetime, timedelta, timezone, tzinfo
+
+from config import REPORT_PROMPT_TOKENS
+
+try:  # точный подсчёт токенов нужен только для проверки бюджета
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+MODEL = "gpt-4o-mini"
+TARGET_LOW = 3.9    # ммоль/л, целевой диапазон для «времени в диапазоне»
+TARGET_HIGH = 10.0
+# часы начала интервалов суток по местному времени
+BUCKETS = (("ночь", 0), ("утро", 6), ("день", 11), ("вечер", 17), ("ночь", 23))
+EPISODE_GAP = timedelta(hours=6)  # измерения дальше друг от друга — разные эпизоды
+
+_encoding = None  # False — загрузить не удалось, считаем оценкой
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    _encoding = tiktoken.encoding_for_model(MODEL)
+                except Exception:
+                    # нет сети для загрузки BPE-файла, старый tiktoken и т.п.
+                    logging.warning("[REPORT] tiktoken encoding unavailable, estimating tokens", exc_info=True)
+                    _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens of ``text`` for :data:`MODEL`; without tiktoken — an upper estimate.
+
+    May block on the first call while the tokenizer loads.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # кириллица в o200k — около 3–4 символов на токен; считаем с запасом
+    return math.ceil(len(text) / 2.5)
+
+
+def _local(moment: datetime, tz: tzinfo) -> datetime:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(tz)
+
+
+def _fmt(value: float | None) -> str:
+    return "-" if value is None else f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _bucket(hour: int) -> str:
+    name = BUCKETS[0][0]
+    for bucket, start in BUCKETS:
+        if hour >= start:
+            name = bucket
+    return name
+
+
+def period_lines(days, weekly: bool) -> list[str]:
+    """One line per ``daily_stats`` row, or per 7 rows merged for long periods."""
+    groups = [days[i:i + 7] for i in range(0, len(days), 7)] if weekly else [[day] for day in days]
+    lines = []
+    for group in groups:
+        sugar_count = sum(day.sugar_count for day in group)
+        label = group[0].local_date.strftime("%d.%m")
+        if len(group) > 1:
+            label += "–" + group[-1].local_date.strftime("%d.%m")
+        sugar = "-"
+        if sugar_count:
+            low = min(day.sugar_min for day in group if day.sugar_count)
+            high = max(day.sugar_max for day in group if day.sugar_count)
+            mean = sum(day.sugar_sum for day in group) / sugar_count
+            sugar = f"{_fmt(mean)} [{_fmt(low)}–{_fmt(high)}]"
+        dose = sum(day.dose_sum for day in group)
+        carbs = sum(day.carbs_sum for day in group)
+        lines.append(f"{label} n={sum(day.entries for day in group)} сахар {sugar} "
+                     f"доза Σ{_fmt(dose)} угл Σ{_fmt(carbs)}")
+    return lines
+
+
+def bucket_lines(entries, tz: tzinfo) -> list[str]:
+    """Sugar, carbs and dose by time of day; share of readings in target range."""
+    stats: dict[str, dict[str, list[float]]] = {}
+    for e in entries:
+        name = _bucket(_local(e.event_time, tz).hour)
+        bucket = stats.setdefault(name, {"sugar": [], "carbs": [], "dose": []})
+        for key, value in (("sugar", e.sugar_before), ("carbs", e.carbs_g), ("dose", e.dose)):
+            if value is not None:
+                bucket[key].append(value)
+    lines = []
+    for name in dict.fromkeys(name for name, _ in BUCKETS):
+        bucket = stats.get(name)
+        if not bucket:
+            continue
+        parts = [name]
+        sugars = bucket["sugar"]
+        if sugars:
+            in_range = sum(TARGET_LOW <= s <= TARGET_HIGH for s in sugars) / len(sugars)
+            parts.append(f"сахар n={len(sugars)} ср {_fmt(sum(sugars) / len(sugars))} "
+                         f"[{_fmt(min(sugars))}–{_fmt(max(sugars))}] в диапазоне {in_range:.0%}")
+        for key, title in (("carbs", "угл"), ("dose", "доза")):
+            if bucket[key]:
+                parts.append(f"{title} ср {_fmt(sum(bucket[key]) / len(bucket[key]))}")
+        lines.append(", ".join(parts))
+    return lines
+
+
+def episodes(entries, tz: tzinfo) -> list[tuple[str, datetime, int, float]]:
+    """Runs of consecutive readings below or above the target range.
+
+    Returns ``(kind, start, readings, extreme)``; readings more than
+    :data:`EPISODE_GAP` apart start a new episode.
+    """
+    found = []
+    current = None
+    previous_time = None
+    for e in entries:
+        if e.sugar_before is None:
+            continue
+        moment = _local(e.event_time, tz)
+        value = e.sugar_before
+        kind = "гипо" if value < TARGET_LOW else "гипер" if value > TARGET_HIGH else None
+        gap = previous_time is not None and moment - previous_time > EPISODE_GAP
+        previous_time = moment
+        if current and (kind != current[0] or gap):
+            found.append(tuple(current))
+            current = None
+        if kind is None:
+            continue
+        if current is None:
+            current = [kind, moment, 0, value]
+        current[2] += 1
+        current[3] = min(current[3], value) if kind == "гипо" else max(current[3], value)
+    if current:
+        found.append(tuple(current))
+    return found
+
+
+def episode_lines(found, limit: int) -> list[str]:
+    if not found:
+        return []
+    hypo = sum(kind == "гипо" for kind, *_ in found)
+    lines = [f"всего: гипо {hypo}, гипер {len(found) - hypo}"]
+    # гипогликемии опаснее — идут первыми, внутри вида самые глубокие/высокие
+    worst = sorted(
+        found,
+        key=lambda ep: (ep[0] == "гипо", abs(ep[3] - (TARGET_LOW if ep[0] == "гипо" else TARGET_HIGH))),
+        reverse=True,
+    )[:limit]
+    for kind, start, readings, extreme in sorted(worst, key=lambda ep: ep[1]):
+        lines.append(f"{start:%d.%m %H:%M} {kind} {readings} изм., пик {_fmt(extreme)}")
+    return lines
+
+
+def anomaly_lines(entries, tz: tzinfo, mean: float | None, sd: float | None, limit: int) -> list[str]:
+    """Readings furthest from the period mean, sharp jumps and invalid values."""
+    scored = []
+    previous = None
+    for e in entries:
+        when = f"{_local(e.event_time, tz):%d.%m %H:%M}"
+        values = (e.sugar_before, e.carbs_g, e.dose)
+        if any(value is not None and value < 0 for value in values):
+            scored.append((math.inf, f"{when} отрицательное значение в записи"))
+        if e.sugar_before is None:
+            continue
+        if mean is not None and sd:
+            z = (e.sugar_before - mean) / sd
+            if abs(z) >= 2:
+                scored.append((abs(z), f"{when} сахар {_fmt(e.sugar_before)} ({z:+.1f}σ)"))
+        if previous is not None and abs(e.sugar_before - previous) >= 5:
+            jump = e.sugar_before - previous
+            scored.append((abs(jump) / (sd or 1), f"{when} скачок {jump:+.1f} ммоль/л"))
+        previous = e.sugar_before
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [line for _, line in scored[:limit]]
+
+
+def build_prompt(period_label: str, summary_lines: list[str], days, entries, tz: tzinfo,
+                 mean: float | None = None, sd: float | None = None,
+                 budget: int = REPORT_PROMPT_TOKENS) -> str:
+    """Prompt of at most ``budget`` tokens (if any level fits) for the report GPT call.
+
+    ``days`` are ``daily_stats`` rows, ``entries`` rows with ``event_time``,
+    ``sugar_before``, ``carbs_g`` and ``dose`` in time order; ``mean`` and
+    ``sd`` are the period's sugar statistics.
+    """
+    found = episodes(entries, tz)
+    buckets = bucket_lines(entries, tz)
+    # от подробного к грубому: дни → недели, меньше эпизодов и аномалий
+    levels = [(False, 10, 10), (True, 10, 10), (True, 5, 5), (True, 3, 3), (True, 0, 3)]
+    prompt = ""
+    for weekly, episode_limit, anomaly_limit in levels:
+        sections = [
+            f"Сводка по дневнику диабетика за {period_label} (целевой диапазон "
+            f"{_fmt(TARGET_LOW)}–{_fmt(TARGET_HIGH)} ммоль/л):\n" + "\n".join(summary_lines),
+            ("По неделям" if weekly else "По дням") + " (сахар: среднее [мин–макс]):\n"
+            + "\n".join(period_lines(days, weekly)),
+        ]
+        if buckets:
+            sections.append("По времени суток:\n" + "\n".join(buckets))
+        lines = episode_lines(found, episode_limit)
+        if lines:
+            sections.append("Выходы из диапазона:\n" + "\n".join(lines))
+        lines = anomaly_lines(entries, tz, mean, sd, anomaly_limit)
+        if lines:
+            sections.append("Аномалии:\n" + "\n".join(lines))
+        sections.append("Сделай анализ, дай советы по контролю сахара и питанию, укажи возможные проблемы.")
+        prompt = "\n\n".join(sections)
+        if count_tokens(prompt) <= budget:
+            break
+    return prompt
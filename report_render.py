@@ -0,0 +1,282 @@
+"""Chart and PDF rendering for reports.
+
+Everything here is synchronous and CPU-bound; :mod:`render_pool` runs it in
+worker processes.  Functions take plain data (timestamps, numbers, strings) and
+return ``bytes``, so arguments and results pickle cheaply between processes.
+
+The PDF draws the sugar chart itself as reportlab vector paths; matplotlib is
+imported only when :func:`render_chart` makes the PNG preview for Telegram.
+Fonts are registered on first use as well, so importing this module is cheap.
+"""
+import datetime
+import functools
+import io
+import logging
+import math
+import os
+import re
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+TARGET_LOW = 3.9    # ммоль/л, закрашенная полоса целевого диапазона на графике
+TARGET_HIGH = 10.0
+
+DEFAULT_FONT = "Helvetica"
+DEFAULT_FONT_BOLD = "Helvetica-Bold"
+
+# Fallback font with Cyrillic support
+FALLBACK_FONT_PATH = "/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf"
+FALLBACK_FONT_BOLD_PATH = "/usr/share/fonts/truetype/noto/NotoSans-Bold.ttf"
+
+
+@functools.cache
+def fonts() -> tuple[str, str]:
+    """Register DejaVu fonts if available, else return defaults.
+
+    The font paths can be overridden via ``FONT_PATH`` and ``FONT_BOLD_PATH``
+    environment variables. If the files are not found, built-in Helvetica
+    fonts are used as a fallback.
+    """
+    regular_path = os.getenv(
+        "FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+    )
+    bold_path = os.getenv(
+        "FONT_BOLD_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+    )
+
+    if os.path.exists(regular_path) and os.path.exists(bold_path):
+        pdfmetrics.registerFont(TTFont("DejaVuSans", regular_path))
+        pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", bold_path))
+        return "DejaVuSans", "DejaVuSans-Bold"
+
+    fallback_regular = os.getenv("FALLBACK_FONT_PATH", FALLBACK_FONT_PATH)
+    fallback_bold = os.getenv("FALLBACK_FONT_BOLD_PATH", FALLBACK_FONT_BOLD_PATH)
+    if os.path.exists(fallback_regular) and os.path.exists(fallback_bold):
+        pdfmetrics.registerFont(TTFont("NotoSans", fallback_regular))
+        pdfmetrics.registerFont(TTFont("NotoSans-Bold", fallback_bold))
+        logging.warning(
+            "DejaVu fonts not found; using fallback fonts %s and %s",
+            "NotoSans",
+            "NotoSans-Bold",
+        )
+        return "NotoSans", "NotoSans-Bold"
+
+    logging.warning(
+        "DejaVu and Noto fonts not found; using default fonts %s and %s",
+        DEFAULT_FONT,
+        DEFAULT_FONT_BOLD,
+    )
+    return DEFAULT_FONT, DEFAULT_FONT_BOLD
+
+
+
+def clean_markdown(text: str) -> str:
+    """Remove basic Markdown formatting"""
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    text = re.sub(r'#+\s*', '', text)
+    text = re.sub(r'^\s*\d+\.\s*', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*\*\s*', '', text, flags=re.MULTILINE)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    return text
+
+
+def split_text_by_width(text: str, font_name: str, font_size: int, max_width_mm: int):
+    """Split a line so it does not exceed max_width_mm."""
+    words = text.split()
+    lines = []
+    current = ""
+    for word in words:
+        test = (current + " " + word).strip()
+        width = stringWidth(test, font_name, font_size) / mm
+        if width > max_width_mm and current:
+            lines.append(current)
+            current = word
+        else:
+            current = test
+    if current:
+        lines.append(current)
+    return lines
+
+
+@functools.cache
+def _pyplot():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def _nice_step(span: float, ticks: int = 5) -> float:
+    """Round grid step (1, 2 or 5 × 10ⁿ) giving about ``ticks`` lines over ``span``."""
+    raw = span / ticks
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if raw <= factor * magnitude:
+            return factor * magnitude
+    return 10 * magnitude
+
+
+def draw_sugar_chart(c, x, y, width, height, times, sugars, title: str) -> None:
+    """Draw the sugar line chart into the box with lower-left corner ``(x, y)``.
+
+    Vector paths only: axes, grid, the target-range band, the line and its
+    points, so the chart stays sharp at any zoom and adds a few KB to the PDF.
+    """
+    regular, bold = fonts()
+    c.saveState()
+    c.setFont(bold, 10)
+    c.drawString(x, y + height - 4 * mm, title)
+    if not times:
+        c.restoreState()
+        return
+    left, bottom = x + 12 * mm, y + 8 * mm
+    plot_w, plot_h = width - 14 * mm, height - 15 * mm
+    start, end = min(times), max(times)
+    span = (end - start).total_seconds() or 1.0
+    low = max(0.0, min(min(sugars), TARGET_LOW) - 1)
+    high = max(max(sugars), TARGET_HIGH) + 1
+    step = _nice_step(high - low)
+    low, high = math.floor(low / step) * step, math.ceil(high / step) * step
+
+    def px(moment) -> float:
+        return left + (moment - start).total_seconds() / span * plot_w
+
+    def py(value: float) -> float:
+        return bottom + (value - low) / (high - low) * plot_h
+
+    c.setFillColor(colors.Color(0.86, 0.95, 0.86))
+    c.rect(left, py(TARGET_LOW), plot_w, py(TARGET_HIGH) - py(TARGET_LOW), stroke=0, fill=1)
+
+    c.setFont(regular, 7)
+    c.setFillColor(colors.black)
+    c.setStrokeColor(colors.Color(0.8, 0.8, 0.8))
+    c.setLineWidth(0.3)
+    value = low
+    while value <= high + 1e-9:
+        c.line(left, py(value), left + plot_w, py(value))
+        c.drawRightString(left - 1.5 * mm, py(value) - 2.5, f"{value:g}")
+        value += step
+    label = "%H:%M" if span <= 2 * 86400 else "%d.%m"
+    for i in range(6):
+        moment = start + datetime.timedelta(seconds=span * i / 5)
+        c.line(px(moment), bottom, px(moment), bottom + plot_h)
+        c.drawCentredString(px(moment), bottom - 4 * mm, moment.strftime(label))
+
+    c.setStrokeColor(colors.black)
+    c.setLineWidth(0.6)
+    c.rect(left, bottom, plot_w, plot_h, stroke=1, fill=0)
+
+    points = sorted(zip(times, sugars))
+    c.setStrokeColor(colors.Color(0.12, 0.47, 0.71))
+    c.setFillColor(colors.Color(0.12, 0.47, 0.71))
+    c.setLineWidth(1)
+    path = c.beginPath()
+    path.moveTo(px(points[0][0]), py(points[0][1]))
+    for moment, value in points[1:]:
+        path.lineTo(px(moment), py(value))
+    c.drawPath(path, stroke=1, fill=0)
+    if len(points) <= 200:  # на плотном графике точки сливаются в линию
+        for moment, value in points:
+            c.circle(px(moment), py(value), 0.9, stroke=0, fill=1)
+    c.restoreState()
+
+
+def generate_pdf_report(summary_lines, errors, day_lines, gpt_text, times=(), sugars=(), period_label=""):
+    regular, bold = fonts()
+    pdf_buf = io.BytesIO()
+    c = canvas.Canvas(pdf_buf, pagesize=A4)
+    width, height = A4
+    y = height - 20 * mm
+
+    def write(text: str, font: str, indent: float = 20 * mm, step: float = 7 * mm) -> None:
+        nonlocal y
+        if y < 25 * mm:
+            c.showPage()
+            y = height - 20 * mm
+        c.setFont(font, 11)
+        c.drawString(indent, y, text)
+        y -= step
+
+    c.setFont(bold, 16)
+    c.drawString(20 * mm, y, "Отчёт по диабетическому дневнику")
+    y -= 12 * mm
+    for line in summary_lines:
+        write(line, regular)
+    if times:
+        # график — сразу после сводки, на новой странице, если не помещается
+        if y - 62 * mm < 20 * mm:
+            c.showPage()
+            y = height - 20 * mm
+        y -= 2 * mm
+        draw_sugar_chart(c, 20 * mm, y - 60 * mm, 170 * mm, 60 * mm, times, sugars,
+                         f"Динамика сахара за {period_label}")
+        y -= 65 * mm
+    if errors:
+        y -= 5 * mm
+        write("Ошибки и критические значения:", bold)
+        for line in errors:
+            write(line, regular, indent=22 * mm, step=6 * mm)
+    if day_lines:
+        y -= 5 * mm
+        write("Динамика по дням:", bold)
+        for line in day_lines:
+            write(line, regular, indent=22 * mm, step=6 * mm)
+    y -= 5 * mm
+    write("Анализ и рекомендации:", bold)
+    text_obj = c.beginText(22 * mm, y)
+    text_obj.setFont(regular, 11)
+    for line in clean_markdown(gpt_text).splitlines():
+        for sub in split_text_by_width(line, regular, 11, max_width_mm=170):
+            if text_obj.getY() < 30 * mm:
+                c.drawText(text_obj)
+                c.showPage()
+                text_obj = c.beginText(22 * mm, height - 20 * mm)
+                text_obj.setFont(regular, 11)
+            text_obj.textLine(sub)
+    c.drawText(text_obj)
+    c.save()
+    pdf_buf.seek(0)
+    return pdf_buf
+
+
+def render_chart(times, sugars, period_label: str) -> bytes:
+    """Render the sugar dynamics chart for the Telegram preview and return PNG bytes."""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(7, 3))
+    try:
+        ax.plot(times, sugars, marker="o", label="Сахар (ммоль/л)")
+        ax.set_title(f"Динамика сахара за {period_label}")
+        ax.set_xlabel("Дата")
+        ax.set_ylabel("Сахар, ммоль/л")
+        ax.grid(True)
+        ax.legend()
+        fig.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+    finally:
+        plt.close(fig)
+    return buf.getvalue()
+
+
+def render_pdf(summary_lines, errors, day_lines, gpt_text, times=(), sugars=(), period_label: str = "") -> bytes:
+    """Build the PDF report with a vector sugar chart and return its bytes."""
+    return generate_pdf_report(summary_lines, errors, day_lines, gpt_text, times, sugars, period_label).getvalue()
+
+
+def warm_up() -> None:
+    """Load fonts and the Agg renderer so the first real report is fast.
+
+    Used as the initializer of render worker processes: registers the PDF
+    fonts, imports matplotlib and fills its font cache with a tiny chart.
+    """
+    fonts()
+    now = datetime.datetime.now()
+    render_chart([now - datetime.timedelta(days=1), now], [5.0, 6.0], "")
@@ -0,0 +1,385 @@
+# state_persistence.py
+"""Conversation state shared by all bot processes.
+
+``context.user_data`` and the steps of the persistent ``ConversationHandler``
+objects live in one row per user (:class:`db.BotState`).  Several bot
+workers (webhook mode behind a load balancer) can then serve the same user,
+and a restart no longer loses a half-finished dose calculation.
+
+:class:`StatePersistence` keeps a write-back LRU in front of the store:
+
+* an update for a user that was seen recently costs no database round trip;
+  after ``refresh_after`` seconds only the row's ``version`` is checked;
+* PTB reports changes every ``update_interval`` seconds and all dirty users
+  are written in one transaction;
+* a write succeeds only if the row still has the version it was read at.  If
+  another worker got there first, its state wins and is reloaded.
+
+:class:`SqlStateStore` is the Postgres store, :class:`MemoryStateStore` is the
+in-process stand-in for a single worker and tests.
+
+Rows hold JSON, never pickle: ``user_data`` may contain only JSON types and
+``datetime``; conversation keys are stored as lists and read back as tuples.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from telegram.ext import BasePersistence, ConversationHandler, PersistenceInput
+
+from config import PERSISTENCE_CACHE_SIZE, PERSISTENCE_FLUSH_INTERVAL, PERSISTENCE_REFRESH_AFTER
+from db import AsyncSessionLocal, BotState
+
+Row = tuple[int, bytes]  # (version, data)
+
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return {"$datetime": obj.isoformat()}
+    raise TypeError(f"{type(obj).__name__} cannot be stored in bot_state")
+
+
+def _hook(obj: dict):
+    if len(obj) == 1 and "$datetime" in obj:
+        return datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+
+def dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+def loads(data: bytes):
+    return json.loads(data, object_hook=_hook)
+
+
+@dataclass(frozen=True, slots=True)
+class Write:
+    user_id: int
+    base_version: int   # 0 — строки ещё нет
+    data: bytes | None  # None — удалить
+
+
+class MemoryStateStore:
+    """Process-local store with the same interface as :class:`SqlStateStore`."""
+
+    def __init__(self) -> None:
+        self.rows: dict[int, Row] = {}
+
+    async def load(self, user_id: int) -> Row | None:
+        return self.rows.get(user_id)
+
+    async def version(self, user_id: int) -> int:
+        row = self.rows.get(user_id)
+        return row[0] if row else 0
+
+    async def save(self, writes: list[Write]) -> list[int]:
+        """Apply ``writes``; return the users whose version did not match."""
+        conflicts = []
+        for write in writes:
+            if write.data is None:
+                self.rows.pop(write.user_id, None)
+            elif await self.version(write.user_id) != write.base_version:
+                conflicts.append(write.user_id)
+            else:
+                self.rows[write.user_id] = (write.base_version + 1, write.data)
+        return conflicts
+
+
+class SqlStateStore:
+    """Rows of ``bot_state``; all writes of one flush share a transaction."""
+
+    def __init__(self, session_factory=AsyncSessionLocal) -> None:
+        self.session_factory = session_factory
+
+    async def load(self, user_id: int) -> Row | None:
+        async with self.session_factory() as session:
+            row = (
+                await session.execute(
+                    select(BotState.version, BotState.data).where(BotState.telegram_id == user_id)
+                )
+            ).first()
+        return (row.version, row.data) if row else None
+
+    async def version(self, user_id: int) -> int:
+        async with self.session_factory() as session:
+            version = await session.scalar(
+                select(BotState.version).where(BotState.telegram_id == user_id)
+            )
+        return version or 0
+
+    async def save(self, writes: list[Write]) -> list[int]:
+        conflicts = []
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as session:
+            async with session.begin():
+                for write in writes:
+                    if write.data is None:
+                        await session.execute(delete(BotState).where(BotState.telegram_id == write.user_id))
+                    elif write.base_version == 0:
+                        try:
+                            async with session.begin_nested():
+                                await session.execute(
+                                    insert(BotState).values(
+                                        telegram_id=write.user_id, data=write.data, version=1, updated_at=now
+                                    )
+                                )
+                        except IntegrityError:
+                            conflicts.append(write.user_id)
+                    else:
+                        result = await session.execute(
+                            update(BotState)
+                            .where(BotState.telegram_id == write.user_id)
+                            .where(BotState.version == write.base_version)
+                            .values(data=write.data, version=write.base_version + 1, updated_at=now)
+                        )
+                        if result.rowcount == 0:
+                            conflicts.append(write.user_id)
+        return conflicts
+
+
+def _replace_user_states(handler, user_id: int, states: dict) -> None:
+    """Put another worker's conversation steps of ``user_id`` into ``handler``.
+
+    PTB has no public way to reload a conversation after start-up
+    (``get_conversations`` is called once), so this is the only place that
+    touches its internals, as of the pinned python-telegram-bot 20.4
+    (``tests/test_state_persistence.py`` checks them against the real
+    package):
+
+    * ``handler._conversations`` is a ``TrackingDict``; writes go through
+      ``.data`` / ``update_no_track`` so PTB does not report them back;
+    * a running ``block=False`` handler leaves a ``PendingState`` (it has a
+      ``task``) — PTB writes its result itself, so it is kept.
+    """
+    tracked = handler._conversations
+    mine = [key for key in tracked if key and key[-1] == user_id]
+    pending = {key for key in mine if hasattr(tracked.data[key], "task")}
+    for key in mine:
+        if key not in pending:
+            tracked.data.pop(key, None)
+    tracked.update_no_track({key: state for key, state in states.items() if key not in pending})
+
+
+@dataclass(slots=True)
+class _Slot:
+    version: int
+    user_data: bytes                  # user_data в JSON
+    conversations: dict = field(default_factory=dict)  # (имя, ключ) -> шаг
+    checked_at: float = 0.0
+    dirty: bool = False
+
+    def dumps(self) -> bytes:
+        conversations = [[name, list(key), state] for (name, key), state in self.conversations.items()]
+        return dumps({"user_data": loads(self.user_data), "conversations": conversations})
+
+
+_EMPTY = dumps({})
+
+
+class StatePersistence(BasePersistence):
+    """``BasePersistence`` for ``user_data`` and conversation states.
+
+    Conversation handlers must be passed to :meth:`register_conversations`;
+    their states are refreshed together with ``user_data``.
+    """
+
+    def __init__(
+        self,
+        store=None,
+        maxsize: int = PERSISTENCE_CACHE_SIZE,
+        flush_interval: float = PERSISTENCE_FLUSH_INTERVAL,
+        refresh_after: float = PERSISTENCE_REFRESH_AFTER,
+    ) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=flush_interval,
+        )
+        self.store = store if store is not None else SqlStateStore()
+        self.maxsize = maxsize
+        self.refresh_after = refresh_after
+        self._cache: OrderedDict[int, _Slot] = OrderedDict()
+        self._handlers: dict = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self.counters = {"hits": 0, "checks": 0, "loads": 0, "writes": 0, "flushes": 0, "conflicts": 0}
+
+    def register_conversations(self, *handlers) -> None:
+        for handler in handlers:
+            self._handlers[handler.name] = handler
+
+    # ─────────────────────────── кэш ───────────────────────────
+    def _put(self, user_id: int, slot: _Slot) -> None:
+        self._cache[user_id] = slot
+        self._cache.move_to_end(user_id)
+        if len(self._cache) <= self.maxsize:
+            return
+        # несохранённые изменения не вытесняются — они уйдут со следующей записью
+        excess = len(self._cache) - self.maxsize
+        victims = []
+        for old_id, old in self._cache.items():
+            if len(victims) == excess:
+                break
+            if not old.dirty:
+                victims.append(old_id)
+        for old_id in victims:
+            del self._cache[old_id]
+
+    async def _load(self, user_id: int) -> _Slot:
+        self.counters["loads"] += 1
+        row = await self.store.load(user_id)
+        if row is None:
+            return _Slot(0, _EMPTY, checked_at=time.monotonic())
+        version, data = row
+        try:
+            state = loads(data)
+            conversations = {(name, tuple(key)): step for name, key, step in state["conversations"]}
+            user_data = dumps(state["user_data"])
+        except (ValueError, TypeError, KeyError):
+            # строка старого формата (pickle) — диалог начнётся заново,
+            # версия сохраняется, чтобы следующая запись её перезаписала
+            logging.warning("[STATE] Unreadable state of user %s, starting empty", user_id)
+            return _Slot(version, _EMPTY, checked_at=time.monotonic())
+        return _Slot(version, user_data, conversations, checked_at=time.monotonic())
+
+    async def _slot_for_write(self, user_id: int) -> _Slot:
+        slot = self._cache.get(user_id)
+        if slot is None:
+            slot = await self._load(user_id)
+            slot = self._cache.get(user_id, slot)
+            self._put(user_id, slot)
+        return slot
+
+    def _mark_dirty(self, slot: _Slot) -> None:
+        slot.dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            # PTB сообщает все изменения одной пачкой через gather; задача
+            # запустится после неё и запишет пачку одной транзакцией
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    def _apply(self, user_id: int, slot: _Slot, user_data: dict) -> None:
+        user_data.clear()
+        user_data.update(loads(slot.user_data))
+        for name, handler in self._handlers.items():
+            _replace_user_states(handler, user_id, {
+                key: state for (n, key), state in slot.conversations.items() if n == name
+            })
+
+    # ─────────────────────── BasePersistence ───────────────────────
+    async def get_user_data(self) -> dict:
+        # состояние поднимается лениво, в refresh_user_data
+        return {}
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        slot = self._cache.get(user_id)
+        if slot is not None:
+            self._cache.move_to_end(user_id)
+            if slot.dirty or time.monotonic() - slot.checked_at < self.refresh_after:
+                self.counters["hits"] += 1
+                return
+            self.counters["checks"] += 1
+            version = await self.store.version(user_id)
+            slot.checked_at = time.monotonic()
+            if version == slot.version:
+                return
+        fresh = await self._load(user_id)
+        current = self._cache.get(user_id)
+        if current is not slot or (current is not None and current.dirty):
+            # пока ждали базу, слот обновили локально — он новее
+            return
+        self._put(user_id, fresh)
+        self._apply(user_id, fresh, user_data)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        blob = dumps(data)
+        slot = await self._slot_for_write(user_id)
+        if slot.user_data != blob:
+            slot.user_data = blob
+            self._mark_dirty(slot)
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        slot = await self._slot_for_write(key[-1])
+        if new_state is None or new_state == ConversationHandler.END:
+            # END приходит от неблокирующих обработчиков вместо удаления
+            if slot.conversations.pop((name, key), None) is None:
+                return
+        elif slot.conversations.get((name, key)) == new_state:
+            return
+        else:
+            slot.conversations[(name, key)] = new_state
+        self._mark_dirty(slot)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._cache.pop(user_id, None)
+        async with self._flush_lock:
+            await self.store.save([Write(user_id, 0, None)])
+
+    async def flush(self) -> None:
+        """Write every dirty user in one batch."""
+        async with self._flush_lock:
+            batch = [(uid, slot) for uid, slot in self._cache.items() if slot.dirty]
+            if not batch:
+                return
+            writes = []
+            for uid, slot in batch:
+                slot.dirty = False
+                writes.append(Write(uid, slot.version, slot.dumps()))
+            try:
+                conflicts = set(await self.store.save(writes))
+            except Exception:
+                logging.exception("[STATE] Failed to save state of %d users", len(writes))
+                for _, slot in batch:
+                    slot.dirty = True
+                return
+            self.counters["flushes"] += 1
+            self.counters["writes"] += len(writes) - len(conflicts)
+            for uid, slot in batch:
+                if uid in conflicts:
+                    # другой процесс записал раньше: его версия выигрывает,
+                    # refresh_user_data перечитает её при следующем апдейте
+                    self.counters["conflicts"] += 1
+                    logging.warning("[STATE] Version conflict for user %s, reloading", uid)
+                    if self._cache.get(uid) is slot:
+                        del self._cache[uid]
+                else:
+                    slot.version += 1
+
+    def stats(self) -> dict:
+        return {"size": len(self._cache), "dirty": sum(s.dirty for s in self._cache.values()), **self.counters}
+
+    # Остальное состояние PTB (chat_data, bot_data, callback_data) бот не хранит
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
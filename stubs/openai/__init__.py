@@ -2,3 +2,13 @@ class OpenAI:
     def __init__(self, *args, **kwargs):
         pass
 
+class AsyncOpenAI:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def close(self):
+        pass
+
+class DefaultAsyncHttpxClient:
+    def __init__(self, *args, **kwargs):
+        pass
@@ -1,5 +1,9 @@
 class Update:
-    pass
+    @classmethod
+    def de_json(cls, data, bot):
+        update = cls()
+        update.__dict__.update(data or {})
+        return update
 
 class ReplyKeyboardMarkup:
     def __init__(self, *a, **k):
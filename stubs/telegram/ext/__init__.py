@@ -16,6 +16,7 @@ class CallbackQueryHandler:
 
 class ConversationHandler:
     END = object()
+    WAITING = -3
     def __init__(self, *a, **k):
         pass
 
@@ -29,3 +30,32 @@ class filters:
     Document = type('Document', (), {'IMAGE': object()})
     Regex = lambda x: x
 
+class BaseRateLimiter:
+    def __class_getitem__(cls, item):
+        return cls
+
+class PersistenceInput:
+    def __init__(self, bot_data=True, chat_data=True, user_data=True, callback_data=True):
+        self.bot_data = bot_data
+        self.chat_data = chat_data
+        self.user_data = user_data
+        self.callback_data = callback_data
+
+class BasePersistence:
+    def __init__(self, store_data=None, update_interval=60):
+        self.store_data = store_data or PersistenceInput()
+        self._update_interval = update_interval
+        self.bot = None
+
+    def __class_getitem__(cls, item):
+        return cls
+
+class BaseUpdateProcessor:
+    def __init__(self, max_concurrent_updates):
+        import asyncio
+        self.max_concurrent_updates = max_concurrent_updates
+        self._semaphore = asyncio.BoundedSemaphore(max_concurrent_updates)
+
+    async def process_update(self, update, coroutine):
+        async with self._semaphore:
+            await self.do_process_update(update, coroutine)
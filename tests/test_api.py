@@ -1,9 +1,16 @@
+import os
+
 import pytest
 from fastapi import HTTPException
 from pydantic import ValidationError
 
 from fastapi.testclient import TestClient
 
+# api.py reads webhook settings from config; keep later imports of config valid
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
 from api import ai_diagnose, DiagnoseRequest, DiagnoseResponse, app
 
 @pytest.mark.asyncio
@@ -31,3 +38,64 @@ def test_webapp_served_index_html():
     assert response.status_code == 200
     assert "Diabetes Assistant WebApp" in response.text
 
+
+
+def _update(update_id=1):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": 42, "type": "private"},
+            "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+            "text": "сахар 7.5",
+        },
+    }
+
+
+@pytest.fixture
+def webhook_app(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+
+    import api
+
+    monkeypatch.setattr(api, "WEBHOOK_SECRET", "s3cret")
+    application = SimpleNamespace(update_queue=asyncio.Queue(), bot=None)
+    monkeypatch.setattr(app.state, "telegram_app", application, raising=False)
+    return application
+
+
+def test_webhook_queues_update(webhook_app):
+    client = TestClient(app)
+    response = client.post(
+        "/telegram/webhook", json=_update(7),
+        headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"},
+    )
+    assert response.status_code == 200
+    update = webhook_app.update_queue.get_nowait()
+    assert update.update_id == 7
+
+
+def test_webhook_rejects_wrong_secret(webhook_app):
+    client = TestClient(app)
+    response = client.post(
+        "/telegram/webhook", json=_update(), headers={"X-Telegram-Bot-Api-Secret-Token": "nope"}
+    )
+    assert response.status_code == 403
+    assert webhook_app.update_queue.empty()
+
+
+def test_webhook_rejects_non_ascii_secret(webhook_app):
+    client = TestClient(app)
+    response = client.post(
+        "/telegram/webhook", json=_update(), headers={"X-Telegram-Bot-Api-Secret-Token": "s3cr\xe9t".encode("latin-1")}
+    )
+    assert response.status_code == 403
+    assert webhook_app.update_queue.empty()
+
+
+def test_webhook_disabled_without_bot(monkeypatch):
+    monkeypatch.setattr(app.state, "telegram_app", None, raising=False)
+    response = TestClient(app).post("/telegram/webhook", json=_update())
+    assert response.status_code == 503
@@ -0,0 +1,108 @@
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.dialects import postgresql
+
+import db_access
+from db import DailyStat, Entry, User
+
+COLUMNS = [c.name for c in DailyStat.__table__.columns]
+
+
+@pytest_asyncio.fixture
+async def sessions(monkeypatch, async_session_factory):
+    monkeypatch.setattr(db_access, "AsyncSessionLocal", async_session_factory)
+    async with async_session_factory() as session:
+        session.add(User(telegram_id=1, thread_id="t", timezone="Europe/Moscow"))
+        await session.commit()
+    for hour, values in [
+        (8, {"sugar_before": 6.0, "dose": 4.0, "carbs_g": 40.0}),
+        (13, {"sugar_before": 9.0, "xe": 5.0}),
+        (22, {"sugar_before": 5.0, "dose": 2.0}),  # 01:00 по Москве — уже 2 мая
+    ]:
+        await db_access.add_entry_async(
+            {"telegram_id": 1, "event_time": datetime(2025, 5, 1, hour, tzinfo=timezone.utc), **values}
+        )
+    return async_session_factory
+
+
+def _rows(stats):
+    return [{name: getattr(row, name) for name in COLUMNS} for row in stats]
+
+
+@pytest.mark.asyncio
+async def test_add_entry_updates_day_of_user_timezone(sessions):
+    first, second = await db_access.get_daily_stats_async(1, date(2025, 5, 1))
+    assert (first.local_date, first.entries, second.local_date, second.entries) == (
+        date(2025, 5, 1), 2, date(2025, 5, 2), 1)
+    assert (first.sugar_count, first.sugar_sum, first.sugar_min, first.sugar_max, first.sugar_sumsq) == (
+        2, 15.0, 6.0, 9.0, 117.0)
+    assert (first.dose_count, first.dose_sum, first.xe_count, first.xe_max) == (1, 4.0, 1, 5.0)
+    assert (second.carbs_count, second.carbs_sum, second.carbs_min) == (0, 0.0, None)
+    assert _rows(await db_access.get_daily_stats_async(1, date(2025, 5, 2), date(2025, 5, 2))) == _rows([second])
+
+
+@pytest.mark.asyncio
+async def test_edit_and_delete_recompute_day(sessions):
+    before = await db_access.get_data_version_async(1)
+    assert before.endswith("/3")
+    async with sessions() as session:
+        entries = {e.sugar_before: e for e in (await session.execute(Entry.__table__.select())).all()}
+        high = await session.get(Entry, entries[9.0].id)
+        high.sugar_before = 7.0
+        await db_access.refresh_daily_stats(session, 1, high.event_time)
+        late = await session.get(Entry, entries[5.0].id)
+        await session.delete(late)
+        await db_access.refresh_daily_stats(session, 1, late.event_time)
+        await session.commit()
+
+    [day] = await db_access.get_daily_stats_async(1, date(2025, 5, 1))
+    assert (day.local_date, day.entries, day.sugar_max, day.sugar_sum, day.sugar_sumsq) == (
+        date(2025, 5, 1), 2, 7.0, 13.0, 85.0)
+    after = await db_access.get_data_version_async(1)
+    assert after.endswith("/5") and after.split("/")[0] == before.split("/")[0]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_matches_incremental_rows(sessions):
+    incremental = _rows(await db_access.get_daily_stats_async(1, date(2025, 1, 1)))
+    async with sessions() as session:
+        days = await session.run_sync(
+            lambda sync: db_access.rebuild_daily_stats(sync, 1, ZoneInfo("Europe/Moscow"))
+        )
+        await session.commit()
+    assert days == 2
+    assert _rows(await db_access.get_daily_stats_async(1, date(2025, 1, 1))) == incremental
+
+
+@pytest.mark.asyncio
+async def test_timezone_change_rebuilds_days(sessions):
+    before = await db_access.get_data_version_async(1)
+    await db_access.set_user_timezone_async(1, "America/Los_Angeles")
+
+    days = await db_access.get_daily_stats_async(1, date(2025, 1, 1))
+    # 22:00 UTC в Лос-Анджелесе — ещё 1 мая, все три записи в одном дне
+    assert [(d.local_date, d.entries) for d in days] == [(date(2025, 5, 1), 3)]
+    assert (await db_access.get_user_timezone_async(1)).key == "America/Los_Angeles"
+    assert await db_access.get_data_version_async(1) != before
+
+
+def test_rebuild_groups_by_local_day_in_postgres():
+    executed = []
+    session = SimpleNamespace(
+        get_bind=lambda: SimpleNamespace(dialect=postgresql.dialect()),
+        execute=lambda statement: executed.append(statement) or SimpleNamespace(rowcount=3),
+    )
+    assert db_access.rebuild_daily_stats(session, 1, ZoneInfo("Europe/Moscow")) == 3
+    sql = str(executed[1].compile(dialect=postgresql.dialect()))
+    assert "GROUP BY CAST(date_trunc(" in sql and "timezone(" in sql
+
+
+@pytest.mark.asyncio
+async def test_report_series_reads_only_numeric_columns(sessions):
+    rows = await db_access.get_report_series_async(1, datetime(2025, 5, 1, 12, tzinfo=timezone.utc))
+    assert [(row.sugar_before, row.dose, row.xe) for row in rows] == [(9.0, None, 5.0), (5.0, 2.0, None)]
+    assert not isinstance(rows[0], Entry) and not hasattr(rows[0], "gpt_summary")
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+import db_access
+from db import User
+from profile_cache import profile_cache
+
+
+@pytest_asyncio.fixture
+async def async_session(monkeypatch, async_session_factory):
+    monkeypatch.setattr(db_access, "AsyncSessionLocal", async_session_factory)
+    profile_cache.clear()
+    async with async_session_factory() as session:
+        session.add(User(telegram_id=1, thread_id="t"))
+        await session.commit()
+    return async_session_factory
+
+
+@pytest.mark.asyncio
+async def test_profile_roundtrip(async_session):
+    assert await db_access.get_profile_async(1) is None
+    await db_access.save_profile_async(1, 10, 2, 6)
+    await db_access.save_profile_async(1, 12, 2.5, 6.5)
+    profile = await db_access.get_profile_async(1)
+    assert (profile.icr, profile.cf, profile.target_bg) == (12, 2.5, 6.5)
+
+
+@pytest.mark.asyncio
+async def test_profile_served_from_cache_until_saved(async_session):
+    await db_access.save_profile_async(1, 10, 2, 6)
+    await db_access.get_profile_async(1)
+    await db_access.get_profile_async(1)
+    assert (profile_cache.hits, profile_cache.misses) == (1, 1)
+
+    await db_access.save_profile_async(1, 15, 3, 7)
+    profile = await db_access.get_profile_async(1)
+    assert profile.icr == 15
+    assert profile_cache.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_entries_since_filters_and_orders(async_session):
+    now = datetime.now(timezone.utc)
+    for hours, sugar in [(1, 7.0), (50, 9.0), (3, 5.5)]:
+        await db_access.add_entry_async(
+            {"telegram_id": 1, "event_time": now - timedelta(hours=hours), "sugar_before": sugar}
+        )
+    entries = await db_access.get_entries_since_async(1, now - timedelta(days=1))
+    assert [e.sugar_before for e in entries] == [5.5, 7.0]
+
+
+@pytest.mark.asyncio
+async def test_add_entry_rejects_unknown_fields(async_session):
+    with pytest.raises(ValueError):
+        await db_access.add_entry_async(
+            {"telegram_id": 1, "event_time": datetime.now(timezone.utc), "bogus": 1}
+        )
+
+
+@pytest.mark.asyncio
+async def test_reminder_lifecycle(async_session):
+    run_time = datetime.now(timezone.utc) + timedelta(hours=1)
+    reminder = await db_access.add_reminder_async(1, run_time, "check sugar")
+    assert reminder.id is not None
+    reminders = await db_access.get_reminders_async(1)
+    assert [r.message for r in reminders] == ["check sugar"]
+    await db_access.delete_reminder_async(reminder.id)
+    assert await db_access.get_reminders_async(1) == []
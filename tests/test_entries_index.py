@@ -0,0 +1,111 @@
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+
+from db import Base, Entry, User
+from db_access import entries_in_range, local_day_bounds
+
+INDEX_NAME = "ix_entries_telegram_id_event_time"
+
+
+def _compile_sqlite(stmt, engine):
+    compiled = stmt.compile(engine)
+    params = [compiled.params[name] for name in compiled.positiontup]
+    return str(compiled), [p.isoformat(" ") if isinstance(p, datetime) else p for p in params]
+
+
+def test_local_day_bounds_utc():
+    start, end = local_day_bounds(date(2025, 5, 5), timezone.utc)
+    assert start == datetime(2025, 5, 5, tzinfo=timezone.utc)
+    assert end == datetime(2025, 5, 6, tzinfo=timezone.utc)
+
+
+def test_local_day_bounds_follow_user_timezone():
+    start, end = local_day_bounds(date(2025, 5, 5), ZoneInfo("Europe/Moscow"))
+    assert start == datetime(2025, 5, 4, 21, tzinfo=timezone.utc)
+    assert end - start == timedelta(hours=24)
+
+
+def test_local_day_bounds_dst_day_is_23_hours():
+    start, end = local_day_bounds(date(2025, 3, 30), ZoneInfo("Europe/Berlin"))
+    assert end - start == timedelta(hours=23)
+
+
+def test_sqlite_plan_uses_composite_index():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    base = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"telegram_id": uid, "thread_id": "t"} for uid in range(200)])
+        conn.execute(
+            insert(Entry),
+            [
+                {
+                    "telegram_id": i % 200,
+                    "event_time": base + timedelta(minutes=17 * i),
+                    "sugar_before": 5 + i % 7,
+                }
+                for i in range(200_000)
+            ],
+        )
+        conn.execute(text("ANALYZE"))
+
+        day_start, day_end = local_day_bounds(date(2021, 6, 1), timezone.utc)
+        for stmt in (
+            entries_in_range(7, base + timedelta(days=300)),
+            entries_in_range(7, day_start, day_end, newest_first=True),
+        ):
+            sql, params = _compile_sqlite(stmt, engine)
+            plan = " ".join(
+                str(row[-1]) for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, tuple(params))
+            )
+            assert INDEX_NAME in plan, plan
+            assert "TEMP B-TREE" not in plan, plan  # сортировка тоже из индекса
+    engine.dispose()
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_DATABASE_URL"),
+    reason="needs a scratch Postgres in TEST_DATABASE_URL",
+)
+def test_postgres_plan_and_latency_on_millions_of_rows():
+    """Синтетическая таблица на 3 млн строк: план — Index Scan, ответ — миллисекунды."""
+    engine = create_engine(os.environ["TEST_DATABASE_URL"])
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO users (telegram_id, thread_id) "
+                "SELECT g, 't' FROM generate_series(1, 5000) g"
+            ))
+            conn.execute(text(
+                "INSERT INTO entries (telegram_id, event_time, sugar_before) "
+                "SELECT 1 + g % 5000, "
+                "       timestamptz '2020-01-01' + g * interval '1 minute', "
+                "       5 + g % 7 "
+                "FROM generate_series(1, 3000000) g"
+            ))
+            conn.execute(text("ANALYZE entries"))
+
+        day_start, day_end = local_day_bounds(date(2022, 6, 1), ZoneInfo("Europe/Moscow"))
+        stmt = entries_in_range(42, day_start, day_end, newest_first=True)
+        compiled = stmt.compile(engine)
+        with engine.connect() as conn:
+            plan = [
+                row[0] for row in conn.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params)
+            ]
+            assert any(INDEX_NAME in line for line in plan), plan
+            assert not any("Seq Scan" in line for line in plan), plan
+
+            started = time.perf_counter()
+            conn.execute(stmt).all()
+            elapsed = time.perf_counter() - started
+        assert elapsed < 0.05, f"day lookup took {elapsed * 1000:.1f} ms"
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
@@ -0,0 +1,135 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
+import gpt_client
+
+
+def _run(status: str):
+    return SimpleNamespace(id="run_1", thread_id="th_1", status=status)
+
+
+def _message(text: str, role: str = "assistant"):
+    block = SimpleNamespace(type="text", text=SimpleNamespace(value=text))
+    return SimpleNamespace(role=role, content=[block])
+
+
+class FakeStream:
+    def __init__(self, events, final_status):
+        self.events = events
+        self.final_status = final_status
+        self.current_run = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        self.current_run = _run("queued")
+        for event in self.events:
+            yield event
+        self.current_run = _run(self.final_status)
+
+
+def _fake_client(final_status="completed", polls_until_done=2):
+    statuses = ["in_progress"] * (polls_until_done - 1) + [final_status]
+    runs = SimpleNamespace(
+        create=AsyncMock(return_value=_run("queued")),
+        retrieve=AsyncMock(side_effect=[_run(s) for s in statuses]),
+        stream=lambda **kw: FakeStream(
+            [
+                SimpleNamespace(event="thread.message.completed", data=_message("Углеводы: 40 г")),
+            ],
+            final_status,
+        ),
+    )
+    messages = SimpleNamespace(
+        create=AsyncMock(),
+        list=AsyncMock(return_value=SimpleNamespace(data=[_message("Углеводы: 40 г")])),
+    )
+    files = SimpleNamespace(create=AsyncMock(return_value=SimpleNamespace(id="file_1")))
+    return SimpleNamespace(
+        beta=SimpleNamespace(threads=SimpleNamespace(runs=runs, messages=messages)), files=files
+    )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def install(**kwargs):
+        fake = _fake_client(**kwargs)
+        monkeypatch.setattr(gpt_client, "client", fake)
+        return fake
+    return install
+
+
+@pytest.mark.asyncio
+async def test_streaming_run_returns_final_message(client, monkeypatch):
+    monkeypatch.setattr(gpt_client, "OPENAI_STREAM_RUNS", True)
+    fake = client()
+    assert await gpt_client.ask_assistant("th_1", content="фото") == "Углеводы: 40 г"
+    fake.beta.threads.messages.create.assert_awaited_once()
+    # ни опроса, ни чтения всего thread
+    fake.beta.threads.runs.retrieve.assert_not_awaited()
+    fake.beta.threads.messages.list.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_streaming_run_failure_raises(client, monkeypatch):
+    monkeypatch.setattr(gpt_client, "OPENAI_STREAM_RUNS", True)
+    client(final_status="failed")
+    with pytest.raises(gpt_client.RunFailedError) as exc_info:
+        await gpt_client.ask_assistant("th_1", content="фото")
+    assert exc_info.value.status == "failed"
+
+
+@pytest.mark.asyncio
+async def test_polling_fallback_backs_off_and_reads_one_message(client, monkeypatch):
+    monkeypatch.setattr(gpt_client, "OPENAI_STREAM_RUNS", False)
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(gpt_client.asyncio, "sleep", fake_sleep)
+    fake = client(polls_until_done=3)
+    assert await gpt_client.ask_assistant("th_1", content="фото") == "Углеводы: 40 г"
+    assert delays == pytest.approx([0.2, 0.3, 0.45])
+    fake.beta.threads.messages.list.assert_awaited_once_with(
+        thread_id="th_1", run_id="run_1", order="desc", limit=1
+    )
+
+
+@pytest.mark.asyncio
+async def test_polling_fallback_failed_run_raises(client, monkeypatch):
+    monkeypatch.setattr(gpt_client, "OPENAI_STREAM_RUNS", False)
+    monkeypatch.setattr(gpt_client.asyncio, "sleep", AsyncMock())
+    client(final_status="expired", polls_until_done=1)
+    with pytest.raises(gpt_client.RunFailedError):
+        await gpt_client.ask_assistant("th_1", content="фото")
+
+
+@pytest.mark.asyncio
+async def test_ask_assistant_requires_content():
+    with pytest.raises(ValueError):
+        await gpt_client.ask_assistant("th_1")
+
+
+@pytest.mark.asyncio
+async def test_image_bytes_are_uploaded_from_memory(client, monkeypatch):
+    monkeypatch.setattr(gpt_client, "OPENAI_STREAM_RUNS", True)
+    fake = client()
+    await gpt_client.ask_assistant("th_1", content="фото", image=b"jpeg-bytes", image_name="1_abc.jpg")
+    fake.files.create.assert_awaited_once_with(file=("1_abc.jpg", b"jpeg-bytes"), purpose="vision")
+    content = fake.beta.threads.messages.create.await_args.kwargs["content"]
+    assert content[0] == {"type": "image_file", "image_file": {"file_id": "file_1"}}
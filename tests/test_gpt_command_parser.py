@@ -0,0 +1,51 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
+import gpt_command_parser
+
+
+def _completion(content: str):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def create(monkeypatch):
+    mock = AsyncMock()
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=mock)))
+    monkeypatch.setattr(gpt_command_parser, "client", fake_client)
+    return mock
+
+
+@pytest.mark.asyncio
+async def test_parse_command_awaits_shared_client(create):
+    create.return_value = _completion('{"action": "add_entry", "fields": {"carbs_g": 30}}')
+    result = await gpt_command_parser.parse_command("съел тарелку борща")
+    assert result == {"action": "add_entry", "fields": {"carbs_g": 30}}
+    create.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_parse_command_routine_message_skips_llm(create):
+    result = await gpt_command_parser.parse_command("3 ХЕ, сахар 7.5")
+    assert result == {"action": "add_entry", "fields": {"xe": 3.0, "sugar_before": 7.5}}
+    create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_parse_command_invalid_json_returns_none(create):
+    create.return_value = _completion("not json")
+    assert await gpt_command_parser.parse_command("что-то") is None
+
+
+@pytest.mark.asyncio
+async def test_parse_command_api_error_returns_none(create):
+    create.side_effect = RuntimeError("boom")
+    assert await gpt_command_parser.parse_command("что-то") is None
@@ -0,0 +1,67 @@
+import io
+import os
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
+import image_prep
+
+
+def _encode(img: Image.Image, fmt: str, **kwargs) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def test_pick_photo_takes_smallest_size_large_enough():
+    sizes = [SimpleNamespace(width=w, height=w * 3 // 4) for w in (1280, 90, 800, 320)]
+
+    assert image_prep.pick_photo(sizes, min_edge=800).width == 800
+    assert image_prep.pick_photo(sizes, min_edge=2000).width == 1280
+
+
+def test_downscale_shrinks_and_strips_exif():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # повёрнуто на 90° — после пережатия поворот применён к пикселям
+    exif[0x010F] = "Phone"
+    data = _encode(Image.new("RGB", (4000, 3000), "red"), "JPEG", exif=exif.tobytes())
+
+    out = image_prep.downscale(data, max_edge=1280)
+
+    with Image.open(io.BytesIO(out)) as img:
+        assert img.format == "JPEG"
+        assert img.size == (960, 1280)
+        assert not img.info.get("exif")
+    assert len(out) < len(data)
+
+
+def test_downscale_flattens_transparent_png():
+    data = _encode(Image.new("RGBA", (2000, 1000), (0, 0, 0, 0)), "PNG")
+
+    out = image_prep.downscale(data, max_edge=1000)
+
+    with Image.open(io.BytesIO(out)) as img:
+        assert (img.format, img.mode, img.size) == ("JPEG", "RGB", (1000, 500))
+        assert img.getpixel((10, 10)) == (255, 255, 255)
+
+
+def test_downscale_keeps_small_clean_jpeg_and_rejects_garbage():
+    data = _encode(Image.new("RGB", (640, 480), "blue"), "JPEG")
+
+    assert image_prep.downscale(data, max_edge=1280) is data
+    assert image_prep.downscale(b"not an image") is None
+
+
+@pytest.mark.asyncio
+async def test_prepare_runs_in_pool():
+    data = _encode(Image.new("RGB", (3000, 3000), "green"), "PNG")
+
+    out = await image_prep.prepare(data)
+
+    with Image.open(io.BytesIO(out)) as img:
+        assert max(img.size) == image_prep.VISION_IMAGE_MAX_EDGE
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from local_command_parser import parse_local
+
+CORPUS = [json.loads(line) for line in (Path(__file__).parent / "data" / "parser_corpus.jsonl").open(encoding="utf-8")]
+THRESHOLD = 0.9
+
+
+def _confident(text):
+    result, confidence = parse_local(text)
+    return result if result is not None and confidence >= THRESHOLD else None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("5 ХЕ, сахар 9, уколол 4 ед", {"action": "add_entry", "fields": {"xe": 5.0, "sugar_before": 9.0, "dose": 4.0}}),
+    ("сахар 6,2", {"action": "add_entry", "fields": {"sugar_before": 6.2}}),
+    ("в 13:30 60 г углеводов", {"action": "add_entry", "time": "13:30", "fields": {"carbs_g": 60.0}}),
+    ("04.05.2025 в 20:00 6 ед", {"action": "add_entry", "entry_date": "2025-05-04T20:00:00", "fields": {"dose": 6.0}}),
+    ("напомни измерить сахар в 21:00", {"action": "set_reminder", "time": "21:00", "message": "измерить сахар"}),
+])
+def test_routine_messages(text, expected):
+    assert _confident(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "удали последнюю запись",
+    "вчера в 19:00 съел 3 хе",
+    "сахар 5 и сахар 7",
+    "съел тарелку борща",
+    "съел 200 г",
+    "поел 50 г, сахар 8",
+    "напомни через 2 часа измерить сахар",
+    "",
+])
+def test_ambiguous_messages_left_to_llm(text):
+    assert _confident(text) is None
+
+
+def test_matches_expected_on_corpus():
+    handled = 0
+    for item in CORPUS:
+        result = _confident(item["text"])
+        if result is None:
+            continue
+        handled += 1
+        # локальный разбор обязан совпадать с размеченным вручную эталоном
+        assert result == item["expected"], item["text"]
+    # рутинные записи — основная часть трафика, большую их долю берём локально
+    routine = sum(1 for item in CORPUS
+                  if item["expected"] and item["expected"]["action"] in ("add_entry", "set_reminder"))
+    assert handled >= 0.7 * routine
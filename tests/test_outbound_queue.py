@@ -0,0 +1,207 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from outbound_queue import PRIORITY_INTERACTIVE, PRIORITY_REMINDER, OutboundQueue, in_queue_worker, not_sent
+
+
+class FloodWait(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+
+
+def recorder(log, item, delay=0.0):
+    async def call():
+        if delay:
+            await asyncio.sleep(delay)
+        log.append(item)
+        return item
+    return call
+
+
+@pytest.mark.asyncio
+async def test_interactive_replies_overtake_queued_reminders():
+    queue = OutboundQueue(rate=20, workers=1)
+    log = []
+    try:
+        reminders = [queue.enqueue(i, recorder(log, f"r{i}"), PRIORITY_REMINDER) for i in range(8)]
+        await asyncio.sleep(0.01)
+        reply = queue.enqueue(99, recorder(log, "reply"), PRIORITY_INTERACTIVE)
+        await asyncio.gather(reply, *reminders)
+    finally:
+        await queue.stop()
+    # первое напоминание ушло сразу, следующий токен достался ответу
+    assert log.index("reply") <= 2
+    assert queue.stats()["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_messages_to_one_chat_keep_order_with_many_workers():
+    queue = OutboundQueue(rate=1000, workers=8)
+    log = []
+    rnd = random.Random(1)
+    try:
+        futures = [
+            queue.enqueue(i % 3, recorder(log, (i % 3, i), delay=rnd.random() / 100))
+            for i in range(60)
+        ]
+        await asyncio.gather(*futures)
+    finally:
+        await queue.stop()
+    for chat in range(3):
+        sent = [i for c, i in log if c == chat]
+        assert sent == sorted(sent)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_caps_rate():
+    queue = OutboundQueue(rate=20, workers=4)
+    start = time.monotonic()
+    try:
+        await asyncio.gather(*(queue.enqueue(i, recorder([], i)) for i in range(30)))
+    finally:
+        await queue.stop()
+    # 30 сообщений при 20 в секунду — не быстрее 1.45 с
+    assert time.monotonic() - start >= 1.4
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_resends():
+    queue = OutboundQueue(rate=1000, workers=2)
+    attempts = []
+
+    async def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise FloodWait(0.2)
+        return "ok"
+
+    try:
+        assert await queue.submit(1, flaky) == "ok"
+    finally:
+        await queue.stop()
+    assert attempts[1] - attempts[0] >= 0.19
+    stats = queue.stats()
+    assert (stats["rate_limited"], stats["sent"], stats["failed"]) == (1, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_transient_failure_dropped_after_max_attempts():
+    queue = OutboundQueue(rate=1000, workers=1, max_attempts=3,
+                          retryable=lambda exc: isinstance(exc, ConnectionError))
+
+    async def broken():
+        raise ConnectionError("boom")
+
+    try:
+        with pytest.raises(ConnectionError):
+            await queue.submit(1, broken)
+    finally:
+        await queue.stop()
+    assert (queue.stats()["retried"], queue.stats()["failed"]) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_other_errors_are_not_retried():
+    queue = OutboundQueue(rate=1000, workers=1, max_attempts=3)
+    calls = []
+
+    async def rejected():
+        calls.append(1)
+        raise RuntimeError("Forbidden: bot was blocked by the user")
+
+    try:
+        with pytest.raises(RuntimeError):
+            await queue.submit(1, rejected)
+    finally:
+        await queue.stop()
+    assert calls == [1]
+    assert (queue.stats()["retried"], queue.stats()["failed"]) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_backoff_does_not_hold_a_worker():
+    queue = OutboundQueue(rate=1000, workers=1, max_attempts=2,
+                          retryable=lambda exc: isinstance(exc, ConnectionError))
+    log = []
+
+    async def flaky():
+        log.append("flaky")
+        if log.count("flaky") == 1:
+            raise ConnectionError("boom")
+        return "ok"
+
+    try:
+        first = queue.enqueue(1, flaky)
+        await asyncio.sleep(0.01)
+        # единственный воркер свободен, пока чат 1 ждёт повтора
+        assert await asyncio.wait_for(queue.submit(2, recorder(log, "other")), 0.2) == "other"
+        assert await first == "ok"
+    finally:
+        await queue.stop()
+    assert log == ["flaky", "other", "flaky"]
+
+
+def test_only_unsent_requests_are_retryable():
+    error = pytest.importorskip("telegram.error")
+    httpx = pytest.importorskip("httpx")
+
+    def wrapped(exc_type, cause):
+        try:
+            raise exc_type("x") from cause
+        except exc_type as exc:
+            return exc
+
+    assert not_sent(wrapped(error.NetworkError, httpx.ConnectError("refused")))
+    assert not_sent(wrapped(error.TimedOut, httpx.PoolTimeout("pool")))
+    assert not not_sent(wrapped(error.TimedOut, httpx.ReadTimeout("read")))
+    assert not not_sent(error.BadRequest("Chat not found"))
+    assert not not_sent(error.Forbidden("blocked"))
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_routes_bot_requests_through_queue():
+    from bot.rate_limiter import OutboundRateLimiter
+
+    queue = OutboundQueue(rate=1000, workers=1)
+    limiter = OutboundRateLimiter(queue)
+    seen = []
+
+    async def callback(*args, **kwargs):
+        seen.append(in_queue_worker.get())
+        return True
+
+    try:
+        await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": 5}, None)
+        await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": 5},
+                                      {"priority": PRIORITY_REMINDER})
+    finally:
+        await limiter.shutdown()
+    assert seen == [True, True]
+    assert queue.stats()["sent"] == 2
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_passes_non_message_requests_through():
+    from bot.rate_limiter import OutboundRateLimiter
+
+    queue = OutboundQueue(rate=1000, workers=1)
+    limiter = OutboundRateLimiter(queue)
+    seen = []
+
+    async def callback(*args, **kwargs):
+        seen.append(in_queue_worker.get())
+        return True
+
+    try:
+        for endpoint, data in [("getFile", {"file_id": "f"}), ("answerCallbackQuery", {"callback_query_id": "1"}),
+                               ("getMe", {}), ("setWebhook", {"url": "https://x"})]:
+            await limiter.process_request(callback, (), {}, endpoint, data, None)
+        await limiter.process_request(callback, (), {}, "editMessageText", {"chat_id": 5}, None)
+        await limiter.process_request(callback, (), {}, "copyMessage", {"chat_id": 5}, None)
+    finally:
+        await limiter.shutdown()
+    assert seen == [False, False, False, False, True, True]
+    assert queue.stats()["sent"] == 2
@@ -0,0 +1,193 @@
+import asyncio
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
+import bot.handlers as handlers
+from vision_cache import VisionResult
+from vision_queue import VisionQueue
+
+
+def _update_with_file(tmp_path, context):
+    image = tmp_path / "meal.jpg"
+    image.write_bytes(b"jpeg-bytes")
+    context.user_data["__file_path"] = str(image)
+    message = SimpleNamespace(reply_text=AsyncMock())
+    return SimpleNamespace(message=message, effective_user=SimpleNamespace(id=1))
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_assistant(tmp_path, monkeypatch):
+    context = SimpleNamespace(user_data={})
+    update = _update_with_file(tmp_path, context)
+    monkeypatch.setattr(
+        handlers.vision_cache, "lookup", AsyncMock(return_value=VisionResult("Углеводы: 40 г", 40.0, None))
+    )
+    ask = AsyncMock()
+    monkeypatch.setattr(handlers, "ask_assistant", ask)
+    monkeypatch.setattr(handlers, "create_thread", AsyncMock())
+
+    result = await handlers.photo_handler(update, context)
+
+    assert result == handlers.PHOTO_SUGAR
+    ask.assert_not_awaited()
+    assert context.user_data["carbs"] == 40.0
+    assert not handlers.user_locks(1).locked()
+
+
+@pytest.mark.asyncio
+async def test_second_photo_of_same_user_is_rejected_while_busy(tmp_path, monkeypatch):
+    context = SimpleNamespace(user_data={})
+    update = _update_with_file(tmp_path, context)
+    monkeypatch.setattr(handlers.vision_cache, "lookup", AsyncMock(return_value=None))
+    monkeypatch.setattr(handlers, "create_thread", AsyncMock(return_value="th_1"))
+    release = asyncio.Event()
+
+    async def slow_assistant(*args, **kwargs):
+        await release.wait()
+        return "ХЕ: 3"
+
+    monkeypatch.setattr(handlers, "ask_assistant", slow_assistant)
+    monkeypatch.setattr(handlers.vision_cache, "store", AsyncMock())
+
+    first = asyncio.create_task(handlers.photo_handler(update, context))
+    await asyncio.sleep(0.05)
+    other_context = SimpleNamespace(user_data={})
+    second_update = _update_with_file(tmp_path, other_context)
+    second = await handlers.photo_handler(second_update, other_context)
+    release.set()
+
+    assert second == handlers.ConversationHandler.END
+    second_update.message.reply_text.assert_awaited_once_with("⏳ Уже обрабатываю фото, подождите…")
+    assert await first == handlers.PHOTO_SUGAR
+    assert not handlers.user_locks(1).locked()
+
+
+@pytest.mark.asyncio
+async def test_cache_miss_runs_assistant_and_stores(tmp_path, monkeypatch):
+    context = SimpleNamespace(user_data={})
+    update = _update_with_file(tmp_path, context)
+    monkeypatch.setattr(handlers.vision_cache, "lookup", AsyncMock(return_value=None))
+    store = AsyncMock()
+    monkeypatch.setattr(handlers.vision_cache, "store", store)
+    monkeypatch.setattr(handlers, "ask_assistant", AsyncMock(return_value="ХЕ: 3"))
+    monkeypatch.setattr(handlers, "create_thread", AsyncMock(return_value="th_1"))
+
+    result = await handlers.photo_handler(update, context)
+
+    assert result == handlers.PHOTO_SUGAR
+    store.assert_awaited_once_with(b"jpeg-bytes", VisionResult("ХЕ: 3", None, 3.0))
+
+
+@pytest.mark.asyncio
+async def test_photo_goes_to_vision_from_memory(tmp_path, monkeypatch):
+    class FakeFile:
+        async def download_to_memory(self, out):
+            out.write(b"jpeg-bytes")
+
+        async def download_to_drive(self, *args, **kwargs):
+            raise AssertionError("photo must not be downloaded to disk")
+
+    sizes = [
+        SimpleNamespace(file_id=f"f{width}", file_unique_id=f"u{width}", width=width, height=width * 3 // 4)
+        for width in (90, 320, 800, 1280)
+    ]
+    message = SimpleNamespace(reply_text=AsyncMock(), photo=sizes)
+    update = SimpleNamespace(message=message, effective_user=SimpleNamespace(id=1))
+    get_file = AsyncMock(return_value=FakeFile())
+    context = SimpleNamespace(user_data={}, bot=SimpleNamespace(get_file=get_file))
+    monkeypatch.setattr(handlers.photo_storage, "PHOTOS_DIR", str(tmp_path))
+    monkeypatch.setattr(handlers.vision_cache, "lookup", AsyncMock(return_value=None))
+    monkeypatch.setattr(handlers.vision_cache, "store", AsyncMock())
+    monkeypatch.setattr(handlers, "create_thread", AsyncMock(return_value="th_1"))
+    ask = AsyncMock(return_value="Углеводы: 40 г")
+    monkeypatch.setattr(handlers, "ask_assistant", ask)
+
+    result = await handlers.photo_handler(update, context)
+
+    assert result == handlers.PHOTO_SUGAR
+    get_file.assert_awaited_once_with("f800")
+    assert ask.await_args.kwargs["image"] == b"jpeg-bytes"
+    assert ask.await_args.kwargs["image_name"] == "1_u800.jpg"
+    await handlers.photo_storage.drain()
+    assert (tmp_path / "1_u800.jpg").read_bytes() == b"jpeg-bytes"
+    assert context.user_data["photo_path"] == str(tmp_path / "1_u800.jpg")
+
+
+@pytest.mark.asyncio
+async def test_cancel_removes_photo_waiting_in_vision_queue(tmp_path, monkeypatch):
+    queue = VisionQueue(workers=1)
+    monkeypatch.setattr(handlers, "vision_queue", queue)
+    monkeypatch.setattr(handlers.vision_cache, "lookup", AsyncMock(return_value=None))
+    monkeypatch.setattr(handlers, "create_thread", AsyncMock(return_value="th_1"))
+    ask = AsyncMock(return_value="ХЕ: 3")
+    monkeypatch.setattr(handlers, "ask_assistant", ask)
+    other_user = asyncio.Event()
+    queue.submit(2, other_user.wait)
+    context = SimpleNamespace(user_data={})
+    update = _update_with_file(tmp_path, context)
+
+    try:
+        task = asyncio.create_task(handlers.photo_handler(update, context))
+        await asyncio.sleep(0.01)
+        update.message.reply_text.assert_awaited_with(
+            "🕒 Вы №1 в очереди на распознавание. /cancel — отменить."
+        )
+        await handlers.photo_cancel_handler(update, context)
+        assert await task == handlers.ConversationHandler.END
+    finally:
+        other_user.set()
+        await queue.stop()
+
+    ask.assert_not_awaited()
+    assert update.message.reply_text.await_args.args == ("❌ Распознавание фото отменено.",)
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_another_worker_suppresses_vision_reply(tmp_path, monkeypatch):
+    from state_persistence import MemoryStateStore, StatePersistence
+
+    queue_a = VisionQueue(workers=1)
+    monkeypatch.setattr(handlers, "vision_queue", queue_a)
+    monkeypatch.setattr(handlers.vision_cache, "lookup", AsyncMock(return_value=None))
+    monkeypatch.setattr(handlers.vision_cache, "store", AsyncMock())
+    monkeypatch.setattr(handlers, "create_thread", AsyncMock(return_value="th_1"))
+    release = asyncio.Event()
+
+    async def slow_assistant(*args, **kwargs):
+        await release.wait()
+        return "ХЕ: 3"
+
+    monkeypatch.setattr(handlers, "ask_assistant", slow_assistant)
+    store = MemoryStateStore()
+    worker_a = StatePersistence(store, refresh_after=0)
+    worker_b = StatePersistence(store, refresh_after=0)
+    context_a = SimpleNamespace(user_data={}, application=SimpleNamespace(persistence=worker_a))
+    update_a = _update_with_file(tmp_path, context_a)
+    context_b = SimpleNamespace(user_data={})
+    update_b = SimpleNamespace(message=SimpleNamespace(reply_text=AsyncMock()), effective_user=SimpleNamespace(id=1))
+
+    try:
+        task = asyncio.create_task(handlers.photo_handler(update_a, context_a))
+        await asyncio.sleep(0.01)
+        # у воркера B своя очередь без этого задания — он оставляет отметку
+        monkeypatch.setattr(handlers, "vision_queue", VisionQueue(workers=1))
+        await worker_b.refresh_user_data(1, context_b.user_data)
+        await handlers.photo_cancel_handler(update_b, context_b)
+        await worker_b.update_user_data(1, context_b.user_data)
+        await worker_b.flush()
+        release.set()
+        assert await task == handlers.ConversationHandler.END
+    finally:
+        await queue_a.stop()
+
+    update_b.message.reply_text.assert_awaited_once_with("❌ Действие отменено.", reply_markup=handlers.menu_keyboard)
+    replies = [call.args[0] for call in update_a.message.reply_text.await_args_list]
+    assert not any(reply.startswith("🍽️") for reply in replies)
+    assert "carbs" not in context_a.user_data
@@ -0,0 +1,24 @@
+import os
+import time
+
+import pytest
+
+import photo_storage
+
+
+@pytest.mark.asyncio
+async def test_save_later_is_optional(monkeypatch):
+    monkeypatch.setattr(photo_storage, "PHOTOS_DIR", "")
+    assert photo_storage.save_later("1_a.jpg", b"x") is None
+
+
+def test_prune_removes_only_old_files(tmp_path):
+    old, fresh = tmp_path / "old.jpg", tmp_path / "fresh.jpg"
+    old.write_bytes(b"o")
+    fresh.write_bytes(b"f")
+    week_ago = time.time() - 7 * 86400
+    os.utime(old, (week_ago, week_ago))
+
+    assert photo_storage.prune(tmp_path, max_age_days=3) == 1
+    assert not old.exists()
+    assert fresh.exists()
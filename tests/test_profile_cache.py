@@ -0,0 +1,67 @@
+import dataclasses
+
+import pytest
+
+import profile_cache as profile_cache_module
+from functions import PatientProfile
+from profile_cache import ProfileCache
+
+
+def test_hit_and_miss_counters():
+    cache = ProfileCache(maxsize=2, ttl=60)
+    assert cache.get(1) is None
+    cache.put(1, PatientProfile(10, 2, 6))
+    assert cache.get(1) == PatientProfile(10, 2, 6)
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = ProfileCache(maxsize=2, ttl=60)
+    cache.put(1, PatientProfile(10, 2, 6))
+    cache.put(2, PatientProfile(11, 2, 6))
+    cache.get(1)
+    cache.put(3, PatientProfile(12, 2, 6))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.get(3) is not None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(profile_cache_module.time, "monotonic", lambda: now[0])
+    cache = ProfileCache(maxsize=10, ttl=30)
+    cache.put(1, PatientProfile(10, 2, 6))
+    now[0] += 29
+    assert cache.get(1) is not None
+    now[0] += 2
+    assert cache.get(1) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_and_immutability():
+    cache = ProfileCache()
+    profile = PatientProfile(10, 2, 6)
+    cache.put(1, profile)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        profile.icr = 5
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+
+def test_put_after_invalidate_is_dropped():
+    cache = ProfileCache()
+    generation = cache.generation()
+    cache.invalidate(1)
+    cache.put(1, PatientProfile(10, 2, 6), generation)
+    assert cache.get(1) is None
+    cache.put(1, PatientProfile(12, 2, 6), cache.generation())
+    assert cache.get(1) == PatientProfile(12, 2, 6)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ProfileCache()
+    cache.put(1, PatientProfile(10, 2, 6))
+    cache.disable()
+    assert cache.get(1) is None
+    cache.put(1, PatientProfile(10, 2, 6))
+    assert cache.get(1) is None
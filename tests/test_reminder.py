@@ -1,13 +1,17 @@
 import asyncio
 from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
 import pytest
+import pytest_asyncio
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 import db_access
+import reminder_scheduler
 from db import Base
-from reminder_scheduler import schedule_reminder
+from outbound_queue import OutboundQueue
+from reminder_scheduler import ReminderDispatcher, next_occurrence, schedule_reminder
 
 
 class DummyBot:
@@ -18,6 +22,16 @@ class DummyBot:
         self.sent.append((chat_id, text))
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def dispatcher(monkeypatch):
+    # каждый тест идёт в своём event loop, диспетчер к нему привязан
+    dispatcher = ReminderDispatcher(outbound=OutboundQueue())
+    monkeypatch.setattr(reminder_scheduler, "dispatcher", dispatcher)
+    yield dispatcher
+    await dispatcher.stop()
+    await dispatcher.outbound.stop()
+
+
 @pytest.fixture
 def session(monkeypatch):
     engine = create_engine("sqlite:///:memory:")
@@ -42,3 +56,138 @@ async def test_reminder_creation_and_trigger(session):
     db_access.delete_reminder(reminders[0].id)
     assert db_access.get_reminders(1) == []
 
+
+
+@pytest.mark.asyncio
+async def test_rehydrate_schedules_only_pending_future_reminders(monkeypatch, async_session_factory):
+    from db import Reminder, User
+    from reminder_scheduler import rehydrate_reminders
+
+    monkeypatch.setattr(db_access, "AsyncSessionLocal", async_session_factory)
+    now = datetime.now(timezone.utc)
+    async with async_session_factory() as s:
+        s.add(User(telegram_id=1, thread_id="t"))
+        s.add_all([
+            Reminder(telegram_id=1, time=now - timedelta(minutes=5), message="past"),
+            Reminder(telegram_id=1, time=now + timedelta(seconds=1), message="pending"),
+            Reminder(telegram_id=1, time=now + timedelta(seconds=1), message="done",
+                     delivered_at=now),
+            Reminder(telegram_id=1, time=now - timedelta(minutes=5), message="daily", rule="daily"),
+        ])
+        await s.commit()
+
+    bot = DummyBot()
+    assert await rehydrate_reminders(bot) == 2
+    # повторный старт не дублирует напоминания с тем же id
+    assert await rehydrate_reminders(bot) == 2
+    assert len(reminder_scheduler.dispatcher) == 2
+    await asyncio.sleep(1.5)
+    # пропущенное ежедневное не отправляется задним числом, а ждёт завтра
+    assert bot.sent == [(1, "pending")]
+    assert await rehydrate_reminders(bot) == 1
+
+
+def test_next_occurrence_daily_keeps_local_time_across_dst():
+    tz = ZoneInfo("Europe/Berlin")
+    prev = datetime(2025, 3, 29, 8, 0, tzinfo=tz)  # суббота перед переходом на летнее время
+    nxt = next_occurrence("daily", prev, tz, now=prev)
+    assert nxt.astimezone(tz).replace(tzinfo=None) == datetime(2025, 3, 30, 8, 0)
+    assert nxt - prev == timedelta(hours=23)
+
+
+def test_next_occurrence_weekdays_skips_weekend():
+    tz = ZoneInfo("Europe/Moscow")
+    friday = datetime(2025, 5, 2, 8, 0, tzinfo=tz)
+    nxt = next_occurrence("weekdays", friday, tz, now=friday)
+    assert nxt.astimezone(tz).replace(tzinfo=None) == datetime(2025, 5, 5, 8, 0)
+
+
+def test_next_occurrence_hours_skips_missed_runs():
+    prev = datetime(2025, 5, 1, 8, 0, tzinfo=timezone.utc)
+    now = prev + timedelta(hours=7)
+    assert next_occurrence("hours:3", prev, timezone.utc, now=now) == prev + timedelta(hours=9)
+
+
+def test_dispatcher_pops_due_in_order_and_skips_cancelled():
+    dispatcher = ReminderDispatcher()
+    base = datetime(2025, 5, 1, tzinfo=timezone.utc)
+    for i, minutes in enumerate([30, 10, 20, 40], start=1):
+        dispatcher.schedule(i, 100 + i, base + timedelta(minutes=minutes), f"r{i}")
+    dispatcher.cancel(3)
+    dispatcher.schedule(4, 104, base + timedelta(minutes=5), "r4")  # перенос раньше
+    due = dispatcher.pop_due((base + timedelta(minutes=35)).timestamp())
+    assert [item[0] for item in due] == [4, 2, 1]
+    assert len(dispatcher) == 0
+
+
+@pytest.mark.asyncio
+async def test_recurring_reminder_moves_to_next_occurrence(monkeypatch, dispatcher):
+    moved = []
+
+    async def reschedule(reminder_id, next_time):
+        moved.append((reminder_id, next_time))
+
+    monkeypatch.setattr(reminder_scheduler, "reschedule_reminder_async", reschedule)
+    bot = DummyBot()
+    run_time = datetime.now(timezone.utc) + timedelta(milliseconds=200)
+    schedule_reminder(bot, 1, run_time, "pills", reminder_id=7, rule="hours:2")
+    await asyncio.sleep(0.5)
+    assert bot.sent == [(1, "pills")]
+    assert moved and moved[0][0] == 7
+    assert abs((moved[0][1] - run_time).total_seconds() - 7200) < 0.01
+    assert len(dispatcher) == 1
+
+
+class FailingBot(DummyBot):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Forbidden")
+        await super().send_message(chat_id, text)
+
+
+@pytest.mark.asyncio
+async def test_failed_one_shot_is_retried_not_marked_delivered(monkeypatch, dispatcher):
+    persisted = []
+
+    async def reschedule(reminder_id, next_time):
+        persisted.append(("moved", reminder_id))
+
+    async def delivered(reminder_id):
+        persisted.append(("delivered", reminder_id))
+
+    monkeypatch.setattr(reminder_scheduler, "reschedule_reminder_async", reschedule)
+    monkeypatch.setattr(reminder_scheduler, "mark_reminder_delivered_async", delivered)
+    monkeypatch.setattr(reminder_scheduler.config, "REMINDER_RETRY_DELAY", 0.2)
+    bot = FailingBot(failures=1)
+    schedule_reminder(bot, 1, datetime.now(timezone.utc), "pills", reminder_id=7)
+    await asyncio.sleep(0.1)
+    assert bot.sent == [] and persisted == [("moved", 7)]
+    await asyncio.sleep(0.4)
+    assert bot.sent == [(1, "pills")]
+    assert persisted == [("moved", 7), ("delivered", 7)]
+
+
+@pytest.mark.asyncio
+async def test_failed_recurring_retry_keeps_next_occurrence(monkeypatch, dispatcher):
+    moved = []
+
+    async def reschedule(reminder_id, next_time):
+        moved.append((reminder_id, next_time))
+
+    monkeypatch.setattr(reminder_scheduler, "reschedule_reminder_async", reschedule)
+    monkeypatch.setattr(reminder_scheduler.config, "REMINDER_RETRY_DELAY", 0.2)
+    monkeypatch.setattr(reminder_scheduler.config, "REMINDER_RETRY_ATTEMPTS", 1)
+    bot = FailingBot(failures=2)
+    run_time = datetime.now(timezone.utc)
+    schedule_reminder(bot, 1, run_time, "pills", reminder_id=7, rule="hours:2")
+    await asyncio.sleep(0.5)
+    # одна неудачная повторная попытка, дальше ждём следующего раза по правилу
+    assert bot.sent == []
+    assert [r for r, _ in moved] == [7]
+    assert abs((moved[0][1] - run_time).total_seconds() - 7200) < 0.01
+    assert len(dispatcher) == 1
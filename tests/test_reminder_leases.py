@@ -0,0 +1,171 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import db_access
+from db import Base, Reminder, User
+from outbound_queue import OutboundQueue
+from reminder_scheduler import ReminderDispatcher, ReminderLeaser
+
+
+class RecordingBot:
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        self.log.append((self.name, text))
+
+
+async def _fill(factory, count, due_in=0.3):
+    due = datetime.now(timezone.utc) + timedelta(seconds=due_in)
+    async with factory() as s:
+        s.add(User(telegram_id=1, thread_id="t"))
+        s.add_all(Reminder(telegram_id=1, time=due, message=f"r{i}") for i in range(count))
+        await s.commit()
+
+
+@pytest_asyncio.fixture
+async def file_session_factory(tmp_path, monkeypatch):
+    # отдельное соединение на сессию: с общим соединением StaticPool закрытие
+    # одной сессии откатывает незакоммиченные изменения другой
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'reminders.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(db_access, "AsyncSessionLocal", factory)
+    yield factory
+    await engine.dispose()
+
+
+def _worker(name, log, **kwargs):
+    dispatcher = ReminderDispatcher(outbound=OutboundQueue(rate=1000))
+    leaser = ReminderLeaser(dispatcher, worker_id=name, poll=0.05, horizon=5, batch=7, **kwargs)
+    leaser.start(RecordingBot(name, log))
+    return leaser
+
+
+async def _stop(*leasers):
+    for leaser in leasers:
+        await leaser.stop()
+        await leaser.dispatcher.stop()
+        await leaser.dispatcher.outbound.stop()
+
+
+async def _wait_delivered(factory, count, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        async with factory() as s:
+            done = len(list(await s.scalars(select(Reminder.id).where(Reminder.delivered_at.is_not(None)))))
+        if done == count:
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"only {done} of {count} reminders delivered")
+
+
+@pytest.mark.asyncio
+async def test_leased_reminders_are_not_claimed_twice(file_session_factory):
+    await _fill(file_session_factory, 20)
+    log = []
+    # в SQLite нет SKIP LOCKED, поэтому экземпляры забирают по очереди;
+    # параллельный разбор проверяется на Postgres ниже
+    a = ReminderLeaser(ReminderDispatcher(outbound=OutboundQueue(rate=1000)), worker_id="a",
+                       horizon=5, batch=7)
+    b = ReminderLeaser(ReminderDispatcher(outbound=OutboundQueue(rate=1000)), worker_id="b",
+                       horizon=5, batch=7)
+    assert await a.claim() == 20
+    assert await b.claim() == 0
+    a.start(RecordingBot("a", log))
+    try:
+        await _wait_delivered(file_session_factory, 20)
+    finally:
+        await _stop(a, b)
+    assert sorted(text for _, text in log) == sorted(f"r{i}" for i in range(20))
+    async with file_session_factory() as s:
+        claimed = list(await s.scalars(select(Reminder.claimed_by)))
+    assert claimed == [None] * 20
+
+
+@pytest.mark.asyncio
+async def test_dead_worker_reminders_picked_up_after_lease_expiry(file_session_factory):
+    await _fill(file_session_factory, 5, due_in=0.5)
+    now = datetime.now(timezone.utc)
+    # «мёртвый» экземпляр успел взять всё в аренду на 0.3 с и пропал
+    rows = await db_access.claim_due_reminders_async("dead", now + timedelta(seconds=5),
+                                                     now - timedelta(minutes=5),
+                                                     timedelta(seconds=0.3), 100)
+    assert len(rows) == 5
+
+    log = []
+    alive = ReminderLeaser(ReminderDispatcher(outbound=OutboundQueue(rate=1000)), worker_id="alive",
+                           horizon=5)
+    assert await alive.claim() == 0
+    await asyncio.sleep(0.35)
+    alive = _worker("alive", log)
+    try:
+        await _wait_delivered(file_session_factory, 5)
+    finally:
+        await _stop(alive)
+    assert {name for name, _ in log} == {"alive"}
+    assert len(log) == 5
+
+
+@pytest.mark.asyncio
+async def test_stale_one_shot_reminders_are_marked_skipped(file_session_factory):
+    now = datetime.now(timezone.utc)
+    async with file_session_factory() as s:
+        s.add(User(telegram_id=1, thread_id="t"))
+        s.add_all([
+            Reminder(id=1, telegram_id=1, time=now - timedelta(hours=2), message="stale"),
+            Reminder(id=2, telegram_id=1, time=now - timedelta(hours=2), message="daily", rule="daily"),
+            Reminder(id=3, telegram_id=1, time=now - timedelta(hours=2), message="leased",
+                     claimed_by="other", lease_expires_at=now + timedelta(minutes=1)),
+            Reminder(id=4, telegram_id=1, time=now, message="due"),
+        ])
+        await s.commit()
+
+    rows = await db_access.claim_due_reminders_async("w", now + timedelta(seconds=5),
+                                                     now - timedelta(minutes=5), timedelta(minutes=1), 100)
+    assert sorted(row[0] for row in rows) == [2, 4]
+    async with file_session_factory() as s:
+        delivered = {r.id: r.delivered_at for r in await s.scalars(select(Reminder))}
+    assert delivered[1] is not None
+    assert delivered[2] is None and delivered[3] is None and delivered[4] is None
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_DATABASE_URL"),
+    reason="needs a scratch Postgres in TEST_DATABASE_URL",
+)
+@pytest.mark.asyncio
+async def test_postgres_workers_split_load_without_double_delivery(monkeypatch):
+    """Четыре экземпляра над одной базой: каждое напоминание ровно один раз."""
+    url = make_url(os.environ["TEST_DATABASE_URL"]).set(drivername="postgresql+asyncpg")
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(db_access, "AsyncSessionLocal", factory)
+    try:
+        await _fill(factory, 400, due_in=0.5)
+        log = []
+        workers = [_worker(f"w{i}", log) for i in range(4)]
+        try:
+            await _wait_delivered(factory, 400, timeout=20)
+        finally:
+            await _stop(*workers)
+        texts = [text for _, text in log]
+        assert len(texts) == len(set(texts)) == 400
+        assert len({name for name, _ in log}) > 1
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
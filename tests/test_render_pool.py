@@ -0,0 +1,68 @@
+import asyncio
+import datetime
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
+import report_render
+from render_pool import RenderPool
+
+
+def _times(n):
+    start = datetime.datetime(2025, 5, 1, 8, 0)
+    return [start + datetime.timedelta(hours=6 * i) for i in range(n)]
+
+
+def test_render_chart_returns_png():
+    png = report_render.render_chart(_times(5), [5.5, 7.0, 9.1, 6.2, 8.0], "неделю")
+    assert png.startswith(b"\x89PNG")
+
+
+def test_render_pdf_draws_vector_chart_without_images():
+    pdf = report_render.render_pdf(["• Всего записей: 3"], [], ["01.05: сахар 5–7"], "Всё хорошо",
+                                   _times(3), [5.0, 6.0, 7.0], "неделю")
+    assert pdf.startswith(b"%PDF")
+    assert b"/Subtype /Image" not in pdf
+    assert report_render.render_pdf([], [], [], "").startswith(b"%PDF")
+
+
+def test_long_report_continues_on_next_pages():
+    days = [f"{d:02d}.05: сахар 5–7" for d in range(1, 91)]
+    pdf = report_render.render_pdf(["• Всего записей: 270"], [], days, "Совет.\n" * 80,
+                                   _times(270), [5.0 + i % 7 for i in range(270)], "квартал")
+    pages = int(re.search(rb"/Count (\d+)", pdf).group(1))
+    assert pages >= 4
+
+
+def test_importing_pool_does_not_load_matplotlib():
+    code = "import sys, render_pool; print('report_render' in sys.modules, 'matplotlib' in sys.modules)"
+    env = {**os.environ, "TELEGRAM_TOKEN": "x", "OPENAI_API_KEY": "x", "OPENAI_ASSISTANT_ID": "x"}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["False", "False"]
+
+
+@pytest.mark.asyncio
+async def test_pool_renders_in_workers_and_caps_concurrency():
+    pool = RenderPool(workers=1, max_concurrency=1)
+    try:
+        await pool.start()
+        results = await asyncio.gather(
+            *(pool.chart(_times(3), [5.0, 6.0, float(i)], "день") for i in range(3))
+        )
+        assert all(png.startswith(b"\x89PNG") for png in results)
+        stats = pool.stats()
+        assert stats["completed"] == 3
+        assert stats["queue_depth"] == 0
+        assert stats["running"] == 0
+        # при лимите 1 два из трёх заданий ждали своей очереди
+        assert stats["max_queue_depth"] == 2
+    finally:
+        pool.shutdown()
@@ -0,0 +1,122 @@
+import asyncio
+import datetime
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
+import report
+from report_cache import ReportCache
+
+
+class FakePool:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def chart(self, times, sugars, period_label):
+        self.calls.append("chart")
+        return b"png"
+
+    async def pdf(self, summary_lines, errors, day_lines, gpt_text, times, sugars, period_label):
+        self.calls.append(("pdf", gpt_text, sugars))
+        return b"pdf"
+
+
+@pytest.fixture
+def report_data(monkeypatch, tmp_path):
+    entries = [
+        SimpleNamespace(event_time=datetime.datetime(2025, 5, 1, 8), sugar_before=6.0,
+                        dose=4.0, carbs_g=40.0, xe=3.0),
+        SimpleNamespace(event_time=datetime.datetime(2025, 5, 1, 13), sugar_before=8.0,
+                        dose=5.0, carbs_g=60.0, xe=5.0),
+    ]
+    day = SimpleNamespace(
+        local_date=datetime.date(2025, 5, 1), entries=2,
+        sugar_count=2, sugar_sum=14.0, sugar_min=6.0, sugar_max=8.0, sugar_sumsq=100.0,
+        dose_count=2, dose_sum=9.0, dose_sumsq=41.0,
+        carbs_count=2, carbs_sum=100.0, carbs_sumsq=5200.0,
+    )
+    monkeypatch.setattr(report, "get_user_timezone_async", AsyncMock(return_value=datetime.timezone.utc))
+    monkeypatch.setattr(report, "get_data_version_async", AsyncMock(return_value="2025-01-01T00:00:00/7"))
+    monkeypatch.setattr(report, "get_daily_stats_async", AsyncMock(return_value=[day]))
+    monkeypatch.setattr(report, "get_report_series_async", AsyncMock(return_value=entries))
+    monkeypatch.setattr(report, "report_cache", ReportCache(str(tmp_path), max_bytes=10 ** 6))
+
+
+@pytest.mark.asyncio
+async def test_send_report_sends_summary_and_chart_before_gpt_finishes(report_data, monkeypatch):
+    calls = []
+    gpt_release = asyncio.Event()
+
+    async def create(**kwargs):
+        calls.append("gpt_started")
+        await gpt_release.wait()
+        message = SimpleNamespace(content="Всё в норме")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def reply_photo(photo, caption):
+        calls.append("photo")
+        # GPT всё ещё думает, а график уже у пользователя
+        assert not gpt_release.is_set()
+        gpt_release.set()
+
+    sent = SimpleNamespace(edit_text=AsyncMock())
+    message = SimpleNamespace(
+        reply_text=AsyncMock(return_value=sent),
+        reply_photo=reply_photo,
+        reply_document=AsyncMock(),
+    )
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=1), message=message)
+    monkeypatch.setattr(report, "render_pool", FakePool(calls))
+    monkeypatch.setattr(report, "client", SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+
+    await report.send_report(update, None, datetime.datetime(2025, 5, 1), "неделю")
+
+    assert "⏳" in message.reply_text.call_args.args[0]
+    summary = message.reply_text.call_args.args[0]
+    assert "Средний сахар: 7.0 ммоль/л (разброс ±1.0)" in summary
+    assert "01.05: сахар 6.0–8.0, доза 9.0, углеводы 100.0" in summary
+    report.get_daily_stats_async.assert_awaited_once_with(1, datetime.date(2025, 5, 1))
+    assert "Всё в норме" in sent.edit_text.call_args.args[0]
+    assert calls[-1] == ("pdf", "Всё в норме", [6.0, 8.0])
+    assert calls.index("gpt_started") < calls.index("photo")
+    message.reply_document.assert_awaited_once()
+
+
+def _message():
+    sent = SimpleNamespace(edit_text=AsyncMock())
+    return SimpleNamespace(
+        reply_text=AsyncMock(return_value=sent), reply_photo=AsyncMock(), reply_document=AsyncMock(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_repeated_report_served_from_cache_until_data_changes(report_data, monkeypatch):
+    message = SimpleNamespace(content="Всё в норме")
+    create = AsyncMock(return_value=SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+    monkeypatch.setattr(report, "render_pool", FakePool([]))
+    monkeypatch.setattr(report, "client", SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+
+    first, second = _message(), _message()
+    for msg in (first, second):
+        update = SimpleNamespace(effective_user=SimpleNamespace(id=1), message=msg)
+        await report.send_report(update, None, datetime.datetime(2025, 5, 1), "неделю")
+
+    assert create.await_count == 1
+    report.get_daily_stats_async.assert_awaited_once()
+    text = second.reply_text.call_args.args[0]
+    assert "Всё в норме" in text and "⏳" not in text
+    assert second.reply_photo.call_args.args[0].getvalue() == b"png"
+    assert second.reply_document.call_args.args[0].getvalue() == b"pdf"
+
+    monkeypatch.setattr(report, "get_data_version_async", AsyncMock(return_value="2025-01-01T00:00:00/8"))
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=1), message=_message())
+    await report.send_report(update, None, datetime.datetime(2025, 5, 1), "неделю")
+    assert create.await_count == 2
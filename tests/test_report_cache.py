@@ -0,0 +1,69 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
+from report_cache import ReportArtifacts, ReportCache
+
+
+def _artifacts(size: int) -> ReportArtifacts:
+    return ReportArtifacts("<b>Отчёт</b>", b"p" * size, "Всё в норме", b"%PDF")
+
+
+def test_key_depends_on_period_and_data_version():
+    key = ReportCache.key(1, date(2025, 5, 1), "неделю", "2025-01-01T00:00:00/3")
+    assert key.startswith("1_")
+    assert key == ReportCache.key(1, date(2025, 5, 1), "неделю", "2025-01-01T00:00:00/3")
+    assert key != ReportCache.key(1, date(2025, 5, 1), "неделю", "2025-01-01T00:00:00/4")
+    assert key != ReportCache.key(1, date(2025, 5, 2), "неделю", "2025-01-01T00:00:00/3")
+    # тот же счётчик после /reset и повторной регистрации
+    assert key != ReportCache.key(1, date(2025, 5, 1), "неделю", "2025-06-01T00:00:00/3")
+
+
+def test_file_is_json_line_plus_raw_bytes(tmp_path):
+    cache = ReportCache(str(tmp_path), max_bytes=10 ** 6)
+    artifacts = ReportArtifacts("<b>Отчёт</b>\nстрока", b"\x89PNG\n", "Анализ\n", b"%PDF\n")
+    cache.put_sync("1_a", artifacts)
+    line, _, blob = (tmp_path / "1_a.report").read_bytes().partition(b"\n")
+    assert json.loads(line)["header"] == "<b>Отчёт</b>\nстрока"
+    assert blob == b"\x89PNG\n%PDF\n"
+    assert cache.get_sync("1_a") == artifacts
+
+
+def test_evicts_least_recently_used_over_size_limit(tmp_path):
+    cache = ReportCache(str(tmp_path), max_bytes=2500)
+    cache.put_sync("1_a", _artifacts(1000))
+    cache.put_sync("1_b", _artifacts(1000))
+    assert cache.get_sync("1_a").gpt_text == "Всё в норме"  # «a» теперь свежее «b»
+    cache.put_sync("2_c", _artifacts(1000))
+
+    assert cache.get_sync("1_b") is None
+    assert cache.get_sync("1_a") is not None and cache.get_sync("2_c") is not None
+    stats = cache.stats()
+    assert (stats["files"], stats["evictions"], stats["misses"]) == (2, 1, 1)
+    assert stats["bytes"] <= 2500
+
+    # индекс поднимается с диска после перезапуска
+    reopened = ReportCache(str(tmp_path), max_bytes=2500)
+    assert reopened.invalidate_user_sync(1) == 1
+    assert reopened.get_sync("1_a") is None and reopened.get_sync("2_c") is not None
+
+
+def test_unreadable_file_is_a_miss(tmp_path):
+    cache = ReportCache(str(tmp_path), max_bytes=10 ** 6)
+    (tmp_path / "1_x.report").write_bytes(b'{"header": "", "gpt_text": "", "chart_png": 5, "pdf_bytes": 5}\nshort')
+    assert cache.get_sync("1_x") is None
+    assert not (tmp_path / "1_x.report").exists()
+
+
+@pytest.mark.asyncio
+async def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ReportCache("", max_bytes=10 ** 6)
+    await cache.put("1_a", _artifacts(10))
+    assert await cache.get("1_a") is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,76 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
+import report_prompt
+
+MOSCOW = ZoneInfo("Europe/Moscow")
+
+
+def _entry(day: int, hour: int, sugar, carbs=None, dose=None):
+    return SimpleNamespace(event_time=datetime(2025, 5, day, hour, tzinfo=timezone.utc),
+                           sugar_before=sugar, carbs_g=carbs, dose=dose)
+
+
+def _day(day: date, sugars: list[float]):
+    return SimpleNamespace(
+        local_date=day, entries=len(sugars), sugar_count=len(sugars), sugar_sum=sum(sugars),
+        sugar_min=min(sugars), sugar_max=max(sugars), dose_sum=12.0, carbs_sum=150.0,
+    )
+
+
+def test_episodes_merge_consecutive_out_of_range_readings():
+    entries = [
+        _entry(1, 5, 11.5), _entry(1, 7, 13.2), _entry(1, 9, 7.0),  # гипер из двух измерений
+        _entry(1, 12, 3.1), _entry(1, 22, 3.5),                     # разрыв 10 ч — два эпизода
+    ]
+    found = report_prompt.episodes(entries, MOSCOW)
+    assert [(kind, readings, extreme) for kind, _, readings, extreme in found] == [
+        ("гипер", 2, 13.2), ("гипо", 1, 3.1), ("гипо", 1, 3.5)]
+    assert found[0][1].hour == 8  # начало по местному времени
+    assert report_prompt.episode_lines(found, 1) == ["всего: гипо 2, гипер 1", "01.05 15:00 гипо 1 изм., пик 3.1"]
+
+
+def test_buckets_use_local_time_and_time_in_range():
+    entries = [_entry(1, 4, 6.0, carbs=50), _entry(1, 5, 12.0, carbs=70), _entry(1, 21, 5.0, dose=2)]
+    lines = report_prompt.bucket_lines(entries, MOSCOW)
+    assert lines == [
+        "ночь, сахар n=1 ср 5 [5–5] в диапазоне 100%, доза ср 2",
+        "утро, сахар n=2 ср 9 [6–12] в диапазоне 50%, угл ср 60",
+    ]
+
+
+def test_prompt_has_no_raw_rows_and_fits_budget_by_coarsening():
+    start = date(2025, 2, 1)
+    days = [_day(start + timedelta(days=i), [5.0, 7.5, 12.0]) for i in range(90)]
+    entries = [
+        SimpleNamespace(event_time=datetime(2025, 2, 1, h, tzinfo=timezone.utc) + timedelta(days=i),
+                        sugar_before=s, carbs_g=None, dose=None)
+        for i in range(90) for h, s in ((5, 5.0), (10, 7.5), (16, 12.0))
+    ]
+    summary = ["• Всего записей: 270"]
+
+    roomy = report_prompt.build_prompt("квартал", summary, days, entries, MOSCOW, 8.2, 2.9, budget=10 ** 6)
+    assert "По дням" in roomy and "01.02 n=3 сахар 8.2 [5–12]" in roomy
+
+    tight = report_prompt.build_prompt("квартал", summary, days, entries, MOSCOW, 8.2, 2.9, budget=900)
+    assert "По неделям" in tight and "01.02–07.02 n=21" in tight
+    assert report_prompt.count_tokens(tight) <= 900 < report_prompt.count_tokens(roomy)
+    assert "Выходы из диапазона:\nвсего: гипо 0, гипер 90" in tight
+
+
+def test_tokenizer_load_failure_falls_back_to_estimate(monkeypatch):
+    def offline(model):
+        raise OSError("cannot download BPE file")
+
+    monkeypatch.setattr(report_prompt, "tiktoken", SimpleNamespace(encoding_for_model=offline))
+    monkeypatch.setattr(report_prompt, "_encoding", None)
+    assert report_prompt.count_tokens("а" * 10) == 4
+    # повторно не пытается загрузить
+    monkeypatch.setattr(report_prompt.tiktoken, "encoding_for_model", None)
+    assert report_prompt.count_tokens("а" * 5) == 2
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+import pickle
+import re
+import subprocess
+import sys
+from collections import UserDict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from state_persistence import MemoryStateStore, SqlStateStore, StatePersistence, Write
+
+
+class FakeStates(UserDict):
+    """Stand-in for PTB's TrackingDict of a ConversationHandler."""
+
+    def update_no_track(self, mapping):
+        self.data.update(mapping)
+
+
+def _worker(store, **kwargs):
+    conv = SimpleNamespace(name="dose", _conversations=FakeStates())
+    persistence = StatePersistence(store, refresh_after=0, **kwargs)
+    persistence.register_conversations(conv)
+    return persistence, conv
+
+
+@pytest.mark.asyncio
+async def test_second_worker_continues_conversation():
+    store = MemoryStateStore()
+    a, conv_a = _worker(store)
+    b, conv_b = _worker(store)
+
+    await a.refresh_user_data(1, {})
+    await a.update_user_data(1, {"carbs": 40, "event_time": datetime(2025, 1, 1, tzinfo=timezone.utc)})
+    await a.update_conversation("dose", (1, 1), 3)
+    await a.flush()
+
+    user_data = {}
+    await b.refresh_user_data(1, user_data)
+    assert user_data == {"carbs": 40, "event_time": datetime(2025, 1, 1, tzinfo=timezone.utc)}
+    assert conv_b._conversations == {(1, 1): 3}
+
+    # B завершает диалог — A видит это при следующем апдейте
+    await b.update_conversation("dose", (1, 1), None)
+    await b.flush()
+    conv_a._conversations.data[(1, 1)] = 3
+    await a.refresh_user_data(1, {})
+    assert conv_a._conversations == {}
+    assert store.rows[1][0] == 2
+
+
+@pytest.mark.asyncio
+async def test_changes_are_written_back_in_one_batch():
+    class CountingStore(MemoryStateStore):
+        batches = []
+
+        async def save(self, writes):
+            self.batches.append(len(writes))
+            return await super().save(writes)
+
+    store = CountingStore()
+    persistence, _ = _worker(store)
+    await asyncio.gather(*(persistence.update_user_data(uid, {"n": uid}) for uid in range(50)))
+    # без изменений запись не нужна
+    await persistence.update_user_data(7, {"n": 7})
+    await asyncio.sleep(0.01)
+    assert store.batches == [50]
+    assert persistence.stats()["dirty"] == 0
+
+
+@pytest.mark.asyncio
+async def test_version_conflict_keeps_other_workers_state():
+    store = MemoryStateStore()
+    a, _ = _worker(store)
+    b, _ = _worker(store)
+    await a.refresh_user_data(1, {})
+    await b.refresh_user_data(1, {})
+
+    await a.update_user_data(1, {"who": "a"})
+    await a.flush()
+    await b.update_user_data(1, {"who": "b"})
+    await b.flush()
+    assert b.stats()["conflicts"] == 1
+
+    user_data = {"who": "b"}
+    await b.refresh_user_data(1, user_data)
+    assert user_data == {"who": "a"}
+
+
+@pytest.mark.asyncio
+async def test_recent_users_are_served_from_cache():
+    store = MemoryStateStore()
+    persistence = StatePersistence(store, refresh_after=60)
+    for _ in range(5):
+        await persistence.refresh_user_data(1, {})
+    assert persistence.stats()["loads"] == 1
+    assert persistence.stats()["hits"] == 4
+    assert persistence.stats()["checks"] == 0
+
+
+@pytest.mark.asyncio
+async def test_state_is_stored_as_json():
+    store = MemoryStateStore()
+    persistence, _ = _worker(store)
+    await persistence.update_user_data(1, {"pending_entry": {"event_time": datetime(2025, 1, 1, tzinfo=timezone.utc)}})
+    await persistence.update_conversation("dose", (1, 1), 3)
+    await persistence.flush()
+    assert json.loads(store.rows[1][1]) == {
+        "user_data": {"pending_entry": {"event_time": {"$datetime": "2025-01-01T00:00:00+00:00"}}},
+        "conversations": [["dose", [1, 1], 3]],
+    }
+
+
+@pytest.mark.asyncio
+async def test_legacy_pickle_row_starts_empty():
+    store = MemoryStateStore()
+    store.rows[1] = (4, pickle.dumps(({}, {})))
+    persistence, conv = _worker(store)
+    user_data = {"stale": True}
+    await persistence.refresh_user_data(1, user_data)
+    assert user_data == {} and conv._conversations == {}
+    await persistence.update_user_data(1, {"step": 1})
+    await persistence.flush()
+    assert store.rows[1][0] == 5
+
+
+@pytest.mark.asyncio
+async def test_lru_never_evicts_unsaved_changes():
+    persistence = StatePersistence(MemoryStateStore(), maxsize=2)
+    await persistence.update_user_data(1, {"a": 1})
+    for uid in (2, 3, 4):
+        await persistence.refresh_user_data(uid, {})
+    assert 1 in persistence._cache
+    assert len(persistence._cache) == 2
+    await persistence.flush()
+
+
+@pytest.mark.asyncio
+async def test_sql_store_versions(async_session_factory):
+    store = SqlStateStore(async_session_factory)
+    assert await store.load(1) is None
+    assert await store.save([Write(1, 0, b"one")]) == []
+    assert await store.save([Write(1, 0, b"again"), Write(2, 0, b"two")]) == [1]
+    assert await store.load(1) == (1, b"one")
+    assert await store.save([Write(1, 1, b"three"), Write(2, 5, b"stale")]) == [2]
+    assert await store.load(1) == (2, b"three")
+    assert await store.version(2) == 1
+    await store.save([Write(2, 0, None)])
+    assert await store.version(2) == 0
+
+
+_PTB_CONTRACT = """
+import asyncio, re, telegram
+from types import SimpleNamespace
+from telegram.ext import CommandHandler, ConversationHandler
+from telegram.ext._conversationhandler import PendingState
+from state_persistence import MemoryStateStore, StatePersistence, _Slot
+
+
+async def main():
+    pin = re.search(r"python-telegram-bot==([\\w.]+)", open("requirements.txt").read()).group(1)
+    assert telegram.__version__ == pin, (telegram.__version__, pin)
+
+    persistence = StatePersistence(MemoryStateStore(), refresh_after=0)
+    conv = ConversationHandler(
+        entry_points=[CommandHandler("dose", lambda u, c: None)], states={}, fallbacks=[],
+        name="dose", persistent=True,
+    )
+    await conv._initialize_persistence(SimpleNamespace(persistence=persistence))
+    persistence.register_conversations(conv)
+
+    task = asyncio.get_running_loop().create_future()
+    conv._conversations.update_no_track({(1, 1): 1, (2, 2): PendingState(old_state=1, task=task), (3, 3): 1})
+    conv._conversations.pop_accessed_keys()
+    persistence._apply(1, _Slot(version=1, user_data="{}", conversations={("dose", (1, 1)): 4}), {})
+    persistence._apply(2, _Slot(version=1, user_data="{}", conversations={("dose", (2, 2)): 5}), {})
+    persistence._apply(3, _Slot(version=1, user_data="{}"), {})
+
+    assert conv._conversations[(1, 1)] == 4
+    assert isinstance(conv._conversations[(2, 2)], PendingState)
+    assert (3, 3) not in conv._conversations
+    assert not conv._conversations.pop_accessed_keys()
+    task.cancel()
+    print("ok")
+
+asyncio.run(main())
+"""
+
+
+def test_conversation_internals_of_pinned_ptb():
+    """``_replace_user_states`` relies on PTB internals: fail loudly when they change."""
+    env = {**os.environ, "TELEGRAM_TOKEN": "x", "OPENAI_API_KEY": "x", "OPENAI_ASSISTANT_ID": "x"}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", _PTB_CONTRACT], cwd=root, env=env, capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.split() == ["ok"]
@@ -0,0 +1,115 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+
+os.environ.setdefault("TELEGRAM_TOKEN", "x")
+os.environ.setdefault("OPENAI_API_KEY", "x")
+os.environ.setdefault("OPENAI_ASSISTANT_ID", "x")
+
+import thread_manager
+from db import User
+
+
+def _message(role: str, text: str):
+    return SimpleNamespace(role=role, content=[SimpleNamespace(text=SimpleNamespace(value=text))])
+
+
+@pytest_asyncio.fixture
+async def user(monkeypatch, async_session_factory):
+    monkeypatch.setattr(thread_manager, "AsyncSessionLocal", async_session_factory)
+    async with async_session_factory() as session:
+        session.add(User(telegram_id=1, thread_id="th_old", thread_summary="Помпа, КЧ 10"))
+        await session.commit()
+    return async_session_factory
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    threads = SimpleNamespace(
+        create=AsyncMock(return_value=SimpleNamespace(id="th_new")),
+        delete=AsyncMock(),
+        messages=SimpleNamespace(list=AsyncMock(return_value=SimpleNamespace(data=[
+            _message("user", "Съел 3 ХЕ"), _message("assistant", "Записал."),
+        ]))),
+    )
+    completion = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" Помпа, КЧ 10; ест 3 ХЕ "))])
+    fake = SimpleNamespace(
+        beta=SimpleNamespace(threads=threads),
+        chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(return_value=completion))),
+    )
+    monkeypatch.setattr(thread_manager, "client", fake)
+    return fake
+
+
+def _run(prompt_tokens: int):
+    return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt_tokens))
+
+
+@pytest.mark.asyncio
+async def test_chat_counts_messages_and_rotates_full_thread(user, fake_openai, monkeypatch):
+    monkeypatch.setattr(thread_manager, "THREAD_MAX_MESSAGES", 4)
+    run = AsyncMock(side_effect=[("Ок", _run(500)), ("Ок", _run(900)), ("Привет", _run(200))])
+    monkeypatch.setattr(thread_manager, "run_assistant", run)
+    db_user = User(telegram_id=1, thread_id="th_old")
+
+    assert await thread_manager.chat(db_user, "раз") == "Ок"
+    assert await thread_manager.chat(db_user, "два") == "Ок"
+    await thread_manager.drain()
+    await thread_manager.chat(db_user, "три")
+
+    assert [call.args[0] for call in run.await_args_list] == ["th_old", "th_old", "th_new"]
+    prompt = fake_openai.chat.completions.create.await_args.kwargs["messages"][1]["content"]
+    assert "Помпа, КЧ 10" in prompt and "Пользователь: Съел 3 ХЕ" in prompt
+    seed = fake_openai.beta.threads.create.await_args.kwargs["messages"][0]
+    assert seed["content"].endswith("Помпа, КЧ 10; ест 3 ХЕ")
+    fake_openai.beta.threads.delete.assert_awaited_once_with("th_old")
+    async with user() as session:
+        row = await session.get(User, 1)
+    assert (row.thread_id, row.thread_messages, row.thread_tokens) == ("th_new", 3, 200)
+    assert row.thread_summary == "Помпа, КЧ 10; ест 3 ХЕ"
+
+
+@pytest.mark.asyncio
+async def test_token_threshold_triggers_rotation_and_failure_keeps_thread(user, fake_openai, monkeypatch):
+    monkeypatch.setattr(thread_manager, "THREAD_MAX_TOKENS", 1000)
+    monkeypatch.setattr(thread_manager, "run_assistant", AsyncMock(return_value=("Ок", _run(1500))))
+    fake_openai.chat.completions.create.side_effect = RuntimeError("rate limit")
+
+    await thread_manager.chat(User(telegram_id=1, thread_id="th_old"), "раз")
+    await thread_manager.drain()
+
+    fake_openai.beta.threads.create.assert_not_awaited()
+    async with user() as session:
+        row = await session.get(User, 1)
+    assert (row.thread_id, row.thread_messages, row.thread_tokens) == ("th_old", 2, 1500)
+
+
+@pytest.mark.asyncio
+async def test_rotation_lost_to_reset_deletes_new_thread(user, fake_openai, monkeypatch):
+    async def summarize_during_reset(previous, transcript):
+        async with user() as session:
+            row = await session.get(User, 1)
+            row.thread_id = "th_reset"
+            await session.commit()
+        return "заметка"
+
+    monkeypatch.setattr(thread_manager, "summarize", summarize_during_reset)
+
+    assert await thread_manager.rotate(1, "th_old") is None
+
+    fake_openai.beta.threads.delete.assert_awaited_once_with("th_new")
+    async with user() as session:
+        row = await session.get(User, 1)
+    assert (row.thread_id, row.thread_summary) == ("th_reset", "Помпа, КЧ 10")
+
+
+@pytest.mark.asyncio
+async def test_transcript_skips_seeded_summary(fake_openai):
+    fake_openai.beta.threads.messages.list.return_value = SimpleNamespace(data=[
+        _message("assistant", thread_manager.SUMMARY_HEADER + "Помпа, КЧ 10"),
+        _message("user", "Съел 3 ХЕ"),
+    ])
+    assert await thread_manager._transcript("th_old") == "Пользователь: Съел 3 ХЕ"
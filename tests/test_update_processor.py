@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot.update_processor import ChatOrderedUpdateProcessor
+
+
+def _update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=None)
+
+
+async def _feed(processor, updates):
+    # как Application: каждый апдейт — отдельная задача, в порядке поступления
+    tasks = [asyncio.create_task(processor.process_update(update, handler)) for update, handler in updates]
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_updates_of_one_chat_keep_order():
+    processor = ChatOrderedUpdateProcessor(8)
+    log = []
+
+    async def handle(chat, n, delay):
+        await asyncio.sleep(delay)
+        log.append((chat, n))
+
+    updates = [(_update(chat), handle(chat, n, 0.02 if n == 0 else 0.001)) for n in range(5) for chat in (1, 2)]
+    await _feed(processor, updates)
+
+    for chat in (1, 2):
+        assert [n for c, n in log if c == chat] == list(range(5))
+    assert processor.stats() == {"active_chats": 0, "queued": 0}
+
+
+@pytest.mark.asyncio
+async def test_slow_chat_does_not_block_others():
+    processor = ChatOrderedUpdateProcessor(4)
+    done = {}
+    start = asyncio.get_running_loop().time()
+
+    async def handle(chat, delay):
+        await asyncio.sleep(delay)
+        done.setdefault(chat, asyncio.get_running_loop().time() - start)
+
+    # в медленном чате очередь из десяти апдейтов занимает один слот, не все
+    updates = [(_update(1), handle(1, 0.1)) for _ in range(10)]
+    updates += [(_update(chat), handle(chat, 0.01)) for chat in range(2, 20)]
+    await _feed(processor, updates)
+
+    assert max(t for chat, t in done.items() if chat != 1) < 0.1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    processor = ChatOrderedUpdateProcessor(3)
+    running = peak = 0
+
+    async def handle():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await _feed(processor, [(_update(chat), handle()) for chat in range(20)])
+    assert peak == 3
@@ -0,0 +1,90 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from PIL import Image
+from sqlalchemy import func, select
+
+import vision_cache
+from db import VisionCache
+from vision_cache import VisionResult
+
+
+def _jpeg(quality: int, size=(320, 240)) -> bytes:
+    img = Image.new("RGB", size)
+    for x in range(size[0]):
+        for y in range(size[1]):
+            img.putpixel((x, y), ((x * 3) % 256, (y * 5) % 256, 128 if x < size[0] // 2 else 30))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+@pytest_asyncio.fixture
+async def cache_db(monkeypatch, async_session_factory):
+    monkeypatch.setattr(vision_cache, "AsyncSessionLocal", async_session_factory)
+    return async_session_factory
+
+
+@pytest.mark.asyncio
+async def test_exact_hit_returns_stored_result(cache_db):
+    data = _jpeg(90)
+    assert await vision_cache.lookup(data) is None
+    await vision_cache.store(data, VisionResult("Углеводы: 40 г", 40.0, 3.3))
+    assert await vision_cache.lookup(data) == VisionResult("Углеводы: 40 г", 40.0, 3.3)
+
+
+@pytest.mark.asyncio
+async def test_recompressed_photo_hits_by_perceptual_hash(cache_db, monkeypatch):
+    monkeypatch.setattr(vision_cache, "VISION_CACHE_PHASH", True)
+    original, recompressed = _jpeg(95), _jpeg(60)
+    assert original != recompressed
+    await vision_cache.store(original, VisionResult("ХЕ: 2", None, 2.0))
+    assert (await vision_cache.lookup(recompressed)).xe == 2.0
+
+
+@pytest.mark.asyncio
+async def test_phash_disabled_by_default_only_exact_matches(cache_db):
+    await vision_cache.store(_jpeg(95), VisionResult("ХЕ: 2", None, 2.0))
+    assert await vision_cache.lookup(_jpeg(60)) is None
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_ignored(cache_db, monkeypatch):
+    data = _jpeg(90)
+    await vision_cache.store(data, VisionResult("ХЕ: 1", None, 1.0))
+    async with cache_db() as session:
+        row = await session.get(VisionCache, vision_cache.content_hash(data))
+        row.created_at = datetime.now(timezone.utc) - timedelta(days=365)
+        await session.commit()
+    assert await vision_cache.lookup(data) is None
+
+
+@pytest.mark.asyncio
+async def test_store_trims_to_max_entries(cache_db, monkeypatch):
+    monkeypatch.setattr(vision_cache, "VISION_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(vision_cache, "TRIM_EVERY", 1)
+    for i in range(4):
+        await vision_cache.store(f"image-{i}".encode(), VisionResult(str(i), None, float(i)))
+    async with cache_db() as session:
+        assert await session.scalar(select(func.count()).select_from(VisionCache)) == 2
+    assert await vision_cache.lookup(b"image-3") is not None
+    assert await vision_cache.lookup(b"image-0") is None
+
+
+@pytest.mark.asyncio
+async def test_store_trims_in_batches(cache_db, monkeypatch):
+    monkeypatch.setattr(vision_cache, "VISION_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(vision_cache, "TRIM_EVERY", 3)
+    monkeypatch.setattr(vision_cache, "_stores", 1)
+    for i in range(4):
+        await vision_cache.store(f"image-{i}".encode(), VisionResult(str(i), None, float(i)))
+    async with cache_db() as session:
+        assert await session.scalar(select(func.count()).select_from(VisionCache)) == 3
+
+
+def test_perceptual_hash_fits_signed_bigint():
+    value = vision_cache.perceptual_hash(_jpeg(90))
+    assert -(1 << 63) <= value < (1 << 63)
+    assert vision_cache.perceptual_hash(b"not an image") is None
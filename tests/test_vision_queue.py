@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from vision_queue import VisionBusy, VisionCancelled, VisionQueue, VisionQueueFull
+
+
+def gated(gate: asyncio.Event, log: list, item):
+    async def call():
+        log.append(("start", item))
+        await gate.wait()
+        log.append(("end", item))
+        return item
+    return call
+
+
+@pytest.mark.asyncio
+async def test_workers_cap_concurrency_and_serve_in_order():
+    queue = VisionQueue(workers=2, max_queue=10, status_interval=0)
+    gate = asyncio.Event()
+    log = []
+    try:
+        jobs = [queue.submit(user, gated(gate, log, user)) for user in range(5)]
+        await asyncio.sleep(0.01)
+        assert [item for event, item in log] == [0, 1]
+        assert [queue.position(job) for job in jobs] == [0, 0, 1, 2, 3]
+        gate.set()
+        assert await asyncio.gather(*(job.future for job in jobs)) == [0, 1, 2, 3, 4]
+    finally:
+        await queue.stop()
+    assert [item for event, item in log if event == "start"] == [0, 1, 2, 3, 4]
+    stats = queue.stats()
+    assert (stats["completed"], stats["queue_depth"], stats["running"]) == (5, 0, 0)
+    assert stats["wait_p95"] >= stats["wait_p50"] > 0
+
+
+@pytest.mark.asyncio
+async def test_one_job_per_user_and_bounded_queue():
+    queue = VisionQueue(workers=1, max_queue=1)
+    gate = asyncio.Event()
+    try:
+        queue.submit(1, gated(gate, [], 1))
+        await asyncio.sleep(0)
+        with pytest.raises(VisionBusy):
+            queue.submit(1, gated(gate, [], 1))
+        queue.submit(2, gated(gate, [], 2))
+        with pytest.raises(VisionQueueFull):
+            queue.submit(3, gated(gate, [], 3))
+    finally:
+        await queue.stop()
+    assert (queue.stats()["rejected_busy"], queue.stats()["rejected_full"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_cancel_waiting_and_running_jobs_and_report_positions():
+    queue = VisionQueue(workers=1, max_queue=10, status_interval=0)
+    gate = asyncio.Event()
+    log = []
+    positions = []
+
+    async def on_position(position):
+        positions.append(position)
+
+    try:
+        running = queue.submit(1, gated(gate, log, 1))
+        await asyncio.sleep(0)
+        waiting = queue.submit(2, gated(gate, log, 2))
+        last = queue.submit(3, gated(gate, log, 3))
+        queue.watch(last, on_position, queue.position(last))
+
+        assert queue.cancel(2)
+        assert queue.cancel(1)
+        assert not queue.cancel(1)
+        gate.set()
+        assert await last.future == 3
+    finally:
+        await queue.stop()
+    for job in (waiting, running):
+        with pytest.raises(VisionCancelled):
+            await job.future
+    assert ("start", 2) not in log and ("end", 1) not in log
+    assert positions == [1, 0]
+    assert queue.stats()["cancelled"] == 2
@@ -0,0 +1,148 @@
+# thread_manager.py
+"""Keep every user's Assistants thread short.
+
+A thread only grows: each run re-reads all of it, so replies get slower and
+more expensive the longer a user chats.  :func:`chat` counts messages and
+the prompt tokens of the last run on :class:`db.User`.  Once either passes
+``THREAD_MAX_MESSAGES`` / ``THREAD_MAX_TOKENS`` the thread is rotated in the
+background: the old conversation (plus the previous summary) is condensed
+into a short note in ``users.thread_summary``, a new thread is created with
+that note as its first message, and ``users.thread_id`` is switched over.
+"""
+import asyncio
+import logging
+
+from sqlalchemy import select, update
+
+from config import THREAD_MAX_MESSAGES, THREAD_MAX_TOKENS
+from db import AsyncSessionLocal, User
+from gpt_client import message_text, run_assistant
+from openai_client import client
+from user_locks import UserLocks
+
+SUMMARY_MAX_TOKENS = 400
+SUMMARY_PROMPT = (
+    "Ты сжимаешь переписку пользователя с ассистентом по диабету в заметку для "
+    "продолжения разговора. Сохрани факты о пользователе (терапия, коэффициенты, "
+    "привычки, цели), договорённости и нерешённые вопросы. Пиши кратко, по-русски, "
+    "списком, не больше 150 слов."
+)
+SUMMARY_HEADER = "Краткое содержание предыдущего разговора:\n"
+
+_locks = UserLocks()  # run'ы и ротация одного thread не пересекаются
+_rotations: set[asyncio.Task] = set()
+
+
+def needs_rotation(messages: int, tokens: int) -> bool:
+    return messages >= THREAD_MAX_MESSAGES or tokens >= THREAD_MAX_TOKENS
+
+
+async def chat(user: User, content: str) -> str:
+    """Ask the assistant in the user's thread and rotate the thread when it is full."""
+    async with _locks(user.telegram_id):
+        async with AsyncSessionLocal() as session:
+            # thread мог смениться, пока ждали ротацию
+            thread_id = await session.scalar(
+                select(User.thread_id).where(User.telegram_id == user.telegram_id)
+            ) or user.thread_id
+        reply, run = await run_assistant(thread_id, content=content)
+        usage = getattr(run, "usage", None)
+        tokens = getattr(usage, "prompt_tokens", None) or 0
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(User)
+                .where(User.telegram_id == user.telegram_id, User.thread_id == thread_id)
+                .values(thread_messages=User.thread_messages + 2, thread_tokens=tokens)
+            )
+            messages = await session.scalar(
+                select(User.thread_messages)
+                .where(User.telegram_id == user.telegram_id, User.thread_id == thread_id)
+            )
+            await session.commit()
+        logging.info("[THREAD] user=%s thread=%s messages=%s prompt_tokens=%s",
+                     user.telegram_id, thread_id, messages, tokens)
+        if messages is not None and needs_rotation(messages, tokens):
+            task = asyncio.get_running_loop().create_task(rotate(user.telegram_id, thread_id))
+            _rotations.add(task)
+            task.add_done_callback(_rotations.discard)
+        return reply
+
+
+async def _transcript(thread_id: str) -> str:
+    page = await client.beta.threads.messages.list(thread_id=thread_id, order="asc", limit=100)
+    lines = []
+    for message in page.data:
+        text = message_text(message)
+        if message.role == "assistant" and text.startswith(SUMMARY_HEADER):
+            continue  # прошлая заметка, её summarize получает отдельно
+        if text:
+            lines.append(f"{'Пользователь' if message.role == 'user' else 'Ассистент'}: {text}")
+    return "\n".join(lines)
+
+
+async def summarize(previous: str | None, transcript: str) -> str:
+    parts = []
+    if previous:
+        parts.append(f"Прошлая заметка:\n{previous}")
+    parts.append(f"Новая переписка:\n{transcript}")
+    response = await client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": "\n\n".join(parts)},
+        ],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0,
+    )
+    return response.choices[0].message.content.strip()
+
+
+async def rotate(user_id: int, thread_id: str) -> str | None:
+    """Replace ``thread_id`` by a new thread seeded with a summary.
+
+    Returns the new thread id, or ``None`` if the user has already moved on
+    or summarizing failed (the old thread is then kept and retried later).
+    """
+    async with _locks(user_id):
+        async with AsyncSessionLocal() as session:
+            user = await session.get(User, user_id)
+        if user is None or user.thread_id != thread_id:
+            return None
+        try:
+            summary = await summarize(user.thread_summary, await _transcript(thread_id))
+            thread = await client.beta.threads.create(
+                messages=[{"role": "assistant", "content": SUMMARY_HEADER + summary}]
+            )
+        except Exception:
+            logging.exception("[THREAD] Failed to rotate thread %s of user %s", thread_id, user_id)
+            return None
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(User)
+                .where(User.telegram_id == user_id, User.thread_id == thread_id)
+                .values(thread_id=thread.id, thread_summary=summary, thread_messages=1, thread_tokens=0)
+            )
+            await session.commit()
+        if result.rowcount == 0:
+            # thread сменили в обход блокировки (/reset, другой процесс) —
+            # старый остаётся у того, кто его сменил, лишний новый удаляем
+            logging.info("[THREAD] user=%s moved off %s during rotation", user_id, thread_id)
+            await _delete_thread(thread.id)
+            return None
+        logging.info("[THREAD] user=%s rotated %s -> %s (summary %d chars)",
+                     user_id, thread_id, thread.id, len(summary))
+    await _delete_thread(thread_id)
+    return thread.id
+
+
+async def _delete_thread(thread_id: str) -> None:
+    try:
+        await client.beta.threads.delete(thread_id)
+    except Exception:
+        logging.warning("[THREAD] Cannot delete thread %s", thread_id, exc_info=True)
+
+
+async def drain() -> None:
+    """Wait for rotations in progress (shutdown, tests)."""
+    if _rotations:
+        await asyncio.gather(*_rotations, return_exceptions=True)
@@ -0,0 +1,21 @@
+# user_locks.py
+"""Per-user ``asyncio.Lock`` registry shared by the bot and the core modules."""
+import asyncio
+import weakref
+
+
+class UserLocks:
+    """``asyncio.Lock`` per user; a lock lives while someone holds a reference.
+
+    The locks are process-local: with several bot workers, two processes can
+    still run the same user's job at the same time.
+    """
+
+    def __init__(self):
+        self._locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def __call__(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
@@ -0,0 +1,143 @@
+# vision_cache.py
+"""Persistent cache of Vision results keyed by the photo's content.
+
+A hit lets ``photo_handler`` skip the file upload, the thread message, the
+run and the wait entirely.  Lookups go by the SHA-256 of the image
+bytes.  With ``VISION_CACHE_PHASH=1`` (off by default) a miss also tries a
+64-bit average hash that survives Telegram's recompression of the same
+picture; similar-looking photos of different meals — possibly from other
+users — then share one result, and its carbs feed the dose calculation.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, update
+
+from config import VISION_CACHE_MAX_ENTRIES, VISION_CACHE_PHASH, VISION_CACHE_TTL
+from db import AsyncSessionLocal, VisionCache
+
+try:  # Pillow нужен только для перцептивного хэша
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+# Чистка устаревших и лишних строк — раз в столько сохранений
+TRIM_EVERY = 100
+_stores = 0
+
+
+@dataclass(frozen=True)
+class VisionResult:
+    vision_text: str
+    carbs_g: float | None
+    xe: float | None
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(data: bytes) -> int | None:
+    """Average hash (8×8 grayscale) as a signed 64-bit int, or ``None``."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            pixels = img.convert("L").resize((8, 8), Image.LANCZOS).tobytes()
+    except Exception:
+        logging.debug("[VISION_CACHE] Cannot decode image for phash", exc_info=True)
+        return None
+    mean = sum(pixels) / len(pixels)
+    value = 0
+    for pixel in pixels:
+        value = (value << 1) | (pixel >= mean)
+    # BIGINT в Postgres знаковый
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+async def _hashes(data: bytes) -> tuple[str, int | None]:
+    phash = await asyncio.to_thread(perceptual_hash, data) if VISION_CACHE_PHASH else None
+    return content_hash(data), phash
+
+
+async def lookup(data: bytes) -> VisionResult | None:
+    """Cached result for image ``data`` or ``None``; errors count as a miss."""
+    try:
+        digest, phash = await _hashes(data)
+        now = datetime.now(timezone.utc)
+        fresh = VisionCache.created_at >= now - timedelta(seconds=VISION_CACHE_TTL)
+        async with AsyncSessionLocal() as session:
+            row = await session.scalar(
+                select(VisionCache).where(VisionCache.content_hash == digest).where(fresh)
+            )
+            if row is None and phash is not None:
+                row = await session.scalar(
+                    select(VisionCache)
+                    .where(VisionCache.phash == phash)
+                    .where(fresh)
+                    .order_by(VisionCache.last_used_at.desc())
+                    .limit(1)
+                )
+            if row is None:
+                return None
+            await session.execute(
+                update(VisionCache)
+                .where(VisionCache.content_hash == row.content_hash)
+                .values(last_used_at=now)
+            )
+            await session.commit()
+            logging.info("[VISION_CACHE] Hit %s", row.content_hash[:12])
+            return VisionResult(row.vision_text, row.carbs_g, row.xe)
+    except Exception:
+        logging.exception("[VISION_CACHE] Lookup failed")
+        return None
+
+
+async def store(data: bytes, result: VisionResult) -> None:
+    """Save ``result`` for image ``data``.
+
+    Every :data:`TRIM_EVERY`-th call also evicts expired and excess rows, so
+    the table may briefly exceed ``VISION_CACHE_MAX_ENTRIES`` by a batch.
+    """
+    global _stores
+    trim = _stores % TRIM_EVERY == 0
+    _stores += 1
+    try:
+        digest, phash = await _hashes(data)
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as session:
+            await session.merge(
+                VisionCache(
+                    content_hash=digest,
+                    phash=phash,
+                    vision_text=result.vision_text,
+                    carbs_g=result.carbs_g,
+                    xe=result.xe,
+                    created_at=now,
+                    last_used_at=now,
+                )
+            )
+            if trim:
+                await session.execute(
+                    delete(VisionCache).where(
+                        VisionCache.created_at < now - timedelta(seconds=VISION_CACHE_TTL)
+                    )
+                )
+                stale = (
+                    select(VisionCache.content_hash)
+                    .order_by(VisionCache.last_used_at.desc())
+                    .offset(VISION_CACHE_MAX_ENTRIES)
+                    .scalar_subquery()
+                )
+                await session.execute(
+                    delete(VisionCache)
+                    .where(VisionCache.content_hash.in_(stale))
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+    except Exception:
+        logging.exception("[VISION_CACHE] Store failed")
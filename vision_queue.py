@@ -0,0 +1,227 @@
+# vision_queue.py
+"""Queue of Vision jobs served by a fixed pool of workers.
+
+At lunch time hundreds of users send photos within a minute; starting an
+Assistants run for each of them at once ends in OpenAI rate-limit errors.
+``photo_handler`` submits the run to :class:`VisionQueue` instead:
+
+* at most ``workers`` runs are in flight, the rest wait in FIFO order;
+* no more than ``max_queue`` jobs wait, further photos are refused;
+* a user has at most one job; a second one raises :class:`VisionBusy`;
+* :meth:`VisionQueue.cancel` (``/cancel``) drops a waiting job or cancels
+  a running one;
+* waiting jobs are told their queue position (throttled to one update per
+  ``status_interval`` seconds) and ``0`` when they start.
+
+:meth:`VisionQueue.stats` reports wait and service times.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from config import VISION_MAX_QUEUE, VISION_STATUS_INTERVAL, VISION_WORKERS
+
+
+class VisionBusy(Exception):
+    """The user already has a job in the queue."""
+
+
+class VisionQueueFull(Exception):
+    """Too many jobs are waiting."""
+
+
+class VisionCancelled(Exception):
+    """The job was cancelled by the user."""
+
+
+@dataclass(slots=True, eq=False)
+class VisionJob:
+    user_id: int
+    call: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float
+    on_position: Callable[[int], Awaitable] | None = None
+    started_at: float | None = None
+    task: asyncio.Task | None = None
+    reported: int | None = field(default=None)
+    reported_at: float = field(default=0.0)
+
+
+def _percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+class VisionQueue:
+    def __init__(self, workers: int = VISION_WORKERS, max_queue: int = VISION_MAX_QUEUE,
+                 status_interval: float = VISION_STATUS_INTERVAL):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.status_interval = status_interval
+        self._waiting: deque[VisionJob] = deque()
+        self._jobs: dict[int, VisionJob] = {}  # user_id -> ждущее или выполняемое задание
+        self._running = 0
+        self._has_jobs: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._callbacks: set[asyncio.Task] = set()
+        self._wait_times: deque[float] = deque(maxlen=10000)
+        self._service_times: deque[float] = deque(maxlen=10000)
+        self.counters: Counter = Counter()
+
+    def _ensure_started(self) -> None:
+        if self._tasks and not self._tasks[0].done():
+            return
+        self._has_jobs = asyncio.Event()
+        if self._waiting:
+            self._has_jobs.set()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, user_id: int, call: Callable[[], Awaitable[Any]],
+               on_position: Callable[[int], Awaitable] | None = None) -> VisionJob:
+        """Queue ``call()`` for ``user_id``; ``await job.future`` for its result.
+
+        Raises :class:`VisionBusy` if the user already has a job and
+        :class:`VisionQueueFull` if ``max_queue`` jobs are waiting.
+        """
+        if user_id in self._jobs:
+            self.counters["rejected_busy"] += 1
+            raise VisionBusy(user_id)
+        if len(self._waiting) >= self.max_queue:
+            self.counters["rejected_full"] += 1
+            raise VisionQueueFull(len(self._waiting))
+        self._ensure_started()
+        job = VisionJob(user_id, call, asyncio.get_running_loop().create_future(), time.monotonic(),
+                        on_position)
+        self._jobs[user_id] = job
+        self._waiting.append(job)
+        self._has_jobs.set()
+        return job
+
+    def position(self, job: VisionJob) -> int:
+        """1-based place in the queue; ``0`` once the job has started or a worker is free for it."""
+        try:
+            index = self._waiting.index(job)
+        except ValueError:
+            return 0
+        return max(0, index + 1 - self._idle())
+
+    def watch(self, job: VisionJob, on_position: Callable[[int], Awaitable], shown: int) -> None:
+        """Report position changes of ``job``; the user already sees ``shown``."""
+        job.on_position = on_position
+        job.reported, job.reported_at = shown, time.monotonic()
+        if shown and job.started_at is not None and not job.future.done():
+            self._report(job, 0)  # задание стартовало, пока показывали место в очереди
+
+    def _idle(self) -> int:
+        return max(0, len(self._tasks) - self._running)
+
+    def busy(self, user_id: int) -> bool:
+        return user_id in self._jobs
+
+    def cancel(self, user_id: int) -> bool:
+        """Cancel the user's job; ``False`` if there was none."""
+        job = self._jobs.pop(user_id, None)
+        if job is None:
+            return False
+        self.counters["cancelled"] += 1
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            self._waiting.remove(job)
+            self._report_positions()
+        if not job.future.done():
+            job.future.set_exception(VisionCancelled())
+        return True
+
+    def _report(self, job: VisionJob, position: int) -> None:
+        job.reported, job.reported_at = position, time.monotonic()
+        task = asyncio.get_running_loop().create_task(job.on_position(position))
+        self._callbacks.add(task)
+        task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task: asyncio.Task) -> None:
+        self._callbacks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning("[VISION_QUEUE] Status update failed: %s", task.exception())
+
+    def _report_positions(self) -> None:
+        now = time.monotonic()
+        for position, job in enumerate(self._waiting, 1 - self._idle()):
+            if (position > 0 and job.on_position is not None and job.reported != position
+                    and now - job.reported_at >= self.status_interval):
+                self._report(job, position)
+
+    async def _next_job(self) -> VisionJob:
+        while not self._waiting:
+            self._has_jobs.clear()
+            await self._has_jobs.wait()
+        return self._waiting.popleft()
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._next_job()
+            self._running += 1
+            self._report_positions()
+            job.started_at = time.monotonic()
+            self._wait_times.append(job.started_at - job.enqueued_at)
+            if job.on_position is not None and job.reported:
+                self._report(job, 0)
+            job.task = asyncio.get_running_loop().create_task(job.call())
+            try:
+                await asyncio.wait([job.task])
+            except asyncio.CancelledError:
+                job.task.cancel()  # остановка очереди
+                if not job.future.done():
+                    job.future.set_exception(VisionCancelled())
+                raise
+            finally:
+                self._running -= 1
+                if self._jobs.get(job.user_id) is job:
+                    del self._jobs[job.user_id]
+            self._finish(job)
+
+    def _finish(self, job: VisionJob) -> None:
+        if job.task.cancelled():
+            return  # отменено через cancel(), future уже с VisionCancelled
+        self._service_times.append(time.monotonic() - job.started_at)
+        if job.task.exception() is not None:
+            self.counters["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(job.task.exception())
+        else:
+            self.counters["completed"] += 1
+            if not job.future.done():
+                job.future.set_result(job.task.result())
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._waiting),
+            "running": self._running,
+            "completed": self.counters["completed"],
+            "failed": self.counters["failed"],
+            "cancelled": self.counters["cancelled"],
+            "rejected_busy": self.counters["rejected_busy"],
+            "rejected_full": self.counters["rejected_full"],
+            "wait_p50": _percentile(self._wait_times, 0.5),
+            "wait_p95": _percentile(self._wait_times, 0.95),
+            "service_p50": _percentile(self._service_times, 0.5),
+            "service_p95": _percentile(self._service_times, 0.95),
+        }
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in self._waiting:
+            if not job.future.done():
+                job.future.set_exception(VisionCancelled())
+        self._waiting.clear()
+        self._jobs.clear()
+
+
+vision_queue = VisionQueue()